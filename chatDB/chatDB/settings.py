@@ -10,8 +10,13 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.1/ref/settings/
 """
 
+import os
 from pathlib import Path
 
+from dotenv import load_dotenv
+
+load_dotenv()  # Load environment variables from a .env file
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -49,6 +54,8 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'query_handler.middleware.TracingMiddleware',
+    'query_handler.middleware.AdmissionMiddleware',
 ]
 
 ROOT_URLCONF = 'chatDB.urls'
@@ -123,3 +130,200 @@ STATIC_URL = 'static/'
 # https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+
+# Target MySQL database that generated queries run against
+MYSQL_DATABASE = {
+    'host': os.getenv('MYSQL_HOST', 'localhost'),
+    'user': os.getenv('MYSQL_USER', 'root'),
+    'password': os.getenv('env_password'),
+    'database': os.getenv('MYSQL_DATABASE', 'django_db'),
+    'port': int(os.getenv('MYSQL_PORT', 3306)),
+}
+
+# Database that generated queries run against: 'mysql' (MYSQL_DATABASE) or 'sqlite' (SQLITE_DATABASE,
+# an in-process stand-in for benchmarks and offline runs; the schema then comes from SCHEMA_FILE as is)
+SQL_BACKEND = os.getenv('SQL_BACKEND', 'mysql')
+SQLITE_DATABASE = os.getenv('SQLITE_DATABASE', str(BASE_DIR / 'query_data.sqlite3'))
+SCHEMA_FILE = os.getenv('SCHEMA_FILE', 'db_schema.json')  # Extracted schema, sent to the model in prompts
+
+# Target databases (see query_handler/utils/datasources.py). Requests pick one by name with "database";
+# 'default' is the database above. Others come from DATASOURCES and from the JSON object in DATASOURCES_FILE
+# (re-read when it changes), e.g. {"acme": {"backend": "mysql", "host": ..., "port": 3306, "user": ...,
+# "password": ..., "database": ..., "schema_file": ..., "max_concurrency": 4}}
+# or {"demo": {"backend": "sqlite", "database": "/path/demo.sqlite3"}}.
+DATASOURCES = {}
+DATASOURCES_FILE = os.getenv('DATASOURCES_FILE')
+DATASOURCE_REGISTRY = {
+    'max_active': int(os.getenv('DATASOURCE_MAX_ACTIVE', 32)),  # Open datasources kept; least recently used are closed
+    'idle_timeout': float(os.getenv('DATASOURCE_IDLE_TIMEOUT', 600)),  # seconds unused before a datasource is closed
+    'max_concurrency': int(os.getenv('DATASOURCE_MAX_CONCURRENCY', 8)),  # in-flight requests per datasource
+    'queue_timeout': float(os.getenv('DATASOURCE_QUEUE_TIMEOUT', 5)),  # seconds to wait for a slot before 429
+    'schema_dir': os.getenv('DATASOURCE_SCHEMA_DIR', str(BASE_DIR / 'schemas')),  # <name>.json without schema_file
+}
+
+# Connection pools, one per datasource (see query_handler/utils/db_pool.py)
+MYSQL_POOL = {
+    'size': int(os.getenv('MYSQL_POOL_SIZE', 5)),
+    'checkout_timeout': float(os.getenv('MYSQL_POOL_CHECKOUT_TIMEOUT', 5.0)),  # seconds
+    'max_idle_time': float(os.getenv('MYSQL_POOL_MAX_IDLE_TIME', 300.0)),  # seconds
+    'ping_interval': float(os.getenv('MYSQL_POOL_PING_INTERVAL', 0.0)),  # skip the ping if used this recently
+}
+
+# Prepared execution (see query_handler/utils/prepared.py): literals in WHERE/HAVING/ON/LIMIT become
+# parameters and each connection keeps up to cache_size prepared statements, least recently used evicted.
+# Per-shape execution counts are kept for the max_shapes most recent shapes (/prepared-statements/stats/).
+PREPARED_STATEMENTS = {
+    'enabled': os.getenv('PREPARED_STATEMENTS_ENABLED', 'true').lower() == 'true',
+    'cache_size': int(os.getenv('PREPARED_STATEMENT_CACHE_SIZE', 64)),  # per connection
+    'max_shapes': int(os.getenv('PREPARED_STATEMENT_MAX_SHAPES', 500)),
+}
+
+# Natural-language -> SQL translation cache (see query_handler/utils/translation_cache.py)
+TRANSLATION_CACHE = {
+    'max_entries': int(os.getenv('TRANSLATION_CACHE_SIZE', 1024)),
+    'ttl': float(os.getenv('TRANSLATION_CACHE_TTL', 3600)),  # seconds
+    'similarity_threshold': float(os.getenv('TRANSLATION_CACHE_SIMILARITY', 0.8)),  # trigram Jaccard
+}
+
+# Hosted inference endpoint for LLM_BACKEND='huggingface' (point it at a fake server for benchmarks)
+HUGGINGFACE_API_URL = os.getenv('HUGGINGFACE_API_URL', 'https://api-inference.huggingface.co/models/google/flan-t5-large')
+HUGGINGFACE_API_TOKEN = os.getenv('HUGGINGFACE_API_TOKEN')
+
+# Client for the hosted endpoint (see query_handler/utils/llm_client.py): retryable failures back off
+# exponentially with jitter; after breaker_failures consecutive failures calls fail fast for breaker_reset
+# seconds. With hedge on, a duplicate request is sent once the first has taken longer than the p95 latency.
+LLM_CLIENT = {
+    'timeout': float(os.getenv('LLM_CLIENT_TIMEOUT', 10)),  # seconds per attempt
+    'max_retries': int(os.getenv('LLM_CLIENT_MAX_RETRIES', 3)),  # attempts, including the first
+    'backoff_base': float(os.getenv('LLM_CLIENT_BACKOFF_BASE', 0.5)),  # seconds
+    'backoff_max': float(os.getenv('LLM_CLIENT_BACKOFF_MAX', 8)),  # seconds
+    'breaker_failures': int(os.getenv('LLM_CLIENT_BREAKER_FAILURES', 5)),
+    'breaker_reset': float(os.getenv('LLM_CLIENT_BREAKER_RESET', 30)),  # seconds
+    'hedge': os.getenv('LLM_CLIENT_HEDGE', 'false').lower() == 'true',
+    'hedge_min_samples': int(os.getenv('LLM_CLIENT_HEDGE_MIN_SAMPLES', 20)),  # latencies seen before hedging
+    'pool_size': int(os.getenv('LLM_CLIENT_POOL_SIZE', 20)),  # keep-alive connections
+}
+
+# SQL generation backend: 'huggingface' (hosted API), 'local' (in-process model) or 'stub' (offline, deterministic)
+LLM_BACKEND = os.getenv('LLM_BACKEND', 'huggingface')
+LLM_BACKEND_OPTIONS = {
+    'huggingface': {
+        'max_parallel': int(os.getenv('HUGGINGFACE_MAX_PARALLEL', 8)),  # Concurrent requests per batch
+    },
+    'local': {
+        'model_name': os.getenv('LOCAL_MODEL_NAME', 'google/flan-t5-large'),
+        'device': os.getenv('LOCAL_MODEL_DEVICE') or None,
+        'max_batch_size': int(os.getenv('LLM_MAX_BATCH_SIZE', 8)),
+        'max_wait_ms': float(os.getenv('LLM_MAX_BATCH_WAIT_MS', 5)),
+    },
+    'stub': {
+        'latency_ms': float(os.getenv('STUB_LLM_LATENCY_MS', 0)),
+    },
+}
+LLM_WARM_UP = os.getenv('LLM_WARM_UP', 'false').lower() == 'true'  # Load the backend at startup
+SCHEMA_WARM_UP = os.getenv('SCHEMA_WARM_UP', 'false').lower() == 'true'  # Parse SCHEMA_FILE and build its prompt index at startup
+
+# Result delivery
+STREAM_CHUNK_SIZE = int(os.getenv('STREAM_CHUNK_SIZE', 1000))  # Rows per fetchmany() when streaming
+MAX_PAGE_SIZE = int(os.getenv('MAX_PAGE_SIZE', 1000))
+MAX_HISTORY_PAGE_SIZE = int(os.getenv('MAX_HISTORY_PAGE_SIZE', 200))  # Entries per /api/query/history/ page
+PAGE_TOKEN_MAX_AGE = int(os.getenv('PAGE_TOKEN_MAX_AGE', 3600))  # seconds
+
+# Pre-execution guard for generated SQL (see query_handler/utils/sql_guard.py)
+QUERY_GUARD = {
+    'max_rows': int(os.getenv('QUERY_MAX_ROWS', 1000)),
+    'confirm_estimated_rows': int(os.getenv('QUERY_CONFIRM_ESTIMATED_ROWS', 100_000)),
+    'reject_estimated_rows': int(os.getenv('QUERY_REJECT_ESTIMATED_ROWS', 10_000_000)),
+    'max_execution_time_ms': int(os.getenv('QUERY_MAX_EXECUTION_TIME_MS', 10_000)),
+}
+
+# Query result cache (see query_handler/utils/result_cache.py). Use backend 'django'
+# with a shared CACHES entry (e.g. Redis/Memcached) so all workers share results.
+RESULT_CACHE = {
+    'backend': os.getenv('RESULT_CACHE_BACKEND', 'memory'),  # 'memory' or 'django'
+    'cache_alias': os.getenv('RESULT_CACHE_ALIAS', 'default'),
+    'max_bytes': int(os.getenv('RESULT_CACHE_MAX_BYTES', 64 * 1024 * 1024)),  # memory backend budget
+    'max_entry_bytes': int(os.getenv('RESULT_CACHE_MAX_ENTRY_BYTES', 1024 * 1024)),  # django backend
+    'ttl': float(os.getenv('RESULT_CACHE_TTL', 300)),  # seconds
+    'update_check_interval': float(os.getenv('RESULT_CACHE_UPDATE_CHECK_INTERVAL', 5)),  # seconds
+}
+
+# Prompt schema pruning (see query_handler/utils/schema_retrieval.py): schemas with more than
+# min_tables tables only send the top_k tables relevant to the question, plus FK neighbours
+SCHEMA_PRUNING = {
+    'min_tables': int(os.getenv('SCHEMA_PRUNING_MIN_TABLES', 10)),
+    'top_k': int(os.getenv('SCHEMA_PRUNING_TOP_K', 5)),
+    'max_tables': int(os.getenv('SCHEMA_PRUNING_MAX_TABLES', 10)),
+}
+
+# Stored query results (see query_handler/utils/result_store.py): compressed columnar files, one per
+# distinct result, referenced from UserQuery. `manage.py compact_results` applies retention_days.
+RESULT_STORE = {
+    'path': os.getenv('RESULT_STORE_PATH', str(BASE_DIR / 'query_results')),
+    'max_rows': int(os.getenv('RESULT_STORE_MAX_ROWS', 10_000)),  # Rows kept per result
+    'max_bytes': int(os.getenv('RESULT_STORE_MAX_BYTES', 8 * 1024 * 1024)),  # Compressed; larger results keep metadata only
+    'compression_level': int(os.getenv('RESULT_STORE_COMPRESSION_LEVEL', 6)),  # zlib, 1-9
+    'retention_days': int(os.getenv('RESULT_STORE_RETENTION_DAYS', 30)),
+}
+
+# Batch questions (POST /api/query/batch/): at most max_questions per request; their SQL runs on up
+# to `parallelism` pooled connections at once (never more than the pool size)
+QUERY_BATCH = {
+    'max_questions': int(os.getenv('QUERY_BATCH_MAX_QUESTIONS', 50)),
+    'parallelism': int(os.getenv('QUERY_BATCH_PARALLELISM', 4)),
+}
+
+# Background query jobs (POST /api/query/jobs/): bounded in-process worker pool; submissions beyond
+# workers + max_queue get 503 with Retry-After. Status requests may long-poll for up to max_wait seconds.
+QUERY_JOBS = {
+    'workers': int(os.getenv('QUERY_JOB_WORKERS', 4)),
+    'max_queue': int(os.getenv('QUERY_JOB_MAX_QUEUE', 100)),
+    'retry_after': int(os.getenv('QUERY_JOB_RETRY_AFTER', 5)),  # seconds
+    'max_wait': float(os.getenv('QUERY_JOB_MAX_WAIT', 30)),  # seconds
+}
+
+# Per-request tracing (see query_handler/utils/tracing.py): stage latencies for requests under
+# path_prefix, logged as one JSON line each on the 'query_handler.trace' logger and exported at /metrics/
+TRACING = {
+    'enabled': os.getenv('TRACING_ENABLED', 'false').lower() == 'true',
+    'log': os.getenv('TRACING_LOG', 'true').lower() == 'true',
+    'path_prefix': os.getenv('TRACING_PATH_PREFIX', '/api/'),
+}
+
+# Few-shot prompt examples (see query_handler/utils/example_store.py): the top_k past questions most
+# similar to the new one, with the SQL that answered them, within token_budget prompt tokens
+FEW_SHOT = {
+    'enabled': os.getenv('FEW_SHOT_ENABLED', 'true').lower() == 'true',
+    'top_k': int(os.getenv('FEW_SHOT_TOP_K', 3)),
+    'token_budget': int(os.getenv('FEW_SHOT_TOKEN_BUDGET', 400)),
+    'min_similarity': float(os.getenv('FEW_SHOT_MIN_SIMILARITY', 0.3)),  # Cosine, 0-1
+    'max_examples': int(os.getenv('FEW_SHOT_MAX_EXAMPLES', 5000)),  # History rows kept in memory
+    'refresh_interval': float(os.getenv('FEW_SHOT_REFRESH_INTERVAL', 30)),  # seconds between history reloads
+}
+
+# Admission control for POST /api/query/* (see query_handler/utils/admission.py): at most max_in_flight
+# requests at once, max_queue more waiting up to queue_timeout seconds, then 503; token buckets per client
+# and per tenant (datasource) for requests, LLM calls and SQL executions, then 429. Counters live in the
+# cache_alias CACHES entry; point it at a shared cache (e.g. Redis/Memcached) so limits hold across workers.
+# Bucket settings are (tokens per second, burst); a rate of 0 disables that bucket.
+def _bucket(name, rate, burst):
+    return (float(os.getenv(f'ADMISSION_{name}_RATE', rate)), float(os.getenv(f'ADMISSION_{name}_BURST', burst)))
+
+
+ADMISSION = {
+    'enabled': os.getenv('ADMISSION_ENABLED', 'true').lower() == 'true',
+    'cache_alias': os.getenv('ADMISSION_CACHE_ALIAS', 'default'),
+    'path_prefix': os.getenv('ADMISSION_PATH_PREFIX', '/api/query/'),
+    'max_in_flight': int(os.getenv('ADMISSION_MAX_IN_FLIGHT', 32)),
+    'max_queue': int(os.getenv('ADMISSION_MAX_QUEUE', 64)),
+    'queue_timeout': float(os.getenv('ADMISSION_QUEUE_TIMEOUT', 10)),  # seconds
+    'retry_after': int(os.getenv('ADMISSION_RETRY_AFTER', 5)),  # seconds, for 503s
+    'counter_ttl': int(os.getenv('ADMISSION_COUNTER_TTL', 300)),  # seconds; bounds slots leaked by killed workers
+    'client_header': os.getenv('ADMISSION_CLIENT_HEADER') or None,  # e.g. 'X-API-Key'; default user, then IP
+    'buckets': {
+        'request': {'client': _bucket('REQUEST_CLIENT', 2, 20), 'tenant': _bucket('REQUEST_TENANT', 20, 100)},
+        'llm': {'client': _bucket('LLM_CLIENT', 1, 10), 'tenant': _bucket('LLM_TENANT', 10, 50)},
+        'sql': {'client': _bucket('SQL_CLIENT', 5, 30), 'tenant': _bucket('SQL_TENANT', 50, 200)},
+    },
+}
@@ -1,9 +1,12 @@
 import json
 import mysql.connector
 from mysql.connector import Error
+from .utils.datasources import get_datasource_registry
+from .utils.db_pool import PoolTimeout, get_pool
+from .utils.prepared import parameterize
 
 class DatabaseConnector:
-    def __init__(self, host, user, password, database):
+    def __init__(self, host, user, password, database, port=3306):
         """
         Initialize the database connector.
         """
@@ -11,22 +14,34 @@ class DatabaseConnector:
         self.user = user
         self.password = password
         self.database = database
+        self.port = port
+        self.pool = None
         self.connection = None
 
+    @classmethod
+    def for_datasource(cls, name="default"):
+        """
+        Connector for a MySQL datasource configured in settings.DATASOURCES / DATASOURCES_FILE.
+        """
+        config = get_datasource_registry().config(name)
+        return cls(config["host"], config["user"], config.get("password"), config["database"],
+                   config.get("port", 3306))
+
     def connect(self):
         """
-        Establish a connection to the database.
+        Check out a connection from the shared pool for this database.
         """
         try:
-            self.connection = mysql.connector.connect(
+            self.pool = get_pool(
                 host=self.host,
                 user=self.user,
                 password=self.password,
-                database=self.database
+                database=self.database,
+                port=self.port
             )
-            if self.connection.is_connected():
-                print("Connected to the database")
-        except Error as e:
+            self.connection = self.pool.acquire()
+            print("Connected to the database")
+        except (Error, PoolTimeout) as e:
             print(f"Error connecting to database: {e}")
 
     def execute_query(self, query, params=None):
@@ -45,11 +60,12 @@ class DatabaseConnector:
 
     def close(self):
         """
-        Close the database connection.
+        Return the connection to the pool.
         """
-        if self.connection and self.connection.is_connected():
-            self.connection.close()
-            print("Database connection closed")
+        if self.connection:
+            self.pool.release(self.connection)
+            self.connection = None
+            print("Database connection returned to the pool")
 
 
 def process_response_and_execute_query(response, db_connector):
@@ -64,7 +80,8 @@ def process_response_and_execute_query(response, db_connector):
         query = response.get("generated_query", None)
         if query:
             print(f"Executing query: {query}")
-            results = db_connector.execute_query(query)
+            prepared = parameterize(query)  # Literals are sent as parameters, escaped by the driver
+            results = db_connector.execute_query(prepared.template, prepared.params or None)
             print("Query Results:")
             for row in results:
                 print(row)
@@ -73,31 +90,3 @@ def process_response_and_execute_query(response, db_connector):
     except Exception as e:
         print(f"Error processing response: {e}")
 
-
-if __name__ == "__main__":
-    # Database connection details
-    HOST = "localhost"
-    USER = "your_user"
-    PASSWORD = "your_password"
-    DATABASE = "your_database"
-
-    # Example response object
-    response = {
-        "id": 36,
-        "query": "Find all employees who work in the HR department.",
-        "generated_query": "SELECT * FROM employees WHERE department = 'HR'",
-        "response": "Processed query: SELECT * FROM employees WHERE department = 'HR'",
-        "timestamp": "2025-01-27T09:16:59.363479Z"
-    }
-
-    # Initialize the database connector
-    db = DatabaseConnector(host=HOST, user=USER, password=PASSWORD, database=DATABASE)
-
-    # Connect to the database
-    db.connect()
-
-    # Process the response and execute the query
-    process_response_and_execute_query(response, db)
-
-    # Close the database connection
-    db.close()
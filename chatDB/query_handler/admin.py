@@ -1,3 +1,15 @@
 from django.contrib import admin
 
-# Register your models here.
+from .models import UserQuery
+
+
+@admin.register(UserQuery)
+class UserQueryAdmin(admin.ModelAdmin):
+    list_display = ("id", "query", "status", "row_count", "result_bytes", "timestamp")
+    list_filter = ("status",)
+    search_fields = ("query", "generated_query")
+    readonly_fields = ("row_count", "columns", "result_hash", "result_ref", "result_rows", "result_bytes")
+
+    def get_queryset(self, request):
+        # Legacy rows may still carry whole result sets in `response`; lists don't need it
+        return super().get_queryset(request).defer("response")
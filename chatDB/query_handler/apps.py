@@ -4,3 +4,15 @@ from django.apps import AppConfig
 class QueryHandlerConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'query_handler'
+
+    def ready(self):
+        # Heavy modules (model clients, numpy, drivers for the async path) load on first use;
+        # warming up moves that cost to startup for deployments that prefer it there
+        from django.conf import settings
+
+        from . import checks  # Registers the system checks
+
+        if settings.LLM_WARM_UP or settings.SCHEMA_WARM_UP:
+            from .utils.nlp_utils import warm_up
+
+            warm_up(llm=settings.LLM_WARM_UP, schema=settings.SCHEMA_WARM_UP)
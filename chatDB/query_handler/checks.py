@@ -0,0 +1,14 @@
+from django.conf import settings
+from django.core.checks import Warning, register
+
+
+@register()
+def llm_settings_check(app_configs, **kwargs):
+    """The token is only needed once a question reaches the model, so a missing one is reported, not fatal."""
+    if getattr(settings, "LLM_BACKEND", "huggingface") == "huggingface" and not settings.HUGGINGFACE_API_TOKEN:
+        return [Warning(
+            "HUGGINGFACE_API_TOKEN is not set; questions that need the model will fail.",
+            hint="Set HUGGINGFACE_API_TOKEN, or LLM_BACKEND=local/stub.",
+            id="query_handler.W001",
+        )]
+    return []
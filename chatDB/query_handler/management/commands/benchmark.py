@@ -0,0 +1,118 @@
+import json
+import os
+import tempfile
+import threading
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from query_handler.utils.bench import DEMO_SCHEMA, FakeLLMServer, questions_for, run_load, seed_sqlite
+
+
+class Command(BaseCommand):
+    help = (
+        "Load-test /api/query/ with concurrent clients and report p50/p95/p99 latency and "
+        "requests/sec. By default everything runs in-process and offline: a fake LLM server "
+        "with configurable latency and a SQLite database seeded from the schema file."
+    )
+    requires_system_checks = []  # Settings are adjusted before the app's modules are imported
+
+    def add_arguments(self, parser):
+        parser.add_argument("--url", help="Benchmark a running server at this URL instead of starting one.")
+        parser.add_argument("--concurrency", type=int, default=8)
+        parser.add_argument("--requests", type=int, default=200, help="Total requests to send.")
+        parser.add_argument("--warmup", type=int, default=10, help="Requests sent before measuring.")
+        parser.add_argument("--llm-latency-ms", type=float, default=50.0)
+        parser.add_argument("--llm-jitter-ms", type=float, default=0.0)
+        parser.add_argument("--llm-error-rate", type=float, default=0.0, help="Fraction of LLM calls answered with 503.")
+        parser.add_argument("--rows", type=int, default=10_000, help="Rows seeded into every table.")
+        parser.add_argument("--schema", default=settings.SCHEMA_FILE, help="db_schema.json to seed from.")
+        parser.add_argument("--demo-schema", action="store_true", help="Seed a small built-in schema instead.")
+        parser.add_argument("--sqlite", help="SQLite file to seed (default: a temporary file).")
+        parser.add_argument("--reuse-data", action="store_true", help="Don't reseed an existing --sqlite file.")
+        parser.add_argument("--no-cache", action="store_true", help="Disable the translation and result caches.")
+        parser.add_argument("--keep-history", action="store_true", help="Keep the UserQuery rows the run creates.")
+        parser.add_argument("--json", action="store_true", help="Print the report as JSON.")
+
+    def handle(self, *args, **options):
+        if options["url"]:
+            report = self._load(options["url"], [f"Show all {t}" for t in self._schema(options)], options)
+            self._report(report, options)
+            return
+
+        with tempfile.TemporaryDirectory(prefix="chatdb-bench-") as workdir:
+            self._run_in_process(workdir, options)
+
+    def _schema(self, options):
+        if options["demo_schema"]:
+            return DEMO_SCHEMA
+        try:
+            with open(options["schema"]) as file:
+                return json.load(file)
+        except FileNotFoundError:
+            raise CommandError(f"Schema file '{options['schema']}' not found; pass --schema or --demo-schema.")
+
+    def _run_in_process(self, workdir, options):
+        schema = self._schema(options)
+        schema_file = Path(workdir) / "db_schema.json"
+        schema_file.write_text(json.dumps(schema))
+
+        sqlite_path = options["sqlite"] or str(Path(workdir) / "bench.sqlite3")
+        if not (options["reuse_data"] and os.path.exists(sqlite_path)):
+            self.stderr.write(f"Seeding {len(schema)} table(s) x {options['rows']:,} rows into {sqlite_path}...")
+            seed_sqlite(sqlite_path, schema, options["rows"])
+
+        llm = FakeLLMServer(options["llm_latency_ms"], options["llm_jitter_ms"], options["llm_error_rate"]).start()
+
+        # Point the app at the stand-ins; nothing below has been imported yet
+        settings.HUGGINGFACE_API_TOKEN = settings.HUGGINGFACE_API_TOKEN or "benchmark"
+        settings.LLM_BACKEND = "huggingface"
+        settings.HUGGINGFACE_API_URL = llm.url
+        settings.SQL_BACKEND = "sqlite"
+        settings.SQLITE_DATABASE = sqlite_path
+        settings.SCHEMA_FILE = str(schema_file)
+        settings.MYSQL_POOL = {**settings.MYSQL_POOL, "size": max(settings.MYSQL_POOL["size"], options["concurrency"])}
+        settings.ADMISSION = {**settings.ADMISSION, "enabled": False}  # Measure the service, not its rate limits
+        if options["no_cache"]:
+            settings.TRANSLATION_CACHE = {**settings.TRANSLATION_CACHE, "max_entries": 0}
+            settings.RESULT_CACHE = {**settings.RESULT_CACHE, "backend": "memory", "max_bytes": 0}
+
+        from django.core.servers.basehttp import ThreadedWSGIServer, WSGIRequestHandler
+        from django.core.wsgi import get_wsgi_application
+        from query_handler.models import UserQuery
+
+        class QuietHandler(WSGIRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+        server = ThreadedWSGIServer(("127.0.0.1", 0), QuietHandler)
+        server.set_app(get_wsgi_application())
+        threading.Thread(target=server.serve_forever, name="benchmark-server", daemon=True).start()
+
+        last_id = UserQuery.objects.order_by("-id").values_list("id", flat=True).first() or 0
+        try:
+            url = f"http://127.0.0.1:{server.server_address[1]}/api/query/"
+            report = self._load(url, questions_for(list(schema)), options)
+            report["llm_calls"] = llm.calls
+            self._report(report, options)
+        finally:
+            server.shutdown()
+            server.server_close()
+            llm.stop()
+            if not options["keep_history"]:
+                UserQuery.objects.filter(id__gt=last_id).delete()
+
+    def _load(self, url, questions, options):
+        if options["warmup"]:
+            run_load(url, questions, min(options["concurrency"], options["warmup"]), options["warmup"])
+        report = run_load(url, questions, options["concurrency"], options["requests"])
+        report["concurrency"] = options["concurrency"]
+        return report
+
+    def _report(self, report, options):
+        if options["json"]:
+            self.stdout.write(json.dumps(report, indent=2))
+            return
+        for key, value in report.items():
+            self.stdout.write(f"{key:>18}: {value}")
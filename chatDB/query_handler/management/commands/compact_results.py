@@ -0,0 +1,84 @@
+import datetime
+import json
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from query_handler.models import UserQuery
+from query_handler.utils.result_store import delete_result, store_result, stored_refs
+
+RESULT_FIELDS = ["response", "row_count", "columns", "result_hash", "result_ref", "result_rows", "result_bytes"]
+
+
+class Command(BaseCommand):
+    help = (
+        "Move JSON results still stored in UserQuery.response into the compressed result store, "
+        "drop stored rows older than the retention period (metadata is kept) and delete "
+        "unreferenced result files."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--retention-days", type=int, default=settings.RESULT_STORE["retention_days"],
+                            help="Drop stored rows of queries older than this; 0 keeps everything.")
+        parser.add_argument("--grace-seconds", type=int, default=3600,
+                            help="Never delete files younger than this (their rows may not be saved yet).")
+        parser.add_argument("--batch-size", type=int, default=500)
+        parser.add_argument("--dry-run", action="store_true")
+
+    def handle(self, *args, **options):
+        dry_run = options["dry_run"]
+        compacted = self._compact_legacy(options["batch_size"], dry_run)
+
+        expired = 0
+        if options["retention_days"]:
+            cutoff = timezone.now() - datetime.timedelta(days=options["retention_days"])
+            old = UserQuery.objects.filter(timestamp__lt=cutoff).exclude(result_ref=None)
+            expired = old.count() if dry_run else old.update(result_ref=None)
+
+        referenced = set(UserQuery.objects.exclude(result_ref=None).values_list("result_ref", flat=True))
+        newest_deletable = time.time() - options["grace_seconds"]
+        deleted = freed = 0
+        for ref, size, mtime in list(stored_refs()):
+            if ref not in referenced and mtime < newest_deletable:
+                if dry_run or delete_result(ref):
+                    deleted += 1
+                    freed += size
+
+        prefix = "Would have " if dry_run else ""
+        self.stdout.write(
+            f"{prefix}compacted {compacted} legacy result(s), expired {expired} result(s) past retention, "
+            f"deleted {deleted} unreferenced file(s) ({freed / 1024 / 1024:.1f} MiB)."
+        )
+
+    def _compact_legacy(self, batch_size, dry_run):
+        legacy = (UserQuery.objects.filter(result_ref=None, row_count=None)
+                  .exclude(response=None).exclude(response="").only("id", "response"))
+        compacted = 0
+        batch = []
+        for user_query in legacy.iterator(chunk_size=batch_size):
+            try:
+                rows = json.loads(user_query.response)
+            except ValueError:
+                continue
+            if not isinstance(rows, list):
+                continue  # Messages and errors are small; leave them in place
+            compacted += 1
+            if dry_run:
+                continue
+            stored = store_result(rows)
+            user_query.response = None
+            user_query.row_count = stored.row_count
+            user_query.columns = stored.columns
+            user_query.result_hash = stored.result_hash
+            user_query.result_ref = stored.ref
+            user_query.result_rows = stored.stored_rows
+            user_query.result_bytes = stored.stored_bytes
+            batch.append(user_query)
+            if len(batch) >= batch_size:
+                UserQuery.objects.bulk_update(batch, RESULT_FIELDS)
+                batch = []
+        if batch:
+            UserQuery.objects.bulk_update(batch, RESULT_FIELDS)
+        return compacted
@@ -0,0 +1,96 @@
+import json
+import os
+import re
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+IMPORTTIME_RE = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|( *)(\S+)$")
+
+# Libraries that must only load on first use (or in the warm-up hook), never on import
+DEFAULT_FORBIDDEN = "numpy,pandas,torch,transformers,spacy,nltk,httpx,aiomysql"
+
+
+def parse_importtime(output):
+    """Return [(module, self_us, cumulative_us, depth)] from `python -X importtime` stderr."""
+    entries = []
+    for line in output.splitlines():
+        match = IMPORTTIME_RE.match(line)
+        if match:
+            self_us, cumulative_us, indent, module = match.groups()
+            entries.append((module, int(self_us), int(cumulative_us), len(indent) // 2))
+    return entries
+
+
+class Command(BaseCommand):
+    help = (
+        "Report what importing the URLconf costs at startup, using `python -X importtime` "
+        "in a fresh interpreter, and fail if it exceeds a budget or loads a library that "
+        "should only load on first use."
+    )
+    requires_system_checks = []
+
+    def add_arguments(self, parser):
+        parser.add_argument("--module", default=settings.ROOT_URLCONF,
+                            help="Module to import after django.setup() (default: the URLconf).")
+        parser.add_argument("--runs", type=int, default=3,
+                            help="Interpreters to start; the fastest is reported (the first may compile .pyc files).")
+        parser.add_argument("--top", type=int, default=15, help="Heaviest modules and packages to list.")
+        parser.add_argument("--budget-ms", type=float, default=0,
+                            help="Fail if the import takes longer than this; 0 disables the check.")
+        parser.add_argument("--forbid", default=DEFAULT_FORBIDDEN,
+                            help="Comma-separated top-level packages that must not be imported.")
+        parser.add_argument("--json", action="store_true", help="Print the report as JSON.")
+
+    def handle(self, *args, **options):
+        runs = [self._measure(options["module"]) for _ in range(max(1, options["runs"]))]
+        entries = min(runs, key=lambda run: sum(e[1] for e in run))
+        total_ms = sum(e[1] for e in entries) / 1000
+
+        packages = {}
+        for module, self_us, _, _ in entries:
+            package = module.split(".")[0]
+            packages[package] = packages.get(package, 0) + self_us
+        heaviest = sorted(entries, key=lambda e: e[2], reverse=True)
+        project = [e for e in heaviest if e[0].split(".")[0] in ("query_handler", "chatDB")]
+        forbidden = {name.strip() for name in options["forbid"].split(",") if name.strip()}
+        loaded = sorted(forbidden & set(packages))
+
+        report = {
+            "module": options["module"],
+            "total_ms": round(total_ms, 1),
+            "modules": len(entries),
+            "packages": {name: round(us / 1000, 1) for name, us in
+                         sorted(packages.items(), key=lambda item: item[1], reverse=True)[:options["top"]]},
+            "project_modules": {m: round(cumulative / 1000, 1) for m, _, cumulative, _ in project[:options["top"]]},
+            "forbidden_loaded": loaded,
+        }
+        if options["json"]:
+            self.stdout.write(json.dumps(report, indent=2))
+        else:
+            self.stdout.write(f"import {report['module']}: {total_ms:.1f} ms, {len(entries)} modules")
+            self.stdout.write("\nBy package (self time):")
+            for name, ms in report["packages"].items():
+                self.stdout.write(f"{name:>40}: {ms:8.1f} ms")
+            self.stdout.write("\nProject modules (cumulative):")
+            for name, ms in report["project_modules"].items():
+                self.stdout.write(f"{name:>40}: {ms:8.1f} ms")
+
+        problems = []
+        if loaded:
+            problems.append(f"imported at startup: {', '.join(loaded)}")
+        if options["budget_ms"] and total_ms > options["budget_ms"]:
+            problems.append(f"{total_ms:.1f} ms is over the {options['budget_ms']:.0f} ms budget")
+        if problems:
+            raise CommandError("; ".join(problems))
+
+    def _measure(self, module):
+        code = f"import django; django.setup(); import importlib; importlib.import_module({module!r})"
+        env = {**os.environ, "DJANGO_SETTINGS_MODULE": os.environ.get("DJANGO_SETTINGS_MODULE", "chatDB.settings")}
+        result = subprocess.run([sys.executable, "-X", "importtime", "-c", code], cwd=settings.BASE_DIR,
+                                env=env, capture_output=True, text=True)
+        if result.returncode:
+            raise CommandError(f"Importing {module} failed:\n{result.stderr.splitlines()[-1] if result.stderr else ''}")
+        return parse_importtime(result.stderr)
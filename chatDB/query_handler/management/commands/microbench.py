@@ -0,0 +1,81 @@
+import datetime
+import json
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from query_handler.utils.bench import DEMO_SCHEMA, time_call
+
+SAMPLE_RESPONSES = {
+    "bare": "SELECT * FROM customers WHERE city = 'Paris'",
+    "prose": (
+        "Sure! Here is the query you asked for:\n\n"
+        "SELECT c.name, SUM(o.total) AS spent FROM customers c JOIN orders o ON o.customer_id = c.id "
+        "GROUP BY c.name ORDER BY spent DESC LIMIT 10;\n\nThis returns the top ten customers by spend."
+    ),
+    "multi": "SELECT id FROM orders; SELECT id FROM customers;",
+}
+
+
+class Command(BaseCommand):
+    help = "Micro-benchmarks for format_schema, extract_sql and result serialization/storage/rendering."
+    requires_system_checks = []
+
+    def add_arguments(self, parser):
+        parser.add_argument("--schema", default=settings.SCHEMA_FILE, help="db_schema.json to format.")
+        parser.add_argument("--tables", type=int, default=0,
+                            help="Benchmark a synthetic schema with this many tables instead.")
+        parser.add_argument("--rows", type=int, default=1000, help="Rows in the serialized result.")
+        parser.add_argument("--json", action="store_true", help="Print the report as JSON.")
+
+    def handle(self, *args, **options):
+        from rest_framework.renderers import JSONRenderer
+        from query_handler.utils.nlp_utils import extract_sql
+        from query_handler.utils.schema_registry import format_schema
+        from query_handler.utils.result_store import encode_columnar
+        from query_handler.utils.result_format import ResultSet, encode_response
+
+        schema = self._schema(options)
+        rows = [
+            {
+                "id": i,
+                "name": f"customer_{i}",
+                "total": Decimal("123.45") + i,
+                "created_at": datetime.datetime(2024, 1, 1) + datetime.timedelta(minutes=i),
+                "registration_date": datetime.date(2023, 1, 1) + datetime.timedelta(days=i % 365),
+            }
+            for i in range(options["rows"])
+        ]
+        renderer = JSONRenderer()
+
+        report = {f"format_schema[{len(schema)} tables]": time_call(lambda: format_schema(schema))}
+        for name, response in SAMPLE_RESPONSES.items():
+            report[f"extract_sql[{name}]"] = time_call(lambda: extract_sql(response))
+        report[f"json_rows[{options['rows']} rows]"] = time_call(lambda: json.dumps(rows, default=str))
+        report[f"store_columnar[{options['rows']} rows]"] = time_call(lambda: encode_columnar(rows))
+        report[f"drf_render[{options['rows']} rows]"] = time_call(lambda: renderer.render({"results": rows}))
+        columns, tuples = list(rows[0]), [tuple(row.values()) for row in rows]
+        # A fresh ResultSet each time: its payload is cached after the first encoding
+        report[f"columnar_render[{options['rows']} rows]"] = time_call(
+            lambda: encode_response({"results": ResultSet(columns, tuples)}))
+
+        if options["json"]:
+            self.stdout.write(json.dumps({k: round(v, 2) for k, v in report.items()}, indent=2))
+            return
+        for name, micros in report.items():
+            self.stdout.write(f"{name:>32}: {micros:12.2f} us/op")
+
+    def _schema(self, options):
+        if options["tables"]:
+            return {
+                f"table_{t}": {"columns": [{"name": f"column_{c}", "type": "int"} for c in range(20)]}
+                for t in range(options["tables"])
+            }
+        try:
+            with open(options["schema"]) as file:
+                return json.load(file)
+        except FileNotFoundError:
+            if options["schema"] != settings.SCHEMA_FILE:
+                raise CommandError(f"Schema file '{options['schema']}' not found.")
+            return DEMO_SCHEMA
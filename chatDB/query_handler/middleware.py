@@ -0,0 +1,119 @@
+from contextlib import AsyncExitStack, ExitStack
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.http import JsonResponse
+
+from .utils.admission import AdmissionRejected, client_id, get_admission, tenant_id
+from .utils.tracing import span, start_trace, tracing_enabled
+
+# Endpoint label for paths that don't resolve to a view, so scanners can't mint new metric series
+UNRESOLVED_ENDPOINT = "unresolved"
+
+
+class TracingMiddleware:
+    """
+    Trace requests under TRACING['path_prefix']: each gets a per-stage latency
+    breakdown, a structured log line and an X-Trace-Id response header.
+    Does nothing while TRACING['enabled'] is off.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.path_prefix = getattr(settings, "TRACING", {}).get("path_prefix", "/api/")
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def _traced(self, request):
+        return tracing_enabled() and request.path.startswith(self.path_prefix)
+
+    def _trace_name(self, request):
+        match = getattr(request, "resolver_match", None)
+        return (match.url_name if match else None) or UNRESOLVED_ENDPOINT
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not self._traced(request):
+            return self.get_response(request)
+
+        with start_trace(UNRESOLVED_ENDPOINT, method=request.method, path=request.path) as trace:
+            response = self.get_response(request)
+            self._finish(trace, request, response)
+        return response
+
+    async def __acall__(self, request):
+        if not self._traced(request):
+            return await self.get_response(request)
+
+        with start_trace(UNRESOLVED_ENDPOINT, method=request.method, path=request.path) as trace:
+            response = await self.get_response(request)
+            self._finish(trace, request, response)
+        return response
+
+    def _finish(self, trace, request, response):
+        trace.name = self._trace_name(request)
+        trace.status = str(response.status_code)
+        response["X-Trace-Id"] = trace.trace_id
+
+
+class AdmissionMiddleware:
+    """
+    Admission control for POST requests under ADMISSION['path_prefix']:
+    per-client and per-tenant request rate limits (429) and a global limit
+    on requests in flight with a bounded wait queue (503), both with
+    Retry-After. The LLM and SQL budgets are charged later, where the work
+    happens (see utils/admission.py). Does nothing while ADMISSION['enabled'] is off.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def _admitted(self, request):
+        admission = get_admission()
+        return admission.enabled and request.method == "POST" and request.path.startswith(admission.path_prefix)
+
+    def _identity(self, request):
+        return client_id(request, get_admission().client_header), tenant_id(request)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not self._admitted(request):
+            return self.get_response(request)
+
+        with ExitStack() as admitted:
+            try:
+                with span("admission"):
+                    admitted.enter_context(get_admission().admit(*self._identity(request)))
+            except AdmissionRejected as e:
+                return self._rejected(e)
+            # A streamed response keeps running after this returns, outside the in-flight limit
+            return self.get_response(request)
+
+    async def __acall__(self, request):
+        if not self._admitted(request):
+            return await self.get_response(request)
+
+        async with AsyncExitStack() as admitted:
+            try:
+                with span("admission"):
+                    identity = await sync_to_async(self._identity)(request)  # request.user may hit the database
+                    await admitted.enter_async_context(get_admission().aadmit(*identity))
+            except AdmissionRejected as e:
+                return self._rejected(e)
+            return await self.get_response(request)
+
+    def _rejected(self, error):
+        response = JsonResponse({"error": str(error)}, status=error.http_status)
+        if error.retry_after is not None:
+            response["Retry-After"] = str(max(1, round(error.retry_after)))
+        return response
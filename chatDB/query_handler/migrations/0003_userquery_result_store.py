@@ -0,0 +1,43 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('query_handler', '0002_userquery_job_state'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userquery',
+            name='columns',
+            field=models.JSONField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='userquery',
+            name='result_bytes',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='userquery',
+            name='result_hash',
+            field=models.CharField(blank=True, db_index=True, max_length=64, null=True),
+        ),
+        migrations.AddField(
+            model_name='userquery',
+            name='result_ref',
+            field=models.CharField(blank=True, max_length=64, null=True),
+        ),
+        migrations.AddField(
+            model_name='userquery',
+            name='result_rows',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='userquery',
+            name='row_count',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+    ]
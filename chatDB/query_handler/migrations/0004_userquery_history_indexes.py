@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('query_handler', '0003_userquery_result_store'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userquery',
+            name='latency_ms',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='userquery',
+            index=models.Index(fields=['-timestamp', '-id'], name='userquery_recent_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='userquery',
+            index=models.Index(fields=['status', '-timestamp', '-id'], name='userquery_status_recent_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='userquery',
+            index=models.Index(fields=['latency_ms'], name='userquery_latency_idx'),
+        ),
+    ]
@@ -0,0 +1,55 @@
+from django.db import migrations
+
+# Full-text search over query and generated_query (see utils/history.py). SQLite gets an
+# external-content FTS5 table kept in sync by triggers, MySQL a FULLTEXT index; other
+# backends fall back to substring matching and need nothing here.
+SQLITE_FORWARD = [
+    """CREATE VIRTUAL TABLE query_handler_userquery_fts USING fts5(
+        query, generated_query, content='query_handler_userquery', content_rowid='id'
+    )""",
+    """CREATE TRIGGER query_handler_userquery_fts_insert AFTER INSERT ON query_handler_userquery BEGIN
+        INSERT INTO query_handler_userquery_fts(rowid, query, generated_query)
+        VALUES (new.id, new.query, new.generated_query);
+    END""",
+    """CREATE TRIGGER query_handler_userquery_fts_delete AFTER DELETE ON query_handler_userquery BEGIN
+        INSERT INTO query_handler_userquery_fts(query_handler_userquery_fts, rowid, query, generated_query)
+        VALUES ('delete', old.id, old.query, old.generated_query);
+    END""",
+    """CREATE TRIGGER query_handler_userquery_fts_update AFTER UPDATE OF query, generated_query
+    ON query_handler_userquery BEGIN
+        INSERT INTO query_handler_userquery_fts(query_handler_userquery_fts, rowid, query, generated_query)
+        VALUES ('delete', old.id, old.query, old.generated_query);
+        INSERT INTO query_handler_userquery_fts(rowid, query, generated_query)
+        VALUES (new.id, new.query, new.generated_query);
+    END""",
+    "INSERT INTO query_handler_userquery_fts(query_handler_userquery_fts) VALUES ('rebuild')",
+]
+SQLITE_BACKWARD = [
+    "DROP TRIGGER IF EXISTS query_handler_userquery_fts_update",
+    "DROP TRIGGER IF EXISTS query_handler_userquery_fts_delete",
+    "DROP TRIGGER IF EXISTS query_handler_userquery_fts_insert",
+    "DROP TABLE IF EXISTS query_handler_userquery_fts",
+]
+MYSQL_FORWARD = ["CREATE FULLTEXT INDEX userquery_fulltext_idx ON query_handler_userquery (query, generated_query)"]
+MYSQL_BACKWARD = ["DROP INDEX userquery_fulltext_idx ON query_handler_userquery"]
+
+
+def _run(statements_by_vendor):
+    def run(apps, schema_editor):
+        for statement in statements_by_vendor.get(schema_editor.connection.vendor, []):
+            schema_editor.execute(statement)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('query_handler', '0004_userquery_history_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            _run({"sqlite": SQLITE_FORWARD, "mysql": MYSQL_FORWARD}),
+            _run({"sqlite": SQLITE_BACKWARD, "mysql": MYSQL_BACKWARD}),
+        ),
+    ]
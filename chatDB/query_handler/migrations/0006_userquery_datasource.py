@@ -0,0 +1,22 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('query_handler', '0005_userquery_fulltext'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userquery',
+            name='datasource',
+            field=models.CharField(default='default', max_length=64),
+        ),
+        migrations.AddIndex(
+            model_name='userquery',
+            index=models.Index(fields=['datasource', '-timestamp', '-id'], name='userquery_ds_recent_idx'),
+        ),
+    ]
@@ -0,0 +1,41 @@
+from django.db import migrations
+
+# SQLite applies 0006's AddField/AddIndex by rebuilding query_handler_userquery (create, copy, drop,
+# rename), which drops the FTS5 sync triggers created in 0005. Recreate them and rebuild the index
+# so rows saved since then are searchable. Any later migration that rebuilds the table on SQLite
+# has to do the same.
+SQLITE_FORWARD = [
+    """CREATE TRIGGER IF NOT EXISTS query_handler_userquery_fts_insert AFTER INSERT ON query_handler_userquery BEGIN
+        INSERT INTO query_handler_userquery_fts(rowid, query, generated_query)
+        VALUES (new.id, new.query, new.generated_query);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS query_handler_userquery_fts_delete AFTER DELETE ON query_handler_userquery BEGIN
+        INSERT INTO query_handler_userquery_fts(query_handler_userquery_fts, rowid, query, generated_query)
+        VALUES ('delete', old.id, old.query, old.generated_query);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS query_handler_userquery_fts_update AFTER UPDATE OF query, generated_query
+    ON query_handler_userquery BEGIN
+        INSERT INTO query_handler_userquery_fts(query_handler_userquery_fts, rowid, query, generated_query)
+        VALUES ('delete', old.id, old.query, old.generated_query);
+        INSERT INTO query_handler_userquery_fts(rowid, query, generated_query)
+        VALUES (new.id, new.query, new.generated_query);
+    END""",
+    "INSERT INTO query_handler_userquery_fts(query_handler_userquery_fts) VALUES ('rebuild')",
+]
+
+
+def recreate_triggers(apps, schema_editor):
+    if schema_editor.connection.vendor == "sqlite":
+        for statement in SQLITE_FORWARD:
+            schema_editor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('query_handler', '0006_userquery_datasource'),
+    ]
+
+    operations = [
+        migrations.RunPython(recreate_triggers, migrations.RunPython.noop),
+    ]
@@ -1,13 +1,64 @@
+import json
+
 from django.db import models
 
+from .utils.result_store import load_result
+
 # Create your models here.
-from django.db import models
 
 class UserQuery(models.Model):
+    # Background jobs move queued -> running -> completed/failed; synchronous requests are saved completed
+    STATUS_QUEUED = "queued"
+    STATUS_RUNNING = "running"
+    STATUS_COMPLETED = "completed"
+    STATUS_FAILED = "failed"
+    STATUS_CHOICES = [
+        (STATUS_QUEUED, "Queued"),
+        (STATUS_RUNNING, "Running"),
+        (STATUS_COMPLETED, "Completed"),
+        (STATUS_FAILED, "Failed"),
+    ]
+
     query = models.TextField()  # User's natural language query
     generated_query = models.TextField(null=True, blank=True)  # SQL/NoSQL query
-    response = models.TextField(null=True, blank=True)  # Query result
+    response = models.TextField(null=True, blank=True)  # Non-row results (and rows of entries saved before result_ref)
     timestamp = models.DateTimeField(auto_now_add=True)  # When the query was made
+    datasource = models.CharField(max_length=64, default="default")  # Database it ran against, see utils/datasources.py
+    status = models.CharField(max_length=16, choices=STATUS_CHOICES, default=STATUS_COMPLETED)
+    error = models.TextField(null=True, blank=True)
+    started_at = models.DateTimeField(null=True, blank=True)  # When a worker picked the job up
+    finished_at = models.DateTimeField(null=True, blank=True)
+    translation_ms = models.FloatField(null=True, blank=True)  # Question -> SQL
+    execution_ms = models.FloatField(null=True, blank=True)  # Guard + SQL execution
+    latency_ms = models.FloatField(null=True, blank=True)  # Translation + execution, as the client waited for it
+    # Result rows live in the result store (utils/result_store.py); the table only keeps metadata
+    row_count = models.IntegerField(null=True, blank=True)
+    columns = models.JSONField(null=True, blank=True)
+    result_hash = models.CharField(max_length=64, null=True, blank=True, db_index=True)
+    result_ref = models.CharField(max_length=64, null=True, blank=True)  # None once retention removed the rows
+    result_rows = models.IntegerField(null=True, blank=True)  # Rows kept in the store, at most RESULT_STORE['max_rows']
+    result_bytes = models.IntegerField(null=True, blank=True)  # Compressed size
+
+    class Meta:
+        # History listings page by (timestamp, id) keysets, optionally within one status, datasource or latency range
+        indexes = [
+            models.Index(fields=["-timestamp", "-id"], name="userquery_recent_idx"),
+            models.Index(fields=["status", "-timestamp", "-id"], name="userquery_status_recent_idx"),
+            models.Index(fields=["latency_ms"], name="userquery_latency_idx"),
+            models.Index(fields=["datasource", "-timestamp", "-id"], name="userquery_ds_recent_idx"),
+        ]
+
+    @property
+    def finished(self):
+        return self.status in (self.STATUS_COMPLETED, self.STATUS_FAILED)
+
+    def load_results(self):
+        """Load the stored result rows on demand; None if there are none (or they were expired)."""
+        if self.result_ref:
+            return load_result(self.result_ref)
+        if self.response:
+            return json.loads(self.response)
+        return None
 
     def __str__(self):
         return self.query
@@ -0,0 +1,66 @@
+from importlib.util import find_spec
+
+from rest_framework.renderers import BaseRenderer, BrowsableAPIRenderer, JSONRenderer
+
+from .utils.result_format import ResultSet, encode_arrow, encode_msgpack, encode_response
+
+BINARY_FORMATS = ("msgpack", "arrow")
+
+
+class ResultJSONRenderer(JSONRenderer):
+    """
+    JSONRenderer that writes a response whose "results" is a ResultSet in a
+    single pass: the rows' encoded payload is spliced in as is. Everything
+    else renders exactly as with DRF's JSONRenderer.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if isinstance(data, dict) and isinstance(data.get("results"), ResultSet):
+            return encode_response(data)
+        return super().render(data, accepted_media_type, renderer_context)
+
+
+class MessagePackRenderer(BaseRenderer):
+    media_type = "application/x-msgpack"
+    format = "msgpack"
+    charset = None
+    render_style = "binary"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return encode_msgpack(data if isinstance(data, dict) else {"results": data})
+
+
+class ArrowRenderer(BaseRenderer):
+    """Arrow IPC stream of the result rows; the rest of the response is in the schema metadata."""
+
+    media_type = "application/vnd.apache.arrow.stream"
+    format = "arrow"
+    charset = None
+    render_style = "binary"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return encode_arrow(data if isinstance(data, dict) else {"results": data})
+
+
+def result_renderer_classes():
+    """
+    Renderers for views returning query results. The binary ones are only
+    offered when their optional library is installed, so content
+    negotiation answers 406 rather than failing while rendering.
+    """
+    renderers = [ResultJSONRenderer, BrowsableAPIRenderer]
+    if find_spec("msgpack"):
+        renderers.append(MessagePackRenderer)
+    if find_spec("pyarrow"):
+        renderers.append(ArrowRenderer)
+    return renderers
+
+
+def wants_columnar(request):
+    """
+    Columnar results when the client asks for them, with "columnar" in the
+    body or query string, and always in the binary formats.
+    """
+    accepted = getattr(request, "accepted_renderer", None)
+    return (bool(request.data.get("columnar")) or request.query_params.get("columnar", "").lower() in ("1", "true")
+            or getattr(accepted, "format", None) in BINARY_FORMATS)
@@ -1,3 +1,4 @@
+from django.conf import settings
 from rest_framework import serializers
 from .models import UserQuery
 
@@ -5,3 +6,17 @@ class UserQuerySerializer(serializers.ModelSerializer):
     class Meta:
         model = UserQuery
         fields = '__all__'
+        read_only_fields = ('datasource', 'status', 'error', 'started_at', 'finished_at',
+                            'translation_ms', 'execution_ms', 'latency_ms',
+                            'row_count', 'columns', 'result_hash', 'result_ref', 'result_rows', 'result_bytes')
+
+
+class QueryOptionsSerializer(serializers.Serializer):
+    """Result delivery options of a POST /api/query/ request."""
+
+    page_size = serializers.IntegerField(min_value=1, required=False, allow_null=True)
+
+    def validate_page_size(self, value):
+        if value is not None and value > settings.MAX_PAGE_SIZE:
+            raise serializers.ValidationError(f"Ensure this value is less than or equal to {settings.MAX_PAGE_SIZE}.")
+        return value
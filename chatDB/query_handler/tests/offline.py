@@ -0,0 +1,71 @@
+"""Test fixtures built on the offline stand-ins in utils/bench.py."""
+import json
+import os
+import tempfile
+from unittest import mock
+
+from django.conf import settings
+from django.core.cache import cache
+from django.test import override_settings
+
+from query_handler.utils import admission, datasources, example_store, nlp_utils, result_cache
+from query_handler.utils.bench import DEMO_SCHEMA, seed_sqlite
+from query_handler.utils.db_pool import discard_pool, get_default_pool
+
+ROWS = 25
+
+# Process-wide singletons built from settings on first use
+SINGLETONS = [
+    (nlp_utils, "_backend"), (nlp_utils, "_translation_cache"), (datasources, "_registry"),
+    (admission, "_admission"), (result_cache, "_result_cache"), (example_store, "_store"),
+]
+
+
+class SeededSQLiteMixin:
+    """A temporary directory per test, with SQLite databases seeded from DEMO_SCHEMA."""
+
+    def setUp(self):
+        super().setUp()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+
+    def seed(self, name="demo", rows=ROWS):
+        path = os.path.join(self.directory, f"{name}.sqlite3")
+        seed_sqlite(path, DEMO_SCHEMA, rows)
+        return path
+
+
+class OfflineAPIMixin(SeededSQLiteMixin):
+    """
+    Serve the API from the stub model and a seeded SQLite database, with
+    fresh caches, registry and admission control for every test.
+    """
+
+    admission = {"enabled": False}
+
+    def setUp(self):
+        super().setUp()
+        database = self.seed()
+        schema_file = os.path.join(self.directory, "schema.json")
+        with open(schema_file, "w") as f:
+            json.dump(DEMO_SCHEMA, f)
+
+        settings_override = override_settings(
+            ALLOWED_HOSTS=["testserver"], LLM_BACKEND="stub", SQL_BACKEND="sqlite",
+            SQLITE_DATABASE=database, SCHEMA_FILE=schema_file, DATASOURCES={}, DATASOURCES_FILE=None,
+            RESULT_STORE={**settings.RESULT_STORE, "path": os.path.join(self.directory, "results")},
+            ADMISSION={**settings.ADMISSION, "client_header": "X-API-Key", **self.admission},
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        for module, name in SINGLETONS:
+            patcher = mock.patch.object(module, name, None)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.addCleanup(cache.clear)  # Admission counters and buckets
+        self.addCleanup(lambda: discard_pool(get_default_pool()))
+
+    def ask(self, question, client="tester", path="/api/query/", **data):
+        return self.client.post(path, {"query": question, **data}, content_type="application/json",
+                                HTTP_X_API_KEY=client)
@@ -0,0 +1,60 @@
+from django.test import TestCase, TransactionTestCase
+
+from query_handler.models import UserQuery
+from query_handler.tests.offline import OfflineAPIMixin
+from query_handler.utils.admission import get_admission
+
+
+class AdmissionTests(OfflineAPIMixin, TestCase):
+    admission = {
+        "enabled": True, "max_in_flight": 1, "max_queue": 0, "queue_timeout": 0.1, "retry_after": 7,
+        "buckets": {"request": {"client": (0.01, 3)}, "llm": {"client": (0.01, 1)}},
+    }
+
+    def test_request_budget_is_per_client(self):
+        statuses = [self.ask("list orders", client="a").status_code for _ in range(4)]
+        self.assertEqual(statuses, [201, 201, 201, 429])
+        response = self.ask("list orders", client="a")
+        self.assertGreater(int(response["Retry-After"]), 0)
+        self.assertEqual(self.ask("list orders", client="b").status_code, 201)
+
+    def test_llm_budget_is_charged_only_for_model_calls(self):
+        self.assertEqual(self.ask("list orders", client="a").status_code, 201)
+        response = self.ask("list customers", client="a")
+        self.assertEqual(response.status_code, 429)
+        self.assertIn("LLM", response.json()["error"])
+        self.assertEqual(self.ask("list orders", client="a").status_code, 201)  # Translation cache hit
+
+    def test_overloaded_when_every_slot_is_taken(self):
+        get_admission().enter()
+        try:
+            response = self.ask("list orders")
+            self.assertEqual(response.status_code, 503)
+            self.assertEqual(response["Retry-After"], "7")
+            self.assertEqual(self.ask("list orders", path="/api/query/async/").status_code, 503)
+        finally:
+            get_admission().leave()
+        self.assertEqual(self.ask("list orders").status_code, 201)
+
+    def test_only_query_posts_are_admitted(self):
+        get_admission().enter()
+        try:
+            self.assertEqual(self.client.get("/api/query/history/").status_code, 200)
+        finally:
+            get_admission().leave()
+
+
+class JobAdmissionTests(OfflineAPIMixin, TransactionTestCase):
+    admission = {"enabled": True, "buckets": {"llm": {"client": (0.01, 1)}}}
+
+    def test_jobs_are_charged_to_the_submitting_client(self):
+        self.assertEqual(self.ask("list orders", client="a").status_code, 201)
+        response = self.ask("list customers", client="a", path="/api/query/jobs/")
+        self.assertEqual(response.status_code, 202)
+        job = self.client.get(response.json()["status_url"], {"wait": 10}).json()
+        self.assertEqual(job["status"], UserQuery.STATUS_FAILED)
+        self.assertIn("LLM", job["error"])
+
+        response = self.ask("list customers", client="b", path="/api/query/jobs/")
+        job = self.client.get(response.json()["status_url"], {"wait": 10}).json()
+        self.assertEqual(job["status"], UserQuery.STATUS_COMPLETED, job["error"])
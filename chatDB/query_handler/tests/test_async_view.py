@@ -0,0 +1,20 @@
+from django.test import TestCase
+
+from query_handler.models import UserQuery
+from query_handler.tests.offline import ROWS, OfflineAPIMixin
+
+
+class AsyncQueryViewTests(OfflineAPIMixin, TestCase):
+    def test_query_runs_and_is_saved(self):
+        response = self.ask("list customers", path="/api/query/async/")
+        self.assertEqual(response.status_code, 201)
+        body = response.json()
+        self.assertEqual(len(body["results"]), ROWS)
+        saved = UserQuery.objects.get()
+        self.assertEqual((saved.query, saved.generated_query), ("list customers", body["generated_query"]))
+
+    def test_invalid_requests(self):
+        response = self.client.post("/api/query/async/", "not json", content_type="application/json")
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.ask("", path="/api/query/async/").status_code, 400)
+        self.assertEqual(self.client.get("/api/query/async/").status_code, 405)
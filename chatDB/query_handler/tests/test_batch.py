@@ -0,0 +1,28 @@
+from django.conf import settings
+from django.test import TestCase
+
+from query_handler.models import UserQuery
+from query_handler.tests.offline import ROWS, OfflineAPIMixin
+
+
+class QueryBatchTests(OfflineAPIMixin, TestCase):
+    def batch(self, questions, **data):
+        return self.client.post("/api/query/batch/", {"questions": questions, **data}, content_type="application/json")
+
+    def test_questions_are_answered_in_order(self):
+        questions = ["list orders", "list customers", "list products"]
+        response = self.batch(questions)
+        self.assertEqual(response.status_code, 200)
+        body = response.json()
+        self.assertEqual((body["completed"], body["failed"]), (3, 0))
+        self.assertEqual([item["query"] for item in body["results"]], questions)
+        for item, table in zip(body["results"], ("orders", "customers", "products")):
+            self.assertTrue(item["generated_query"].endswith(f"* FROM {table} LIMIT 1000"))
+            self.assertEqual(len(item["results"]), ROWS)
+        self.assertEqual(UserQuery.objects.filter(status=UserQuery.STATUS_COMPLETED).count(), 3)
+
+    def test_invalid_batches(self):
+        for questions in ([], "list orders", ["list orders", ""], ["list orders"] * (settings.QUERY_BATCH["max_questions"] + 1)):
+            with self.subTest(questions=questions):
+                self.assertEqual(self.batch(questions).status_code, 400)
+        self.assertFalse(UserQuery.objects.exists())
@@ -0,0 +1,51 @@
+import sqlite3
+
+from django.test import SimpleTestCase
+
+from query_handler.tests.offline import SeededSQLiteMixin
+from query_handler.utils.bench import DEMO_SCHEMA, FakeLLMServer, percentile, run_load, summarize
+
+
+class SeedSQLiteTests(SeededSQLiteMixin, SimpleTestCase):
+    def test_every_table_is_filled_and_foreign_keys_resolve(self):
+        path = self.seed(rows=50)
+        connection = sqlite3.connect(path)
+        self.addCleanup(connection.close)
+        for table in DEMO_SCHEMA:
+            self.assertEqual(connection.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0], 50)
+        orphans = connection.execute(
+            "SELECT COUNT(*) FROM orders o LEFT JOIN customers c ON c.id = o.customer_id "
+            "LEFT JOIN products p ON p.id = o.product_id WHERE c.id IS NULL OR p.id IS NULL").fetchone()[0]
+        self.assertEqual(orphans, 0)
+
+    def test_seeding_is_deterministic(self):
+        first = sqlite3.connect(self.seed("first", rows=10))
+        second = sqlite3.connect(self.seed("second", rows=10))
+        self.addCleanup(first.close)
+        self.addCleanup(second.close)
+        query = "SELECT * FROM orders ORDER BY id"
+        self.assertEqual(first.execute(query).fetchall(), second.execute(query).fetchall())
+
+
+class LoadReportTests(SimpleTestCase):
+    def test_summarize(self):
+        report = summarize([0.01, 0.02, 0.03, 0.04], 2.0, {201: 3, 503: 1})
+        self.assertEqual((report["requests"], report["errors"], report["requests_per_s"]), (4, 1, 2.0))
+        self.assertEqual(report["statuses"], {"201": 3, "503": 1})
+        self.assertEqual((report["latency_ms_p50"], report["latency_ms_max"]), (30.0, 40.0))
+        self.assertEqual(percentile([], 0.5), 0.0)
+
+
+class FakeLLMServerTests(SimpleTestCase):
+    def test_answers_in_the_inference_api_format(self):
+        server = FakeLLMServer(latency_ms=0.0).start()
+        self.addCleanup(server.stop)
+        report = run_load(server.url, ["Table 'orders': id\nUser Query: list orders"], concurrency=2, total_requests=6)
+        self.assertEqual(report["statuses"], {"200": 6})
+        self.assertEqual(server.calls, 6)
+
+    def test_error_rate(self):
+        server = FakeLLMServer(latency_ms=0.0, error_rate=1.0).start()
+        self.addCleanup(server.stop)
+        report = run_load(server.url, ["list orders"], concurrency=1, total_requests=3)
+        self.assertEqual((report["statuses"], report["errors"]), ({"503": 3}, 3))
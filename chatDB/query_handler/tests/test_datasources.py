@@ -0,0 +1,134 @@
+import asyncio
+import os
+
+from django.conf import settings
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from query_handler.tests.offline import OfflineAPIMixin, SeededSQLiteMixin
+from query_handler.utils.datasources import DatasourceBusy, DatasourceRegistry, UnknownDatasource, get_datasource_registry
+from query_handler.utils.db_pool import PoolTimeout, discard_pool
+
+
+class DatasourceRegistryTests(SeededSQLiteMixin, SimpleTestCase):
+    def setUp(self):
+        super().setUp()
+        self.database = self.seed(rows=5)
+        self.datasources = {
+            name: {"backend": "sqlite", "database": self.seed(name, rows=5), "schema_file": os.path.join(self.directory, f"{name}.json")}
+            for name in ("acme", "globex", "initech")
+        }
+        settings_override = override_settings(DATASOURCES=self.datasources, DATASOURCES_FILE=None,
+                                              SQL_BACKEND="sqlite", SQLITE_DATABASE=self.database)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def registry(self, **options):
+        registry = DatasourceRegistry(**{"max_concurrency": 1, "queue_timeout": 0.05, **options})
+        self.addCleanup(lambda: [datasource.close() for datasource in registry._active.values()])
+        return registry
+
+    def test_unknown_datasource(self):
+        with self.assertRaises(UnknownDatasource), self.registry().use("umbrella"):
+            pass
+
+    def test_datasources_have_their_own_pools(self):
+        registry = self.registry()
+        with registry.use("acme") as acme:
+            acme_pool = acme.pool
+        with registry.use("globex") as globex:
+            self.assertIsNot(globex.pool, acme_pool)
+        with registry.use(None) as default:
+            self.assertEqual(default.name, "default")
+            self.assertEqual(default.pool.label, f"sqlite:{self.database}")
+            discard_pool(default.pool)  # The default datasource is never evicted
+
+    def test_busy_datasource_rejects_after_queue_timeout(self):
+        registry = self.registry()
+        with registry.use("acme"):
+            with self.assertRaises(DatasourceBusy):
+                with registry.use("acme"):
+                    pass
+            with registry.use("globex"):  # Other tenants are unaffected
+                pass
+        with registry.use("acme") as acme:
+            self.assertEqual((acme.served, acme.rejected), (2, 1))
+
+    def test_async_use_waits_without_blocking_the_loop(self):
+        registry = self.registry(queue_timeout=1.0)
+
+        async def main():
+            order = []
+
+            async def hold():
+                async with registry.ause("acme"):
+                    order.append("first")
+                    await asyncio.sleep(0.05)
+
+            async def wait():
+                await asyncio.sleep(0.01)
+                async with registry.ause("acme"):
+                    order.append("second")
+
+            await asyncio.gather(hold(), wait())
+            return order
+
+        self.assertEqual(asyncio.run(main()), ["first", "second"])
+
+    def test_least_recently_used_datasource_is_evicted(self):
+        registry = self.registry(max_active=2)
+        with registry.use("acme") as acme:
+            acme_pool = acme.pool
+        with registry.use("globex"):
+            pass
+        with registry.use("initech"):
+            pass
+
+        self.assertEqual(list(registry._active), ["globex", "initech"])
+        self.assertEqual(registry.evictions, 1)
+        with self.assertRaises(PoolTimeout):
+            acme_pool.acquire()  # Closed with its datasource
+        with registry.use("acme") as acme:
+            self.assertIsNot(acme.pool, acme_pool)
+
+    def test_eviction_leaves_pools_of_the_same_database_open(self):
+        with override_settings(DATASOURCES={**self.datasources, "twin": self.datasources["acme"]}):
+            registry = self.registry(max_active=2)
+        with registry.use("acme") as acme:
+            acme_pool = acme.pool
+        with registry.use("twin") as twin:
+            twin_pool = twin.pool
+        with registry.use("globex"):
+            pass
+
+        self.assertEqual(list(registry._active), ["twin", "globex"])
+        with self.assertRaises(PoolTimeout):
+            acme_pool.acquire()
+        with twin_pool.connection():  # Same database file, but its own pool
+            pass
+
+    def test_datasource_in_use_is_not_evicted(self):
+        registry = self.registry(max_active=1)
+        with registry.use("acme"):
+            with registry.use("globex"):
+                pass
+            self.assertEqual(list(registry._active), ["acme", "globex"])
+        registry.stats()  # Evicts now that acme is free
+        self.assertEqual(list(registry._active), ["globex"])
+
+
+class DatasourceRoutingTests(OfflineAPIMixin, TestCase):
+    def test_unknown_database_is_a_404(self):
+        for path in ("/api/query/", "/api/query/async/"):
+            with self.subTest(path=path):
+                response = self.ask("list orders", path=path, database="umbrella")
+                self.assertEqual(response.status_code, 404)
+                self.assertIn("umbrella", response.json()["error"])
+
+    def test_query_runs_on_the_named_database(self):
+        tenant = self.seed("acme", rows=3)
+        self.addCleanup(lambda: [datasource.close() for datasource in get_datasource_registry()._active.values()])
+        with override_settings(DATASOURCES={"acme": {"backend": "sqlite", "database": tenant,
+                                                     "schema_file": settings.SCHEMA_FILE}}):
+            response = self.ask("list orders", database="acme")
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(response.json()["results"]), 3)
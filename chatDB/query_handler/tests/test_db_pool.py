@@ -0,0 +1,40 @@
+import threading
+
+from django.test import SimpleTestCase
+
+from query_handler.tests.offline import SeededSQLiteMixin
+from query_handler.utils.db_pool import PoolTimeout, SQLitePool
+
+
+class ConnectionPoolTests(SeededSQLiteMixin, SimpleTestCase):
+    def setUp(self):
+        super().setUp()
+        self.pool = SQLitePool({"database": self.seed(rows=5)}, size=2, checkout_timeout=0.05)
+        self.addCleanup(self.pool.close)
+
+    def test_connections_are_reused(self):
+        with self.pool.connection() as first:
+            pass
+        with self.pool.connection() as second:
+            self.assertIs(second, first)
+        stats = self.pool.stats()
+        self.assertEqual((stats["open"], stats["idle"], stats["in_use"], stats["checkouts"]), (1, 1, 0, 2))
+
+    def test_checkout_times_out_when_exhausted(self):
+        held = [self.pool.acquire(), self.pool.acquire()]
+        with self.assertRaises(PoolTimeout):
+            self.pool.acquire()
+        self.assertEqual(self.pool.stats()["timeouts"], 1)
+
+        # A released connection goes to the next waiter
+        got = []
+        waiter = threading.Thread(target=lambda: got.append(self.pool.acquire(timeout=2)))
+        waiter.start()
+        self.pool.release(held[0])
+        waiter.join()
+        self.assertIs(got[0], held[0])
+
+    def test_closed_pool_refuses_checkouts(self):
+        self.pool.close()
+        with self.assertRaisesMessage(PoolTimeout, "closed"):
+            self.pool.acquire()
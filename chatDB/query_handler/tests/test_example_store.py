@@ -0,0 +1,50 @@
+from django.test import TestCase
+
+from query_handler.models import UserQuery
+from query_handler.utils.bench import DEMO_SCHEMA
+from query_handler.utils.example_store import ExampleStore
+from query_handler.utils.schema_registry import SchemaSnapshot
+
+
+class ExampleStoreTests(TestCase):
+    def setUp(self):
+        self.snapshot = SchemaSnapshot(DEMO_SCHEMA)
+        self.store = ExampleStore(min_similarity=0.1)
+
+    def save(self, datasource, question, sql):
+        return UserQuery.objects.create(datasource=datasource, query=question, generated_query=sql)
+
+    def test_examples_come_only_from_the_requesting_datasource(self):
+        self.save("acme", "customers in 'Springfield'", "SELECT * FROM customers WHERE city = 'Springfield'")
+        self.save("globex", "customers in 'Shelbyville'", "SELECT * FROM customers WHERE city = 'Shelbyville'")
+        self.store.refresh()
+
+        acme = self.store.examples_for(self.snapshot, "customers in 'Capital City'", "acme")
+        globex = self.store.examples_for(self.snapshot, "customers in 'Capital City'", "globex")
+        self.assertEqual([question for question, _ in acme], ["customers in 'Springfield'"])
+        self.assertEqual([question for question, _ in globex], ["customers in 'Shelbyville'"])
+        self.assertEqual(self.store.examples_for(self.snapshot, "customers in 'Capital City'", "initech"), [])
+
+    def test_refresh_adds_new_rows_and_skips_invalid_sql(self):
+        self.save("default", "list all products", "SELECT * FROM products")
+        self.save("default", "list all suppliers", "SELECT * FROM suppliers")  # No such table
+        self.store.refresh()
+        self.assertEqual(self.store.examples_for(self.snapshot, "list products"), [("list all products", "SELECT * FROM products")])
+
+        self.save("default", "count products", "SELECT COUNT(*) FROM products")
+        self.store.refresh()
+        questions = [question for question, _ in self.store.examples_for(self.snapshot, "count all products")]
+        self.assertEqual(questions[0], "count products")
+
+    def test_busy_datasource_does_not_evict_the_others_examples(self):
+        store = ExampleStore(min_similarity=0.1, max_examples=2)
+        self.save("acme", "list all products", "SELECT * FROM products")
+        store.refresh()
+        for city in ("Springfield", "Shelbyville", "Ogdenville"):
+            self.save("globex", f"customers in '{city}'", f"SELECT * FROM customers WHERE city = '{city}'")
+            store.refresh()
+
+        self.assertEqual(store.examples_for(self.snapshot, "list products", "acme"),
+                         [("list all products", "SELECT * FROM products")])
+        self.assertEqual(len(store.examples_for(self.snapshot, "customers in 'Springfield'", "globex")), 2)
+        self.assertEqual(store.stats()["history_rows"], 3)
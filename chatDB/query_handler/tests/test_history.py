@@ -0,0 +1,69 @@
+from django.db import connection
+from django.test import TestCase, override_settings
+
+from query_handler.models import UserQuery
+from query_handler.tests.offline import OfflineAPIMixin
+from query_handler.utils.history import apply_search
+
+
+@override_settings(ALLOWED_HOSTS=["testserver"])
+class HistorySearchTests(TestCase):
+    def test_sqlite_fulltext_triggers_survive_migrations(self):
+        if connection.vendor != "sqlite":
+            self.skipTest("FTS5 triggers are SQLite-only")
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT name FROM sqlite_master WHERE type = 'trigger' AND name LIKE 'query_handler_userquery_fts%'")
+            triggers = {row[0] for row in cursor.fetchall()}
+        self.assertEqual(triggers, {"query_handler_userquery_fts_insert", "query_handler_userquery_fts_delete",
+                                    "query_handler_userquery_fts_update"})
+
+    def test_new_query_is_found_by_search(self):
+        saved = UserQuery.objects.create(query="How many employees per department?",
+                                         generated_query="SELECT department, COUNT(*) FROM employees GROUP BY department")
+        UserQuery.objects.create(query="Total sales", generated_query="SELECT SUM(total) FROM orders")
+
+        self.assertEqual(list(apply_search(UserQuery.objects.all(), "employees")), [saved])
+        self.assertEqual(list(apply_search(UserQuery.objects.all(), "depart employ")), [saved])  # Prefixes
+
+        response = self.client.get("/api/query/history/", {"q": "employees"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([item["id"] for item in response.json()["results"]], [saved.id])
+
+    def test_search_follows_updates_and_deletes(self):
+        saved = UserQuery.objects.create(query="list employees", generated_query="SELECT * FROM employees")
+        saved.query = "list contractors"
+        saved.generated_query = "SELECT * FROM contractors"
+        saved.save()
+        self.assertFalse(apply_search(UserQuery.objects.all(), "employees").exists())
+        self.assertTrue(apply_search(UserQuery.objects.all(), "contractors").exists())
+
+        saved.delete()
+        self.assertFalse(apply_search(UserQuery.objects.all(), "contractors").exists())
+
+
+class HistoryAPITests(OfflineAPIMixin, TestCase):
+    def test_answered_queries_are_searchable(self):
+        self.ask("list orders")
+        self.ask("list customers")
+        response = self.client.get("/api/query/history/", {"q": "customers"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([item["query"] for item in response.json()["results"]], ["list customers"])
+
+    def test_cursor_pagination(self):
+        for table in ("orders", "customers", "products"):
+            self.ask(f"list {table}")
+        queries, cursor = [], None
+        while True:
+            params = {"limit": 2, **({"cursor": cursor} if cursor else {})}
+            body = self.client.get("/api/query/history/", params).json()
+            queries += [item["query"] for item in body["results"]]
+            cursor = body["next_cursor"]
+            if not cursor:
+                break
+        self.assertEqual(queries, ["list products", "list customers", "list orders"])
+        self.assertEqual(self.client.get("/api/query/history/", {"cursor": "bogus"}).status_code, 400)
+
+    def test_invalid_limit(self):
+        for limit in (0, -3, "ten"):
+            with self.subTest(limit=limit):
+                self.assertEqual(self.client.get("/api/query/history/", {"limit": limit}).status_code, 400)
@@ -0,0 +1,34 @@
+from django.test import TransactionTestCase
+
+from query_handler.models import UserQuery
+from query_handler.tests.offline import ROWS, OfflineAPIMixin
+
+
+class QueryJobTests(OfflineAPIMixin, TransactionTestCase):
+    """Jobs run on worker threads, which only see committed rows."""
+
+    def test_job_runs_in_the_background(self):
+        response = self.ask("list customers", path="/api/query/jobs/")
+        self.assertEqual(response.status_code, 202)
+        status_url = response.json()["status_url"]
+
+        response = self.client.get(status_url, {"wait": 10})
+        self.assertEqual(response.status_code, 200)
+        job = response.json()
+        self.assertEqual(job["status"], UserQuery.STATUS_COMPLETED, job.get("error"))
+        self.assertEqual(job["row_count"], ROWS)
+        self.assertEqual(len(job["results"]), ROWS)
+
+    def test_unknown_job_or_database(self):
+        self.assertEqual(self.client.get("/api/query/jobs/999/").status_code, 404)
+        response = self.ask("list customers", path="/api/query/jobs/", database="umbrella")
+        self.assertEqual(response.status_code, 404)
+        self.assertFalse(UserQuery.objects.exists())
+
+    def test_invalid_wait(self):
+        status_url = self.ask("list customers", path="/api/query/jobs/").json()["status_url"]
+        for wait in ("abc", "nan", ""):
+            with self.subTest(wait=wait):
+                response = self.client.get(status_url, {"wait": wait})
+                self.assertEqual(response.status_code, 400 if wait else 200)
+        self.assertEqual(self.client.get(status_url, {"wait": -5}).status_code, 200)
@@ -0,0 +1,77 @@
+import asyncio
+
+from django.test import SimpleTestCase
+
+from query_handler.utils.bench import FakeLLMServer
+from query_handler.utils.llm_client import LLMClient, LLMHTTPError, LLMUnavailable
+
+PROMPT = "Table 'orders': id, total\nUser Query: list orders"
+
+
+class LLMClientTests(SimpleTestCase):
+    def make_server(self, **options):
+        server = FakeLLMServer(**{"latency_ms": 0.0, **options}).start()
+        self.addCleanup(server.stop)
+        return server
+
+    def make_client(self, server, **options):
+        client = LLMClient(server.url, token="test", **{"timeout": 5.0, "backoff_base": 0.001, **options})
+        self.addCleanup(client.close)
+        return client
+
+    def test_generate(self):
+        server = self.make_server()
+        client = self.make_client(server)
+        self.assertEqual(client.generate(PROMPT), "SELECT * FROM orders")
+        self.assertEqual(asyncio.run(client.agenerate(PROMPT)), "SELECT * FROM orders")
+        self.assertEqual(server.calls, 2)
+        self.assertEqual(client.breaker.state, "closed")
+
+    def test_retryable_errors_are_retried_then_raised(self):
+        server = self.make_server(error_rate=1.0)
+        client = self.make_client(server, max_retries=3, breaker_failures=10)
+        with self.assertRaises(LLMHTTPError) as raised:
+            client.generate(PROMPT)
+        self.assertEqual(raised.exception.status_code, 503)
+        self.assertEqual(server.calls, 3)
+        self.assertEqual((client.retries, client.failures), (2, 1))
+
+    def test_circuit_breaker_opens_and_fails_fast(self):
+        server = self.make_server(error_rate=1.0)
+        client = self.make_client(server, max_retries=1, breaker_failures=2, breaker_reset=60.0)
+        for _ in range(2):
+            with self.assertRaises(LLMHTTPError):
+                client.generate(PROMPT)
+        self.assertEqual(client.breaker.state, "open")
+
+        with self.assertRaises(LLMUnavailable) as raised:
+            client.generate(PROMPT)
+        self.assertEqual(server.calls, 2)  # The provider wasn't called
+        self.assertGreater(raised.exception.retry_after, 0)
+        self.assertEqual(raised.exception.http_status, 503)
+
+    def test_breaker_closes_after_a_successful_trial_call(self):
+        server = self.make_server(error_rate=1.0)
+        client = self.make_client(server, max_retries=1, breaker_failures=1, breaker_reset=0.0)
+        with self.assertRaises(LLMHTTPError):
+            client.generate(PROMPT)
+        self.assertEqual(client.breaker.state, "half_open")  # reset_timeout 0: the next call is the trial
+
+        server.error_rate = 0.0
+        self.assertEqual(client.generate(PROMPT), "SELECT * FROM orders")
+        self.assertEqual(client.breaker.state, "closed")
+
+    def test_slow_call_is_hedged(self):
+        server = self.make_server(latency_ms=200.0)
+        client = self.make_client(server, hedge=True, hedge_percentile=0.5, hedge_min_samples=1)
+        client.latencies.record(0.01)  # Past calls took 10ms, so a 200ms call is an outlier
+
+        self.assertEqual(client.generate(PROMPT), "SELECT * FROM orders")
+        self.assertEqual(client.hedges, 1)
+        self.assertEqual(server.calls, 2)
+
+    def test_no_hedge_without_enough_samples(self):
+        server = self.make_server(latency_ms=20.0)
+        client = self.make_client(server, hedge=True, hedge_min_samples=5)
+        client.generate(PROMPT)
+        self.assertEqual((client.hedges, server.calls), (0, 1))
@@ -0,0 +1,27 @@
+from django.test import SimpleTestCase, TestCase
+
+from query_handler.tests.offline import OfflineAPIMixin
+from query_handler.utils.prepared import parameterize
+
+
+class ParameterizeTests(SimpleTestCase):
+    def test_literals_become_parameters(self):
+        prepared = parameterize("SELECT * FROM orders WHERE total > 100 AND status = 'paid' LIMIT 10")
+        self.assertEqual(prepared.template, "SELECT * FROM orders WHERE total > %s AND status = %s LIMIT %s")
+        self.assertEqual(list(prepared.params), [100, "paid", 10])
+        self.assertEqual(parameterize("SELECT * FROM orders WHERE total > 5", dialect="sqlite").template,
+                         "SELECT * FROM orders WHERE total > ?")
+
+
+class PreparedStatsViewTests(OfflineAPIMixin, TestCase):
+    def test_shapes_are_reported(self):
+        self.ask("list orders")
+        response = self.client.get("/prepared-statements/stats/", {"top": 1})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()["top_shapes"]), 1)
+
+    def test_invalid_top(self):
+        for top in ("x", 0, -1):
+            with self.subTest(top=top):
+                response = self.client.get("/prepared-statements/stats/", {"top": top})
+                self.assertEqual(response.status_code, 400)
@@ -0,0 +1,90 @@
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase
+
+from query_handler.tests.offline import OfflineAPIMixin
+from query_handler.utils.result_cache import DjangoResultCache, MemoryResultCache, get_result_cache, result_key
+
+
+class ResultCacheTests:
+    """Shared behaviour of the result cache backends; subclasses provide make_cache()."""
+
+    ROWS = [{"id": 1, "total": 10}, {"id": 2, "total": 20}]
+
+    def setUp(self):
+        self.cache = self.make_cache()
+
+    def test_hit_and_miss(self):
+        key = result_key("SELECT * FROM orders")
+        self.assertIsNone(self.cache.get(key, ["orders"]))
+        self.cache.set(key, ["orders"], self.ROWS)
+        self.assertEqual(self.cache.get(key, ["orders"]), self.ROWS)
+        self.assertIsNone(self.cache.get(result_key("SELECT * FROM orders", params=[1]), ["orders"]))
+        self.assertEqual((self.cache.hits, self.cache.misses, self.cache.stores), (1, 2, 1))
+
+    def test_invalidation_is_per_table(self):
+        orders = result_key("SELECT * FROM orders")
+        joined = result_key("SELECT * FROM orders JOIN customers")
+        products = result_key("SELECT * FROM products")
+        self.cache.set(orders, ["orders"], self.ROWS)
+        self.cache.set(joined, ["customers", "orders"], self.ROWS)
+        self.cache.set(products, ["products"], self.ROWS)
+
+        self.cache.invalidate_tables(["orders"])
+        self.assertIsNone(self.cache.get(orders, ["orders"]))
+        self.assertIsNone(self.cache.get(joined, ["customers", "orders"]))
+        self.assertEqual(self.cache.get(products, ["products"]), self.ROWS)
+
+        # New results for the invalidated table are cached again
+        self.cache.set(orders, ["orders"], self.ROWS[:1])
+        self.assertEqual(self.cache.get(orders, ["orders"]), self.ROWS[:1])
+
+
+class MemoryResultCacheTests(ResultCacheTests, SimpleTestCase):
+    def make_cache(self):
+        return MemoryResultCache(max_bytes=1024)
+
+    def test_byte_budget_evicts_least_recently_used(self):
+        row = [{"payload": "x" * 300}]
+        for n in range(3):
+            self.cache.set(result_key(f"SELECT {n}"), ["orders"], row)
+        self.cache.get(result_key("SELECT 0"), ["orders"])
+        self.cache.set(result_key("SELECT 3"), ["orders"], row)
+
+        self.assertIsNone(self.cache.get(result_key("SELECT 1"), ["orders"]))
+        self.assertIsNotNone(self.cache.get(result_key("SELECT 0"), ["orders"]))
+        self.assertLessEqual(self.cache.bytes, 1024)
+        self.assertEqual(self.cache.evictions, 1)
+
+    def test_oversized_results_are_not_cached(self):
+        self.cache.set(result_key("SELECT big"), ["orders"], [{"payload": "x" * 2048}])
+        self.assertEqual(self.cache.stores, 0)
+
+
+class DjangoResultCacheTests(ResultCacheTests, SimpleTestCase):
+    def make_cache(self):
+        self.addCleanup(cache.clear)
+        return DjangoResultCache(namespace="tests")
+
+    def test_namespaces_are_separate(self):
+        key = result_key("SELECT * FROM orders")
+        self.cache.set(key, ["orders"], self.ROWS)
+        other = DjangoResultCache(namespace="other")
+        self.assertIsNone(other.get(key, ["orders"]))
+        other.invalidate_tables(["orders"])
+        self.assertEqual(self.cache.get(key, ["orders"]), self.ROWS)
+
+
+class QueryViewResultCacheTests(OfflineAPIMixin, TestCase):
+    def test_repeated_query_is_served_from_the_cache(self):
+        first = self.ask("list orders").json()["results"]
+        self.assertEqual(self.ask("list orders").json()["results"], first)
+        self.assertEqual(self.ask("list orders", path="/api/query/async/").json()["results"], first)
+        stats = get_result_cache().stats()
+        self.assertEqual((stats["stores"], stats["hits"]), (1, 2))
+
+    def test_invalidated_table_is_read_again(self):
+        self.ask("list orders")
+        get_result_cache().invalidate_tables(["orders"])
+        self.ask("list orders", path="/api/query/async/")
+        stats = get_result_cache().stats()
+        self.assertEqual((stats["stores"], stats["hits"]), (2, 0))
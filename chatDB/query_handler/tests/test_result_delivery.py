@@ -0,0 +1,61 @@
+import json
+
+from django.conf import settings
+from django.test import TestCase, override_settings
+
+from query_handler.models import UserQuery
+from query_handler.tests.offline import ROWS, OfflineAPIMixin
+
+
+class PaginationTests(OfflineAPIMixin, TestCase):
+    def test_invalid_page_size(self):
+        for page_size in (0, -1, "ten", settings.MAX_PAGE_SIZE + 1):
+            with self.subTest(page_size=page_size):
+                response = self.ask("list orders", page_size=page_size)
+                self.assertEqual(response.status_code, 400)
+                self.assertIn("page_size", response.json())
+
+    def all_pages(self, body):
+        ids = [row["id"] for row in body["results"]]
+        token = body["next_page_token"]
+        while token:
+            response = self.client.get("/api/query/page/", {"token": token})
+            self.assertEqual(response.status_code, 200)
+            page = response.json()
+            ids += [row["id"] for row in page["results"]]
+            token = page["next_page_token"]
+        return ids
+
+    def test_pages_follow_their_tokens(self):
+        response = self.ask("list products", page_size=10)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(self.all_pages(response.json()), list(range(1, ROWS + 1)))
+
+    @override_settings(QUERY_GUARD={"max_rows": 10, "max_execution_time_ms": 2000})
+    def test_pages_are_not_capped_at_max_rows(self):
+        response = self.ask("list products", page_size=10)
+        body = response.json()
+        self.assertEqual(body["generated_query"], "SELECT /*+ MAX_EXECUTION_TIME(2000) */ * FROM products")
+        self.assertEqual(self.all_pages(body), list(range(1, ROWS + 1)))
+
+    def test_tampered_page_token_is_rejected(self):
+        token = self.ask("list products", page_size=10).json()["next_page_token"]
+        response = self.client.get("/api/query/page/", {"token": token[:-2] + "xx"})
+        self.assertEqual(response.status_code, 400)
+
+
+class StreamingTests(OfflineAPIMixin, TestCase):
+    def test_ndjson(self):
+        response = self.ask("list orders", stream=True)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response["Content-Type"], "application/x-ndjson")
+        lines = [json.loads(line) for line in b"".join(response.streaming_content).splitlines()]
+        self.assertEqual(lines[0], {"query": "list orders", "generated_query": "SELECT * FROM orders"})  # No LIMIT
+        self.assertEqual(len(lines), ROWS + 1)
+        self.assertEqual(UserQuery.objects.get().row_count, ROWS)
+
+    def test_json(self):
+        response = self.ask("list orders", stream=True, format="json")
+        self.assertEqual(response["Content-Type"], "application/json")
+        body = json.loads(b"".join(response.streaming_content))
+        self.assertEqual((len(body["results"]), body["row_count"]), (ROWS, ROWS))
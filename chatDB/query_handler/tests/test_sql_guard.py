@@ -0,0 +1,111 @@
+from contextlib import contextmanager
+from unittest import mock
+
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from query_handler.models import UserQuery
+from query_handler.tests.offline import ROWS, OfflineAPIMixin, SeededSQLiteMixin
+from query_handler.utils.db_pool import SQLitePool
+from query_handler.utils.sql_guard import apply_row_limit, guard_query, plan_query, split_limit
+
+
+class RowLimitTests(SimpleTestCase):
+    def test_split_limit(self):
+        self.assertEqual(split_limit("SELECT * FROM orders LIMIT 10;"), ("SELECT * FROM orders", 10, 0))
+        self.assertEqual(split_limit("SELECT * FROM orders LIMIT 5, 10"), ("SELECT * FROM orders", 10, 5))
+        self.assertEqual(split_limit("SELECT * FROM orders LIMIT 10 OFFSET 20"), ("SELECT * FROM orders", 10, 20))
+        # A LIMIT inside a subquery isn't the statement's
+        sql = "SELECT * FROM (SELECT * FROM orders LIMIT 3) t"
+        self.assertEqual(split_limit(sql), (sql, None, 0))
+
+    def test_limit_is_injected_or_capped(self):
+        self.assertEqual(apply_row_limit("SELECT * FROM orders", 100), ("SELECT * FROM orders LIMIT 100", "limit_injected"))
+        self.assertEqual(apply_row_limit("SELECT * FROM orders LIMIT 5000 OFFSET 10", 100),
+                         ("SELECT * FROM orders LIMIT 100 OFFSET 10", "limit_capped"))
+        self.assertEqual(apply_row_limit("SELECT * FROM orders LIMIT 50;", 100), ("SELECT * FROM orders LIMIT 50", None))
+
+    @override_settings(QUERY_GUARD={"max_rows": 100, "max_execution_time_ms": 2000})
+    def test_plan_query(self):
+        sql, action = plan_query("SELECT * FROM orders")
+        self.assertEqual(action, "limit_injected")
+        self.assertEqual(sql, "SELECT /*+ MAX_EXECUTION_TIME(2000) */ * FROM orders LIMIT 100")
+
+        # Streams are neither capped nor time-limited
+        self.assertEqual(plan_query("SELECT * FROM orders", streaming=True), ("SELECT * FROM orders", "allow"))
+        self.assertEqual(plan_query("SHOW TABLES"), ("SHOW TABLES", "allow"))
+
+    @override_settings(QUERY_GUARD={"max_rows": 100, "max_execution_time_ms": 2000})
+    def test_every_read_statement_is_planned(self):
+        # The hint and LIMIT go on the outer SELECT, not the CTE's
+        self.assertEqual(plan_query("WITH t AS (SELECT * FROM orders) SELECT * FROM t"),
+                         ("WITH t AS (SELECT * FROM orders) SELECT /*+ MAX_EXECUTION_TIME(2000) */ * FROM t LIMIT 100",
+                          "limit_injected"))
+        self.assertEqual(plan_query("(SELECT * FROM orders)"),
+                         ("(SELECT /*+ MAX_EXECUTION_TIME(2000) */ * FROM orders) LIMIT 100", "limit_injected"))
+        self.assertEqual(plan_query("/* report */ SELECT * FROM orders LIMIT 5"),
+                         ("/* report */ SELECT /*+ MAX_EXECUTION_TIME(2000) */ * FROM orders LIMIT 5", "allow"))
+
+
+@override_settings(QUERY_GUARD={"max_rows": 10})
+class GuardQueryTests(SeededSQLiteMixin, SimpleTestCase):
+    def setUp(self):
+        super().setUp()
+        self.pool = SQLitePool({"database": self.seed(rows=20)}, size=1)
+        self.addCleanup(self.pool.close)
+
+    def test_guarded_query_runs_with_its_limit(self):
+        decision = guard_query(self.pool, "SELECT * FROM orders")
+        self.assertTrue(decision.allowed)
+        self.assertEqual(decision.action, "limit_injected")
+        self.assertIsNone(decision.estimated_rows)  # EXPLAIN estimates are MySQL-only
+        with self.pool.connection() as connection:
+            cursor = connection.cursor()
+            cursor.execute(decision.sql)
+            self.assertEqual(len(cursor.fetchall()), 10)
+            cursor.close()
+
+
+class ExplainingPool:
+    """A MySQL-dialect pool whose EXPLAIN estimates `rows` rows and records what it was asked."""
+
+    dialect = "mysql"
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.explained = []
+
+    @contextmanager
+    def connection(self):
+        cursor = mock.Mock(description=[("id",), ("rows",)])
+        cursor.execute.side_effect = self.explained.append
+        cursor.fetchall.return_value = [(1, self.rows)]
+        yield mock.Mock(cursor=mock.Mock(return_value=cursor))
+
+
+@override_settings(QUERY_GUARD={"confirm_estimated_rows": 1000})
+class ExplainTests(SimpleTestCase):
+    def test_every_read_statement_is_explained(self):
+        for sql in ("SELECT * FROM orders", "WITH t AS (SELECT * FROM orders) SELECT * FROM t",
+                    "(SELECT * FROM orders)"):
+            with self.subTest(sql=sql):
+                pool = ExplainingPool(rows=5000)
+                decision = guard_query(pool, sql)
+                self.assertEqual(pool.explained, [f"EXPLAIN {decision.sql}"])
+                self.assertEqual((decision.action, decision.estimated_rows), ("confirm", 5000))
+
+    def test_metadata_statements_are_not_explained(self):
+        pool = ExplainingPool(rows=5000)
+        self.assertEqual(guard_query(pool, "SHOW TABLES").action, "allow")
+        self.assertEqual(pool.explained, [])
+
+
+class QueryViewGuardTests(OfflineAPIMixin, TestCase):
+    def test_generated_query_is_guarded_before_it_runs(self):
+        response = self.ask("list orders")
+        self.assertEqual(response.status_code, 201)
+        body = response.json()
+        self.assertTrue(body["generated_query"].endswith("* FROM orders LIMIT 1000"))
+        self.assertEqual(len(body["results"]), ROWS)
+        saved = UserQuery.objects.get()
+        self.assertEqual((saved.status, saved.row_count), (UserQuery.STATUS_COMPLETED, ROWS))
+        self.assertEqual(saved.generated_query, body["generated_query"])
@@ -0,0 +1,95 @@
+from django.test import SimpleTestCase
+
+from query_handler.utils.bench import DEMO_SCHEMA
+from query_handler.utils.nlp_utils import extract_sql
+from query_handler.utils.schema_registry import SchemaSnapshot
+from query_handler.utils.sql_validation import SQLValidationError, parse_sql
+
+SCHEMA = SchemaSnapshot(DEMO_SCHEMA).schema
+
+
+class ParseSQLTests(SimpleTestCase):
+    def test_select_resolves_tables_and_columns(self):
+        validated = parse_sql("select c.name, sum(o.total) as spent from customers c "
+                              "join orders o on o.customer_id = c.id group by c.name order by spent desc;", SCHEMA)
+        self.assertEqual(validated.statement_type, "SELECT")
+        self.assertEqual(validated.tables, {"customers", "orders"})
+        self.assertIn(("orders", "total"), validated.columns)
+        self.assertTrue(validated.normalized.startswith("SELECT c.name, sum(o.total) AS spent FROM customers c"))
+        self.assertFalse(validated.normalized.endswith(";"))
+
+    def test_normalized_text_ignores_case_comments_and_whitespace(self):
+        first = parse_sql("SELECT name FROM products WHERE price > 10", SCHEMA)
+        second = parse_sql("select  name\n from products -- cheap ones\n where price > 10;", SCHEMA)
+        self.assertEqual(first.fingerprint, second.fingerprint)
+
+    def test_cte_is_accepted(self):
+        validated = parse_sql("WITH big AS (SELECT customer_id, total FROM orders WHERE total > 100) "
+                              "SELECT customer_id, COUNT(*) FROM big GROUP BY customer_id", SCHEMA)
+        self.assertEqual(validated.statement_type, "WITH")
+        self.assertEqual(validated.tables, {"orders"})
+
+    def test_explain_is_rejected(self):
+        for sql in ("EXPLAIN SELECT * FROM orders", "EXPLAIN ANALYZE SELECT * FROM orders",
+                    "EXPLAIN DELETE FROM orders"):
+            with self.subTest(sql=sql), self.assertRaises(SQLValidationError):
+                parse_sql(sql, SCHEMA)
+
+    def test_writes_are_rejected(self):
+        for sql in ("DELETE FROM orders", "UPDATE products SET price = 0", "DROP TABLE customers",
+                    "INSERT INTO products (name) VALUES ('x')", "SELECT * INTO OUTFILE '/tmp/x' FROM orders",
+                    "SELECT * FROM orders FOR UPDATE",
+                    "WITH gone AS (DELETE FROM orders RETURNING id) SELECT * FROM gone"):
+            with self.subTest(sql=sql), self.assertRaises(SQLValidationError):
+                parse_sql(sql, SCHEMA)
+
+    def test_only_one_statement(self):
+        with self.assertRaisesMessage(SQLValidationError, "exactly one"):
+            parse_sql("SELECT * FROM orders; DROP TABLE orders", SCHEMA)
+        with self.assertRaisesMessage(SQLValidationError, "exactly one"):
+            parse_sql("", SCHEMA)
+
+    def test_unknown_tables_and_columns_are_rejected(self):
+        with self.assertRaisesMessage(SQLValidationError, "unknown table 'suppliers'"):
+            parse_sql("SELECT * FROM suppliers", SCHEMA)
+        with self.assertRaisesMessage(SQLValidationError, "unknown column 'colour'"):
+            parse_sql("SELECT colour FROM products", SCHEMA)
+        with self.assertRaisesMessage(SQLValidationError, "not in any table"):
+            parse_sql("SELECT email FROM products", SCHEMA)
+
+    def test_other_databases_are_rejected(self):
+        self.assertEqual(parse_sql("SELECT * FROM shop.orders", SCHEMA, database="shop").tables, {"orders"})
+        self.assertEqual(parse_sql("SHOW COLUMNS FROM orders IN shop", SCHEMA, database="shop").statement_type, "SHOW")
+        for sql in ("SELECT * FROM otherdb.orders", "SELECT * FROM orders JOIN otherdb.customers c ON c.id = 1",
+                    "DESCRIBE otherdb.orders", "SHOW TABLES FROM otherdb", "SHOW COLUMNS FROM orders IN otherdb"):
+            with self.subTest(sql=sql), self.assertRaisesMessage(SQLValidationError, "another database 'otherdb'"):
+                parse_sql(sql, SCHEMA, database="shop")
+        with self.assertRaisesMessage(SQLValidationError, "another database 'shop'"):
+            parse_sql("SELECT * FROM shop.orders", SCHEMA)  # No active database to compare with
+
+    def test_dangerous_functions_and_show_statements_are_rejected(self):
+        for sql in ("SELECT * FROM orders WHERE SLEEP(5) = 0", "SELECT BENCHMARK(1000000, MD5('x')) FROM orders",
+                    "SELECT load_file('/etc/passwd') FROM orders", "SHOW DATABASES", "show grants", "SHOW SCHEMAS"):
+            with self.subTest(sql=sql), self.assertRaisesMessage(SQLValidationError, "not allowed"):
+                parse_sql(sql, SCHEMA)
+
+    def test_metadata_statements(self):
+        self.assertEqual(parse_sql("SHOW TABLES", SCHEMA).statement_type, "SHOW")
+        self.assertEqual(parse_sql("DESCRIBE orders", SCHEMA).statement_type, "DESCRIBE")
+
+
+class ExtractSQLTests(SimpleTestCase):
+    def test_prose_before_and_after_is_dropped(self):
+        response = "Here is the query you asked for:\nSELECT * FROM orders;\n\nIt lists every order."
+        self.assertEqual(extract_sql(response), "SELECT * FROM orders;")
+
+    def test_with_in_prose_does_not_start_the_statement(self):
+        response = "Start with the orders table: SELECT id FROM orders"
+        self.assertEqual(extract_sql(response), "SELECT id FROM orders")
+
+    def test_cte_is_kept_whole(self):
+        sql = "WITH recent (id) AS (SELECT id FROM orders) SELECT * FROM recent"
+        self.assertEqual(extract_sql(f"Sure.\n{sql}"), sql)
+
+    def test_no_sql(self):
+        self.assertEqual(extract_sql("I don't know."), "Error: Failed to extract SQL")
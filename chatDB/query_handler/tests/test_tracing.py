@@ -0,0 +1,30 @@
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from query_handler.utils.tracing import metrics, render_prometheus
+
+
+class PrometheusTests(SimpleTestCase):
+    def setUp(self):
+        metrics.reset()
+        self.addCleanup(metrics.reset)
+
+    def test_label_values_are_escaped(self):
+        metrics.inc("requests_total", endpoint='a"b\\c\nd')
+        self.assertIn('chatdb_requests_total{endpoint="a\\"b\\\\c\\nd"} 1', render_prometheus())
+
+
+@override_settings(TRACING={"enabled": True, "log": False, "path_prefix": "/api/"})
+class EndpointLabelTests(TestCase):
+    def setUp(self):
+        metrics.reset()
+        self.addCleanup(metrics.reset)
+
+    def test_unresolved_paths_share_one_label(self):
+        for path in ("/api/wp-login.php", "/api/.env"):
+            self.assertEqual(self.client.get(path).status_code, 404)
+        self.client.get("/api/query/history/")
+
+        text = render_prometheus()
+        self.assertIn('chatdb_requests_total{endpoint="unresolved",status="404"} 2', text)
+        self.assertIn('chatdb_requests_total{endpoint="query-history",status="200"} 1', text)
+        self.assertNotIn("wp-login", text)
@@ -0,0 +1,55 @@
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from query_handler.utils.translation_cache import TranslationCache
+
+
+class TranslationCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.cache = TranslationCache(max_entries=3)
+
+    def test_exact_hit_ignores_case_and_whitespace(self):
+        self.cache.put("How many orders are there?", "v1", "SELECT COUNT(*) FROM orders")
+        self.assertEqual(self.cache.get("  how many ORDERS are there? ", "v1"), "SELECT COUNT(*) FROM orders")
+        self.assertEqual(self.cache.stats()["exact_hits"], 1)
+
+    def test_schema_version_is_part_of_the_key(self):
+        self.cache.put("list all customers", "v1", "SELECT * FROM customers")
+        self.assertIsNone(self.cache.get("list all customers", "v2"))
+
+    def test_similar_question_hits(self):
+        self.cache.put("show all customers from the city of Springfield", "v1", "SELECT 1")
+        self.assertEqual(self.cache.get("show the customers from city of Springfield", "v1"), "SELECT 1")
+        self.assertEqual(self.cache.get("show all customer from the city of Springfeld", "v1"), "SELECT 1")  # Plural, typo
+        self.assertEqual(self.cache.stats()["similar_hits"], 2)
+
+    def test_word_order_and_direction_matter(self):
+        self.cache.put("flights from paris to london", "v1", "SELECT 1")
+        self.assertIsNone(self.cache.get("flights from london to paris", "v1"))
+        self.assertIsNone(self.cache.get("flights to paris from london", "v1"))
+
+    def test_numbers_and_quoted_values_must_match(self):
+        self.cache.put("orders with a total above 100 in 2023", "v1", "SELECT 1")
+        self.assertIsNone(self.cache.get("orders with a total above 1000 in 2023", "v1"))
+        self.assertIsNone(self.cache.get("orders with a total above 100 in 2024", "v1"))
+
+        self.cache.put("customers in city 'Springfield'", "v1", "SELECT 2")
+        self.assertIsNone(self.cache.get("customers in city 'Springfeld'", "v1"))
+
+    def test_least_recently_used_entry_is_evicted(self):
+        for table in ("customers", "products", "orders"):
+            self.cache.put(f"list every {table}", "v1", f"SELECT * FROM {table}")
+        self.cache.get("list every customers", "v1")  # Now most recently used
+        self.cache.put("count payments", "v1", "SELECT COUNT(*) FROM payments")
+
+        self.assertIsNone(self.cache.get("list every products", "v1"))
+        self.assertIsNotNone(self.cache.get("list every customers", "v1"))
+        self.assertEqual(self.cache.stats()["evictions"], 1)
+
+    def test_entries_expire(self):
+        with mock.patch("query_handler.utils.translation_cache.time.monotonic", return_value=1000.0):
+            self.cache.put("list every customers", "v1", "SELECT * FROM customers")
+        with mock.patch("query_handler.utils.translation_cache.time.monotonic", return_value=1000.0 + self.cache.ttl):
+            self.assertIsNone(self.cache.get("list every customers", "v1"))
+        self.assertEqual(self.cache.stats()["expirations"], 1)
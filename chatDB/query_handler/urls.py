@@ -1,9 +1,31 @@
 from django.urls import path
-from .views import QueryView, connect_database_view
-from .utils.nlp_utils import process_query, load_schema
+from .views import (
+    QueryBatchView, QueryHistoryView, QueryJobStatusView, QueryJobView, QueryPageView, QueryResultView, QueryView,
+    ResultCacheView, admission_stats_view, async_query_view, coalescing_stats_view, connect_database_view,
+    datasources_view, few_shot_stats_view, llm_client_stats_view, metrics_view, pool_stats_view,
+    prepared_statements_view, query_guard_stats_view, translation_cache_stats_view,
+)
 
 urlpatterns = [
     path('api/query/', QueryView.as_view(), name='query'),
+    path('api/query/async/', async_query_view, name='query-async'),
+    path('api/query/batch/', QueryBatchView.as_view(), name='query-batch'),
+    path('api/query/page/', QueryPageView.as_view(), name='query-page'),
+    path('api/query/history/', QueryHistoryView.as_view(), name='query-history'),
+    path('api/query/<int:pk>/results/', QueryResultView.as_view(), name='query-results'),
+    path('api/query/jobs/', QueryJobView.as_view(), name='query-jobs'),
+    path('api/query/jobs/<int:job_id>/', QueryJobStatusView.as_view(), name='query-job'),
     path('connect-database/', connect_database_view, name='connect-database'),
+    path('db-pool/stats/', pool_stats_view, name='db-pool-stats'),
+    path('datasources/', datasources_view, name='datasources'),
+    path('translation-cache/stats/', translation_cache_stats_view, name='translation-cache-stats'),
+    path('result-cache/', ResultCacheView.as_view(), name='result-cache'),
+    path('query-guard/decisions/', query_guard_stats_view, name='query-guard-decisions'),
+    path('coalescing/stats/', coalescing_stats_view, name='coalescing-stats'),
+    path('prepared-statements/stats/', prepared_statements_view, name='prepared-statements-stats'),
+    path('llm-client/stats/', llm_client_stats_view, name='llm-client-stats'),
+    path('few-shot/stats/', few_shot_stats_view, name='few-shot-stats'),
+    path('admission/stats/', admission_stats_view, name='admission-stats'),
+    path('metrics/', metrics_view, name='metrics'),
     # path('process_query/', process_query, name='process_query'),
 ]
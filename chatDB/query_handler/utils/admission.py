@@ -0,0 +1,330 @@
+import asyncio
+import contextvars
+import hashlib
+import json
+import math
+import random
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+
+BUDGETS = ("request", "llm", "sql")
+
+_ticket = contextvars.ContextVar("query_handler_admission", default=None)  # (client, tenant) of the admitted request
+
+
+class AdmissionRejected(Exception):
+    """A request turned away by admission control; `retry_after` is in seconds."""
+
+    http_status = 429
+
+    def __init__(self, message, retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class RateLimited(AdmissionRejected):
+    """A client or tenant has used up one of its token buckets."""
+
+
+class Overloaded(AdmissionRejected):
+    """Every slot is taken and the queue is full, or the wait for a slot timed out."""
+
+    http_status = 503
+
+
+def admission_settings():
+    return getattr(settings, "ADMISSION", {})
+
+
+def client_id(request, header=None):
+    """Who a request counts against: the `header` value if set, else the logged-in user, else the remote address."""
+    if header and request.headers.get(header):
+        return f"key:{request.headers[header]}"
+    user = getattr(request, "user", None)
+    if user is not None and user.is_authenticated:
+        return f"user:{user.pk}"
+    return f"ip:{request.META.get('REMOTE_ADDR', 'unknown')}"
+
+
+def tenant_id(request):
+    """The datasource a request targets ("database" in its JSON body), see utils/datasources.py."""
+    try:
+        data = json.loads(request.body or b"{}")
+    except ValueError:
+        return "default"
+    database = data.get("database") if isinstance(data, dict) else None
+    return str(database) if database else "default"
+
+
+class Admission:
+    """
+    Admission control for the query API, with its state in one of Django's
+    CACHES so every worker sees the same counters and buckets.
+
+    - Token buckets (GCRA) per client and per tenant for three budgets:
+      "request" is charged when a request arrives, "llm" when a question
+      has to go to the model and "sql" when a query has to run. Exhausted
+      buckets raise RateLimited (429).
+    - A global limit of `max_in_flight` requests. Up to `max_queue` more
+      wait at most `queue_timeout` seconds for a slot; beyond that, or
+      after waiting, Overloaded (503).
+
+    Counters expire every `counter_ttl` seconds, so slots leaked by a
+    killed worker come back. Bucket updates hold a short cache lock; under
+    heavy contention they proceed without it and may admit a few extra
+    requests.
+    """
+
+    PREFIX = "query_handler:admission"
+
+    def __init__(self, enabled=True, cache_alias="default", path_prefix="/api/query/", max_in_flight=32,
+                 max_queue=64, queue_timeout=10.0, retry_after=5, poll_interval=0.05, counter_ttl=300,
+                 client_header=None, buckets=None):
+        self.enabled = enabled
+        self.cache_alias = cache_alias
+        self.path_prefix = path_prefix
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.retry_after = retry_after
+        self.poll_interval = poll_interval
+        self.counter_ttl = counter_ttl
+        self.client_header = client_header
+        self.buckets = buckets or {}  # budget -> scope -> (tokens per second, burst)
+        self._lock = threading.Lock()
+        self.counts = {"admitted": 0, "queued": 0, "overloaded": 0,
+                       **{f"rate_limited_{budget}": 0 for budget in BUDGETS}}
+
+    @property
+    def cache(self):
+        return caches[self.cache_alias]
+
+    def _count(self, name):
+        with self._lock:
+            self.counts[name] += 1
+
+    # Global in-flight counters
+
+    def _key(self, *parts):
+        return ":".join((self.PREFIX, *parts))
+
+    def _add(self, name, delta):
+        key = self._key(name)
+        self.cache.add(key, 0, timeout=self.counter_ttl)
+        try:
+            value = self.cache.incr(key, delta)
+        except ValueError:  # Expired between add() and incr()
+            value = delta
+            self.cache.set(key, max(value, 0), timeout=self.counter_ttl)
+        if value < 0:  # The counter expired while requests were in flight
+            self.cache.set(key, 0, timeout=self.counter_ttl)
+        return value
+
+    def _try_slot(self):
+        if self._add("active", 1) <= self.max_in_flight:
+            return True
+        self._add("active", -1)
+        return False
+
+    def _join_queue(self):
+        if self._add("waiting", 1) > self.max_queue:
+            self._add("waiting", -1)
+            self._count("overloaded")
+            raise Overloaded("Server is at capacity. Retry later.", self.retry_after)
+        self._count("queued")
+
+    def _queue_timed_out(self):
+        self._add("waiting", -1)
+        self._count("overloaded")
+        return Overloaded(f"No capacity within {self.queue_timeout:g}s. Retry later.", self.retry_after)
+
+    def _poll_delay(self):
+        return self.poll_interval * random.uniform(0.5, 1.5)  # Jitter keeps waiting workers from polling in lockstep
+
+    def enter(self):
+        """Take a global slot, waiting in the queue if need be; raises Overloaded."""
+        if self._try_slot():
+            return
+        self._join_queue()
+        deadline = time.monotonic() + self.queue_timeout
+        while time.monotonic() < deadline:
+            time.sleep(self._poll_delay())
+            if self._try_slot():
+                self._add("waiting", -1)
+                return
+        raise self._queue_timed_out()
+
+    async def aenter(self):
+        """Async enter(): the cache is used from a thread and waiting doesn't block the event loop."""
+        try_slot = sync_to_async(self._try_slot, thread_sensitive=False)
+        if await try_slot():
+            return
+        await sync_to_async(self._join_queue, thread_sensitive=False)()
+        deadline = time.monotonic() + self.queue_timeout
+        while time.monotonic() < deadline:
+            await asyncio.sleep(self._poll_delay())
+            if await try_slot():
+                await sync_to_async(self._add, thread_sensitive=False)("waiting", -1)
+                return
+        raise await sync_to_async(self._queue_timed_out, thread_sensitive=False)()
+
+    async def aleave(self):
+        await sync_to_async(self._add, thread_sensitive=False)("active", -1)
+
+    def leave(self):
+        self._add("active", -1)
+
+    # Token buckets
+
+    def _bucket_key(self, budget, scope, name):
+        digest = hashlib.sha1(name.encode()).hexdigest()[:16]  # Any client id makes a valid cache key
+        return self._key("bucket", budget, scope, digest)
+
+    @contextmanager
+    def _locked(self, keys, attempts=20):
+        locks = []
+        try:
+            for key in sorted(keys):
+                for _ in range(attempts):
+                    if self.cache.add(f"{key}:lock", 1, timeout=1):
+                        locks.append(f"{key}:lock")
+                        break
+                    time.sleep(0.001)
+            yield
+        finally:
+            if locks:
+                self.cache.delete_many(locks)
+
+    def take(self, budget, client, tenant, cost=1):
+        """
+        Take `cost` tokens from the client's and the tenant's `budget`
+        buckets, or from neither; raises RateLimited.
+        """
+        limits = {}
+        for scope, name in (("client", client), ("tenant", tenant)):
+            rate, burst = self.buckets.get(budget, {}).get(scope, (0, 0))
+            if rate > 0:
+                limits[self._bucket_key(budget, scope, name)] = (scope, float(rate), float(burst))
+        if not limits:
+            return
+
+        with self._locked(limits):
+            now = time.time()
+            arrivals = self.cache.get_many(list(limits))  # Theoretical arrival times, as in GCRA
+            updates, waits = {}, []
+            for key, (scope, rate, burst) in limits.items():
+                interval = 1.0 / rate
+                # A batch costing more than the burst may still drain a full bucket, never more
+                tat = max(arrivals.get(key, now), now) + min(cost, burst) * interval
+                if tat - now > burst * interval:
+                    waits.append((tat - now - burst * interval, scope))
+                else:
+                    updates[key] = tat
+            if not waits:
+                for key, tat in updates.items():
+                    _, rate, burst = limits[key]
+                    self.cache.set(key, tat, timeout=math.ceil(burst / rate) + 1)  # Expired = full bucket
+                return
+
+        wait, scope = max(waits)
+        self._count(f"rate_limited_{budget}")
+        label = "requests" if budget == "request" else f"{budget.upper()} calls"
+        raise RateLimited(f"Too many {label} for this {scope}. Retry later.", wait)
+
+    # Request scope
+
+    @contextmanager
+    def admit(self, client, tenant):
+        """
+        Hold a global slot for the block, after charging the request
+        budgets; charge() calls in the block count against `client` and
+        `tenant`. Raises RateLimited or Overloaded.
+        """
+        self.take("request", client, tenant)
+        self.enter()
+        self._count("admitted")
+        token = _ticket.set((client, tenant))
+        try:
+            yield
+        finally:
+            _ticket.reset(token)
+            self.leave()
+
+    @asynccontextmanager
+    async def aadmit(self, client, tenant):
+        """Async counterpart of admit()."""
+        await sync_to_async(self.take, thread_sensitive=False)("request", client, tenant)
+        await self.aenter()
+        self._count("admitted")
+        token = _ticket.set((client, tenant))
+        try:
+            yield
+        finally:
+            _ticket.reset(token)
+            await self.aleave()
+
+    def stats(self):
+        found = self.cache.get_many([self._key("active"), self._key("waiting")])
+        with self._lock:
+            counts = dict(self.counts)
+        return {
+            "enabled": self.enabled,
+            "max_in_flight": self.max_in_flight,
+            "max_queue": self.max_queue,
+            "in_flight": max(found.get(self._key("active"), 0), 0),  # All workers
+            "waiting": max(found.get(self._key("waiting"), 0), 0),
+            **counts,  # This worker
+        }
+
+
+def current_ticket():
+    """The (client, tenant) of the admitted request being served, or None."""
+    return _ticket.get()
+
+
+@contextmanager
+def charging(ticket):
+    """
+    Charge budgets in the block to `ticket`, taken with current_ticket()
+    while the request was admitted; for work that outlives the request.
+    """
+    token = _ticket.set(ticket)
+    try:
+        yield
+    finally:
+        _ticket.reset(token)
+
+
+def charge(budget, cost=1):
+    """
+    Take `cost` tokens from the "llm" or "sql" budget of the request being
+    served; raises RateLimited. Does nothing outside an admitted request.
+    """
+    ticket = _ticket.get()
+    if ticket is not None:
+        get_admission().take(budget, *ticket, cost=cost)
+
+
+async def acharge(budget, cost=1):
+    """Async charge(); the cache is used from a thread."""
+    ticket = _ticket.get()
+    if ticket is not None:
+        await sync_to_async(get_admission().take, thread_sensitive=False)(budget, *ticket, cost=cost)
+
+
+_admission = None
+_admission_lock = threading.Lock()
+
+
+def get_admission():
+    """Return the process-wide admission control configured by settings.ADMISSION."""
+    global _admission
+    with _admission_lock:
+        if _admission is None:
+            _admission = Admission(**admission_settings())
+        return _admission
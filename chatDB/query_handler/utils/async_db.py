@@ -0,0 +1,105 @@
+import asyncio
+import logging
+import time
+import weakref
+
+from django.conf import settings
+
+from .prepared import parameterize, record_shape
+from .result_format import ResultSet
+from .sql_guard import GuardDecision, decide, estimate_rows, is_read, plan_query, record_decision
+
+logger = logging.getLogger(__name__)
+
+_pool_locks = weakref.WeakKeyDictionary()  # event loop -> asyncio.Lock
+
+
+async def get_async_pool(datasource):
+    """
+    Return the aiomysql pool for a MySQL datasource on the running event loop.
+
+    Sized and recycled like the synchronous pool in db_pool.py; kept on the
+    datasource so evicting it closes these pools too.
+    """
+    import aiomysql  # Only the async view needs it; imported on first use to keep startup light
+
+    loop = asyncio.get_running_loop()
+    pool = datasource.async_pools.get(loop)
+    if pool is not None and not pool.closed:
+        return pool
+
+    lock = _pool_locks.setdefault(loop, asyncio.Lock())
+    async with lock:
+        pool = datasource.async_pools.get(loop)
+        if pool is None or pool.closed:
+            db = datasource.connect_args
+            options = getattr(settings, "MYSQL_POOL", {})
+            pool = await aiomysql.create_pool(
+                host=db["host"],
+                port=db.get("port", 3306),
+                user=db["user"],
+                password=db.get("password") or "",
+                db=db["database"],
+                minsize=0,
+                maxsize=options.get("size", 5),
+                pool_recycle=int(options.get("max_idle_time", 300)),
+                autocommit=True,
+                # Generated SQL is read-only; make the server enforce it too
+                init_command="SET SESSION TRANSACTION READ ONLY",
+            )
+            datasource.async_pools[loop] = pool
+            logger.info("Created async connection pool for %s (size=%d)", datasource.name, pool.maxsize)
+    return pool
+
+
+async def aexecute_query(query, datasource):
+    """Async counterpart of views.execute_query, for MySQL datasources."""
+    import aiomysql
+
+    try:
+        pool = await get_async_pool(datasource)
+        timeout = getattr(settings, "MYSQL_POOL", {}).get("checkout_timeout", 5.0)
+        conn = await asyncio.wait_for(pool.acquire(), timeout)
+    except asyncio.TimeoutError:
+        return {"error": "Database busy: no connection available."}
+    except aiomysql.Error as e:
+        logger.exception("Error connecting to datasource %s: %s", datasource.name, e)
+        return {"error": "Failed to connect to the database."}
+
+    # aiomysql has no server-side prepared statements; parameters still group queries by shape
+    prepared = parameterize(query)
+    try:
+        async with conn.cursor() as cursor:
+            start = time.perf_counter()
+            await cursor.execute(prepared.template, prepared.params or None)
+            rows = None
+            if cursor.description:  # Only SELECT-like queries have a result set
+                rows = ResultSet([col[0] for col in cursor.description], await cursor.fetchall())
+            record_shape(prepared, (time.perf_counter() - start) * 1000)
+            if rows is not None:
+                return rows
+            return {"message": "Query executed successfully"}
+    except aiomysql.Error as e:
+        logger.exception("SQL Execution Error on datasource %s: %s", datasource.name, e)
+        return {"error": f"SQL Execution Error: {e}"}
+    finally:
+        pool.release(conn)
+
+
+async def aguard_query(datasource, sql, confirmed=False, streaming=False):
+    """Async counterpart of sql_guard.guard_query, for MySQL datasources."""
+    planned, action = plan_query(sql, streaming)
+    estimated_rows = None
+    if is_read(planned):
+        try:
+            pool = await get_async_pool(datasource)
+            async with pool.acquire() as conn:
+                async with conn.cursor() as cursor:
+                    await cursor.execute(f"EXPLAIN {planned}")
+                    columns = [col[0] for col in cursor.description]
+                    estimated_rows = estimate_rows(columns, await cursor.fetchall())
+        except Exception as e:
+            decision = GuardDecision("reject", planned, sql, reason=f"EXPLAIN failed: {e}", streaming=streaming)
+            record_decision(decision)
+            return decision
+    return decide(sql, planned, action, estimated_rows, confirmed, streaming)
@@ -0,0 +1,270 @@
+"""
+Offline stand-ins and measurement helpers for the benchmark commands
+(manage.py benchmark / manage.py microbench).
+"""
+import datetime
+import json
+import random
+import re
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+from .llm_backends import StubBackend
+from .schema_registry import SchemaSnapshot
+
+# Small schema for runs without an extracted db_schema.json
+DEMO_SCHEMA = {
+    "customers": {
+        "columns": [
+            {"name": "id", "type": "int", "key": "PRI"},
+            {"name": "name", "type": "varchar(100)"},
+            {"name": "email", "type": "varchar(255)"},
+            {"name": "city", "type": "varchar(100)"},
+            {"name": "registration_date", "type": "date"},
+        ],
+    },
+    "products": {
+        "columns": [
+            {"name": "id", "type": "int", "key": "PRI"},
+            {"name": "name", "type": "varchar(100)"},
+            {"name": "category", "type": "varchar(50)"},
+            {"name": "price", "type": "decimal(10,2)"},
+        ],
+    },
+    "orders": {
+        "columns": [
+            {"name": "id", "type": "int", "key": "PRI"},
+            {"name": "customer_id", "type": "int", "key": "MUL"},
+            {"name": "product_id", "type": "int", "key": "MUL"},
+            {"name": "quantity", "type": "int"},
+            {"name": "total", "type": "decimal(10,2)"},
+            {"name": "created_at", "type": "datetime"},
+        ],
+        "foreign_keys": [
+            {"column": "customer_id", "references_table": "customers", "references_column": "id"},
+            {"column": "product_id", "references_table": "products", "references_column": "id"},
+        ],
+    },
+}
+
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(p * len(sorted_values)))]
+
+
+def summarize(latencies, elapsed, statuses):
+    """Latency percentiles (ms) and throughput for one load run."""
+    latencies = sorted(latencies)
+    errors = sum(count for code, count in statuses.items() if not 200 <= code < 300)
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "statuses": {str(code): count for code, count in sorted(statuses.items())},
+        "elapsed_s": round(elapsed, 3),
+        "requests_per_s": round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        "latency_ms_mean": round(sum(latencies) / len(latencies) * 1000, 2) if latencies else 0.0,
+        "latency_ms_p50": round(percentile(latencies, 0.50) * 1000, 2),
+        "latency_ms_p95": round(percentile(latencies, 0.95) * 1000, 2),
+        "latency_ms_p99": round(percentile(latencies, 0.99) * 1000, 2),
+        "latency_ms_max": round(latencies[-1] * 1000, 2) if latencies else 0.0,
+    }
+
+
+class FakeLLMServer:
+    """
+    Local HTTP server speaking the Hugging Face inference API format. Answers
+    come from StubBackend after `latency_ms` (+ up to `jitter_ms`); a fraction
+    `error_rate` of calls fail with 503 to exercise retries.
+    """
+
+    def __init__(self, latency_ms=50.0, jitter_ms=0.0, error_rate=0.0, host="127.0.0.1", port=0, seed=0):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.calls = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._stub = StubBackend()
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/models/fake"
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+                with server._lock:
+                    server.calls += 1
+                    delay = server.latency_ms + server._random.uniform(0, server.jitter_ms)
+                    fail = server._random.random() < server.error_rate
+                time.sleep(delay / 1000.0)
+                if fail:
+                    self._reply(503, {"error": "Model is currently loading"})
+                    return
+                prompt = json.loads(body or b"{}").get("inputs", "")
+                self._reply(200, [{"generated_text": server._stub.generate(prompt)}])
+
+            def _reply(self, code, payload):
+                encoded = json.dumps(payload).encode()
+                self.send_response(code)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(encoded)))
+                self.end_headers()
+                self.wfile.write(encoded)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name="fake-llm", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+        self._stub.close()
+
+
+def sqlite_type(mysql_type):
+    mysql_type = (mysql_type or "").lower()
+    if re.match(r"(tiny|small|medium|big)?int|bool|bit|year", mysql_type):
+        return "INTEGER"
+    if re.match(r"decimal|numeric|float|double|real", mysql_type):
+        return "REAL"
+    return "TEXT"
+
+
+def _value_factory(column, table_rows, foreign_keys, rng):
+    """Return a function row_number -> value for one column."""
+    name = column["name"]
+    mysql_type = (column.get("type") or "").lower()
+    if name in foreign_keys:
+        target_rows = max(1, table_rows.get(foreign_keys[name], 1))
+        return lambda i: rng.randint(1, target_rows)
+    if (column.get("key") or "").upper() == "PRI":
+        return lambda i: i
+    kind = sqlite_type(mysql_type)
+    if kind == "INTEGER":
+        return lambda i: rng.randint(0, 1000)
+    if kind == "REAL":
+        return lambda i: round(rng.uniform(1, 1000), 2)
+    if mysql_type.startswith(("date", "timestamp")):
+        start = datetime.datetime(2020, 1, 1)
+        with_time = not mysql_type.startswith("date") or mysql_type.startswith("datetime")
+        if with_time:
+            return lambda i: (start + datetime.timedelta(seconds=rng.randint(0, 5 * 365 * 86400))).isoformat(" ")
+        return lambda i: (start + datetime.timedelta(days=rng.randint(0, 5 * 365))).isoformat()
+    return lambda i: f"{name}_{i % 1000}"
+
+
+def seed_sqlite(path, raw_schema, rows, batch_size=10_000, seed=0):
+    """
+    Create every table of a db_schema.json-style schema in the SQLite file at
+    `path` and fill each with `rows` deterministic rows. Foreign-key columns
+    point at existing rows of the referenced table.
+    """
+    snapshot = SchemaSnapshot(raw_schema)
+    rng = random.Random(seed)
+    table_rows = {table: rows for table in snapshot.schema}
+    connection = sqlite3.connect(path)
+    try:
+        connection.execute("PRAGMA journal_mode = OFF")
+        connection.execute("PRAGMA synchronous = OFF")
+        for table, columns in snapshot.schema.items():
+            foreign_keys = {fk["column"]: fk["references_table"] for fk in snapshot.foreign_keys.get(table, [])}
+            column_sql = ", ".join(f'"{c["name"]}" {sqlite_type(c.get("type"))}' for c in columns)
+            connection.execute(f'DROP TABLE IF EXISTS "{table}"')
+            connection.execute(f'CREATE TABLE "{table}" ({column_sql})')
+
+            factories = [_value_factory(c, table_rows, foreign_keys, rng) for c in columns]
+            insert = f'INSERT INTO "{table}" VALUES ({", ".join("?" for _ in columns)})'
+            for start in range(1, rows + 1, batch_size):
+                batch = range(start, min(rows, start + batch_size - 1) + 1)
+                connection.executemany(insert, ([f(i) for f in factories] for i in batch))
+            for column in columns:
+                if column["name"] in foreign_keys:
+                    connection.execute(f'CREATE INDEX "{table}_{column["name"]}" ON "{table}" ("{column["name"]}")')
+            connection.commit()
+    finally:
+        connection.close()
+    return list(snapshot.schema)
+
+
+def questions_for(tables):
+    """A spread of questions naming each table, so the stub answers vary."""
+    templates = ["Show all {}", "List every {} record", "Give me the {} table", "What {} do we have"]
+    return [template.format(table) for table in tables for template in templates]
+
+
+def run_load(url, questions, concurrency=8, total_requests=200, timeout=30.0, extra_payload=None):
+    """
+    POST questions round-robin to `url` from `concurrency` threads, each with
+    its own keep-alive session. Returns summarize() of the run.
+    """
+    latencies = []
+    statuses = {}
+    lock = threading.Lock()
+    counter = iter(range(total_requests))
+
+    def worker():
+        session = requests.Session()
+        try:
+            while True:
+                with lock:
+                    i = next(counter, None)
+                if i is None:
+                    return
+                payload = {"query": questions[i % len(questions)], **(extra_payload or {})}
+                start = time.perf_counter()
+                try:
+                    code = session.post(url, json=payload, timeout=timeout).status_code
+                except requests.RequestException:
+                    code = 0
+                elapsed = time.perf_counter() - start
+                with lock:
+                    latencies.append(elapsed)
+                    statuses[code] = statuses.get(code, 0) + 1
+        finally:
+            session.close()
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for _ in range(concurrency):
+            executor.submit(worker)
+    return summarize(latencies, time.perf_counter() - start, statuses)
+
+
+def time_call(fn, repeat=5, min_time=0.2):
+    """Best-of-`repeat` time per call of fn() in microseconds, timeit-style."""
+    number = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        if time.perf_counter() - start >= min_time:
+            break
+        number *= 2
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        best = min(best, (time.perf_counter() - start) / number)
+    return best * 1e6
@@ -0,0 +1,327 @@
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from contextlib import asynccontextmanager, contextmanager
+
+from django.conf import settings
+
+from .db_pool import discard_pool, get_default_pool, open_pool
+from .result_cache import create_result_cache, get_result_cache
+from .schema_registry import discard_schema_registry, get_schema_registry
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DATASOURCE = "default"
+MYSQL_CONNECT_ARGS = ("host", "port", "user", "password", "database")
+
+
+class DatasourceError(Exception):
+    pass
+
+
+class UnknownDatasource(DatasourceError):
+    pass
+
+
+class DatasourceBusy(DatasourceError):
+    """Raised when a datasource is at its concurrency limit for longer than the queue timeout."""
+
+
+def registry_settings():
+    return getattr(settings, "DATASOURCE_REGISTRY", {})
+
+
+class Datasource:
+    """
+    One target database and everything kept for it: a connection pool, the
+    schema registry for its schema file and its own result cache, all
+    created on first use. At most `max_concurrency` requests use it at once.
+    """
+
+    def __init__(self, name, config, max_concurrency):
+        self.name = name
+        self.config = config
+        self.dialect = config.get("backend", "mysql")
+        self.schema_file = config.get("schema_file") or os.path.join(
+            registry_settings().get("schema_dir", "schemas"), f"{name}.json")
+        self.max_concurrency = config.get("max_concurrency", max_concurrency)
+        self.async_pools = weakref.WeakKeyDictionary()  # event loop -> aiomysql pool, see async_db.py
+        self._slots = threading.BoundedSemaphore(self.max_concurrency)
+        self._lock = threading.Lock()
+        self._pool = None
+        self._result_cache = None
+        self.leases = 0  # Requests holding or waiting for a slot; guarded by the registry lock
+        self.in_flight = 0
+        self.served = 0
+        self.rejected = 0
+        self.last_used = time.monotonic()
+
+    @property
+    def connect_args(self):
+        return {key: self.config[key] for key in MYSQL_CONNECT_ARGS if key in self.config}
+
+    @property
+    def database(self):
+        """Database name generated queries may qualify tables with."""
+        return "main" if self.dialect == "sqlite" else self.config.get("database")
+
+    @property
+    def pool(self):
+        with self._lock:
+            if self._pool is None:
+                # Owned, not shared: closing it on eviction can't affect another datasource
+                if self.dialect == "sqlite":
+                    self._pool = open_pool({"database": str(self.config["database"])}, "sqlite")
+                else:
+                    self._pool = open_pool(self.connect_args)
+            return self._pool
+
+    @property
+    def schema_registry(self):
+        return get_schema_registry(self.schema_file)
+
+    @property
+    def result_cache(self):
+        with self._lock:
+            if self._result_cache is None:
+                self._result_cache = create_result_cache(namespace=self.name)
+            return self._result_cache
+
+    def acquire(self, timeout):
+        if not self._slots.acquire(timeout=timeout):
+            with self._lock:
+                self.rejected += 1
+            raise DatasourceBusy(f"Database '{self.name}' already has {self.max_concurrency} requests in flight.")
+        self._started()
+
+    async def aacquire(self, timeout):
+        """Async acquire(): polls the semaphore so a waiting request never blocks the event loop."""
+        deadline = time.monotonic() + timeout
+        while not self._slots.acquire(blocking=False):
+            if time.monotonic() >= deadline:
+                with self._lock:
+                    self.rejected += 1
+                raise DatasourceBusy(f"Database '{self.name}' already has {self.max_concurrency} requests in flight.")
+            await asyncio.sleep(0.01)
+        self._started()
+
+    def _started(self):
+        with self._lock:
+            self.in_flight += 1
+            self.served += 1
+
+    def release(self):
+        with self._lock:
+            self.in_flight -= 1
+        self._slots.release()
+
+    def close(self):
+        """Release the pool, schema and cached results; a later request starts afresh."""
+        with self._lock:
+            pool, self._pool = self._pool, None
+            self._result_cache = None
+            async_pools = list(self.async_pools.values())
+            self.async_pools.clear()
+        if pool is not None:
+            discard_pool(pool)
+        for async_pool in async_pools:
+            async_pool.close()  # Connections close as they are returned
+        discard_schema_registry(self.schema_file)
+
+    def stats(self):
+        with self._lock:
+            stats = {
+                "dialect": self.dialect,
+                "max_concurrency": self.max_concurrency,
+                "in_flight": self.in_flight,
+                "served": self.served,
+                "rejected": self.rejected,
+                "idle_seconds": time.monotonic() - self.last_used,
+            }
+            pool, cache = self._pool, self._result_cache
+        if pool is not None:
+            stats["pool"] = pool.stats()
+        if cache is not None:
+            stats["result_cache"] = cache.stats()
+        return stats
+
+
+class DefaultDatasource(Datasource):
+    """The database from SQL_BACKEND/MYSQL_DATABASE/SCHEMA_FILE, sharing the process-wide pool and cache."""
+
+    @property
+    def pool(self):
+        return get_default_pool()
+
+    @property
+    def result_cache(self):
+        return get_result_cache()
+
+    def stats(self):
+        return {**super().stats(), "pool": self.pool.stats(), "result_cache": self.result_cache.stats()}
+
+    def close(self):
+        pass  # Never evicted
+
+
+def default_config():
+    if getattr(settings, "SQL_BACKEND", "mysql") == "sqlite":
+        config = {"backend": "sqlite", "database": str(settings.SQLITE_DATABASE)}
+    else:
+        config = {"backend": "mysql", **settings.MYSQL_DATABASE}
+    return {**config, "schema_file": settings.SCHEMA_FILE}
+
+
+class DatasourceRegistry:
+    """
+    Resolves datasource names to Datasource objects.
+
+    Datasources come from settings.DATASOURCES plus the JSON object in
+    settings.DATASOURCES_FILE, which is re-read when it changes so tenants
+    can be added without a restart. At most `max_active` datasources are
+    kept open; beyond that, and after `idle_timeout` seconds unused, the
+    least recently used ones that have no request in flight are closed.
+    """
+
+    def __init__(self, max_active=32, idle_timeout=600.0, max_concurrency=8, queue_timeout=5.0, **options):
+        self.max_active = max_active
+        self.idle_timeout = idle_timeout
+        self.max_concurrency = max_concurrency
+        self.queue_timeout = queue_timeout
+        self._lock = threading.Lock()
+        self._active = OrderedDict()  # name -> Datasource, least recently used first
+        self._configs = {}
+        self._file_stamp = None
+        self.evictions = 0
+        self._load_configs()
+
+    def _load_configs(self):
+        configs = {DEFAULT_DATASOURCE: default_config(), **getattr(settings, "DATASOURCES", {})}
+        path = getattr(settings, "DATASOURCES_FILE", None)
+        if path:
+            try:
+                with open(path) as f:
+                    configs.update(json.load(f))
+                self._file_stamp = os.stat(path).st_mtime_ns
+            except (OSError, ValueError) as e:
+                logger.error(f"Could not read datasources from '{path}': {e}")
+        self._configs = configs
+
+    def _reload_if_changed(self):
+        path = getattr(settings, "DATASOURCES_FILE", None)
+        try:
+            stamp = os.stat(path).st_mtime_ns if path else None
+        except OSError:
+            stamp = None
+        if stamp != self._file_stamp:
+            self._load_configs()
+
+    def config(self, name):
+        """Return the configuration of datasource `name`; raises UnknownDatasource."""
+        name = name or DEFAULT_DATASOURCE
+        with self._lock:
+            if name not in self._configs:
+                self._reload_if_changed()
+            if name not in self._configs:
+                raise UnknownDatasource(f"Unknown database '{name}'.")
+            return self._configs[name]
+
+    def names(self):
+        with self._lock:
+            self._reload_if_changed()
+            return sorted(self._configs)
+
+    def _lease(self, name):
+        config = self.config(name)
+        name = name or DEFAULT_DATASOURCE
+        with self._lock:
+            datasource = self._active.get(name)
+            if datasource is None:
+                cls = DefaultDatasource if name == DEFAULT_DATASOURCE else Datasource
+                datasource = self._active[name] = cls(name, config, self.max_concurrency)
+            self._active.move_to_end(name)
+            datasource.leases += 1
+            evicted = self._evict_locked()
+        for stale in evicted:
+            stale.close()
+        return datasource
+
+    def _return(self, datasource):
+        with self._lock:
+            datasource.leases -= 1
+            datasource.last_used = time.monotonic()
+
+    def _evict_locked(self):
+        """Pick datasources to close: idle too long, or least recently used beyond max_active."""
+        now = time.monotonic()
+        evicted = []
+        excess = len(self._active) - self.max_active
+        for name, datasource in list(self._active.items()):
+            if name == DEFAULT_DATASOURCE or datasource.leases:
+                continue
+            if excess > 0 or now - datasource.last_used > self.idle_timeout:
+                del self._active[name]
+                evicted.append(datasource)
+                excess -= 1
+        if evicted:
+            self.evictions += len(evicted)
+            logger.info("Evicted idle datasources: %s", ", ".join(d.name for d in evicted))
+        return evicted
+
+    @contextmanager
+    def use(self, name, timeout=None):
+        """
+        Hold one of datasource `name`'s concurrency slots for the duration of
+        the block, waiting at most `timeout` seconds (default: queue_timeout).
+        Raises UnknownDatasource or DatasourceBusy.
+        """
+        datasource = self._lease(name)
+        try:
+            datasource.acquire(self.queue_timeout if timeout is None else timeout)
+            try:
+                yield datasource
+            finally:
+                datasource.release()
+        finally:
+            self._return(datasource)
+
+    @asynccontextmanager
+    async def ause(self, name, timeout=None):
+        """Async counterpart of use()."""
+        datasource = self._lease(name)
+        try:
+            await datasource.aacquire(self.queue_timeout if timeout is None else timeout)
+            try:
+                yield datasource
+            finally:
+                datasource.release()
+        finally:
+            self._return(datasource)
+
+    def stats(self):
+        with self._lock:
+            evicted = self._evict_locked()
+            active = list(self._active.values())
+            summary = {"configured": len(self._configs), "active": len(active),
+                       "max_active": self.max_active, "evictions": self.evictions}
+        for stale in evicted:
+            stale.close()
+        return {**summary, "datasources": {d.name: d.stats() for d in active}}
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_datasource_registry():
+    """Return the process-wide registry configured by settings.DATASOURCE_REGISTRY."""
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = DatasourceRegistry(**registry_settings())
+        return _registry
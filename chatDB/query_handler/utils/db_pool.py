@@ -0,0 +1,365 @@
+import logging
+import sqlite3
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+import mysql.connector
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+# Driver errors of every supported database
+DATABASE_ERRORS = (mysql.connector.Error, sqlite3.Error)
+
+
+class PoolTimeout(Exception):
+    """Raised when no connection could be checked out within the timeout."""
+
+
+class ConnectionPool:
+    """
+    Thread-safe pool of MySQL connections.
+
+    Connections are created lazily up to `size`, checked for liveness on
+    checkout, and closed once they sit idle for longer than `max_idle_time`.
+    """
+
+    dialect = "mysql"
+
+    def __init__(self, connect_args, size=5, checkout_timeout=5.0,
+                 max_idle_time=300.0, ping_interval=0.0, wait_samples=1024):
+        self.connect_args = dict(connect_args)
+        self.size = size
+        self.checkout_timeout = checkout_timeout
+        self.max_idle_time = max_idle_time
+        self.ping_interval = ping_interval
+
+        self._cond = threading.Condition()
+        self._idle = deque()  # (connection, last_used) pairs, most recent on the right
+        self._open = 0  # connections currently owned by the pool (idle + checked out)
+        self._closed = False
+
+        # Checkout wait-time metrics
+        self._waits = deque(maxlen=wait_samples)
+        self._checkouts = 0
+        self._timeouts = 0
+        self._total_wait = 0.0
+        self._max_wait = 0.0
+        self._discarded = 0
+
+    @property
+    def label(self):
+        return f"{self.connect_args.get('user')}@{self.connect_args.get('host')}/{self.connect_args.get('database')}"
+
+    def _connect(self):
+        return mysql.connector.connect(**self.connect_args)
+
+    def _is_healthy(self, connection, last_used):
+        if time.monotonic() - last_used < self.ping_interval:
+            return True
+        try:
+            return connection.is_connected()  # Pings the server
+        except mysql.connector.Error:
+            return False
+
+    def _discard(self, connection):
+        self._discarded += 1
+        try:
+            connection.close()
+        except Exception:
+            pass
+
+    def _evict_idle_locked(self):
+        """Close connections that have been idle for longer than max_idle_time."""
+        now = time.monotonic()
+        while self._idle and now - self._idle[0][1] > self.max_idle_time:
+            connection, _ = self._idle.popleft()
+            self._open -= 1
+            self._discard(connection)
+
+    def acquire(self, timeout=None):
+        """
+        Check out a connection, waiting at most `timeout` seconds for one to free up.
+        """
+        timeout = self.checkout_timeout if timeout is None else timeout
+        start = time.monotonic()
+        deadline = start + timeout
+
+        while True:
+            connection = None
+            with self._cond:
+                while True:
+                    if self._closed:
+                        raise PoolTimeout("Connection pool is closed.")
+                    self._evict_idle_locked()
+                    if self._idle:
+                        connection, last_used = self._idle.pop()
+                        break
+                    if self._open < self.size:
+                        self._open += 1  # Reserve a slot, connect outside the lock
+                        break
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._timeouts += 1
+                        raise PoolTimeout(f"No database connection available after {timeout:.1f}s.")
+                    self._cond.wait(remaining)
+
+            if connection is not None:
+                if self._is_healthy(connection, last_used):
+                    break
+                logger.warning("Discarding dead pooled connection")
+                self._discard(connection)
+                connection = None
+                # Keep the reserved slot and open a fresh connection below
+
+            try:
+                connection = self._connect()
+                break
+            except DATABASE_ERRORS:
+                with self._cond:
+                    self._open -= 1
+                    self._cond.notify()
+                raise
+
+        self._record_wait(time.monotonic() - start)
+        return connection
+
+    def release(self, connection):
+        """Return a connection to the pool."""
+        healthy = True
+        try:
+            # End any open transaction so the next borrower gets a fresh snapshot
+            connection.rollback()
+        except Exception:
+            healthy = False
+
+        with self._cond:
+            if healthy and not self._closed:
+                self._idle.append((connection, time.monotonic()))
+            else:
+                self._open -= 1
+                self._discard(connection)
+            self._evict_idle_locked()
+            self._cond.notify()
+
+    def discard(self, connection):
+        """Close a checked-out connection instead of returning it, freeing its slot."""
+        with self._cond:
+            self._open -= 1
+            self._discard(connection)
+            self._cond.notify()
+
+    @contextmanager
+    def connection(self, timeout=None):
+        """Context manager that checks a connection out and always returns it."""
+        connection = self.acquire(timeout)
+        try:
+            yield connection
+        finally:
+            self.release(connection)
+
+    def close(self):
+        """Close all idle connections and refuse new checkouts."""
+        with self._cond:
+            self._closed = True
+            while self._idle:
+                connection, _ = self._idle.popleft()
+                self._open -= 1
+                self._discard(connection)
+            self._cond.notify_all()
+
+    def _record_wait(self, wait):
+        with self._cond:
+            self._checkouts += 1
+            self._total_wait += wait
+            self._max_wait = max(self._max_wait, wait)
+            self._waits.append(wait)
+
+    def stats(self):
+        """Return pool occupancy and checkout wait-time metrics (in milliseconds)."""
+        with self._cond:
+            waits = sorted(self._waits)
+            idle = len(self._idle)
+            in_use = self._open - idle
+            checkouts = self._checkouts
+
+            def percentile(p):
+                if not waits:
+                    return 0.0
+                return waits[min(len(waits) - 1, int(p * len(waits)))] * 1000
+
+            return {
+                "size": self.size,
+                "open": self._open,
+                "idle": idle,
+                "in_use": in_use,
+                "checkouts": checkouts,
+                "timeouts": self._timeouts,
+                "discarded": self._discarded,
+                "wait_ms_avg": (self._total_wait / checkouts * 1000) if checkouts else 0.0,
+                "wait_ms_p50": percentile(0.50),
+                "wait_ms_p95": percentile(0.95),
+                "wait_ms_p99": percentile(0.99),
+                "wait_ms_max": self._max_wait * 1000,
+            }
+
+
+class SQLiteCursor:
+    """mysql.connector-style cursor over sqlite3, returning dicts when asked for dictionary rows."""
+
+    def __init__(self, cursor, dictionary=False):
+        self._cursor = cursor
+        self._dictionary = dictionary
+
+    @property
+    def description(self):
+        return self._cursor.description
+
+    @property
+    def rowcount(self):
+        return self._cursor.rowcount
+
+    def _rows(self, rows):
+        if not self._dictionary or not self._cursor.description:
+            return rows
+        columns = [col[0] for col in self._cursor.description]
+        return [dict(zip(columns, row)) for row in rows]
+
+    def execute(self, query, params=()):
+        self._cursor.execute(query, params or ())
+
+    def fetchone(self):
+        row = self._cursor.fetchone()
+        return self._rows([row])[0] if row is not None else None
+
+    def fetchmany(self, size=1):
+        return self._rows(self._cursor.fetchmany(size))
+
+    def fetchall(self):
+        return self._rows(self._cursor.fetchall())
+
+    def close(self):
+        self._cursor.close()
+
+
+class SQLiteConnection:
+    """sqlite3 connection with the subset of the mysql.connector API the query path uses."""
+
+    def __init__(self, database, cached_statements=128):
+        # sqlite3 keeps the compiled statements of recent SQL texts, so parameterized queries are parsed once
+        self._connection = sqlite3.connect(database, check_same_thread=False, uri=database.startswith("file:"),
+                                           cached_statements=cached_statements)
+
+    def cursor(self, dictionary=False, **kwargs):
+        return SQLiteCursor(self._connection.cursor(), dictionary)
+
+    def is_connected(self):
+        return True
+
+    def commit(self):
+        self._connection.commit()
+
+    def rollback(self):
+        self._connection.rollback()
+
+    def close(self):
+        self._connection.close()
+
+
+class SQLitePool(ConnectionPool):
+    """
+    Pool of SQLite connections, an in-process stand-in for MySQL in benchmarks
+    and offline runs. MySQL-only features (information_schema, EXPLAIN cost
+    checks) are skipped for pools whose dialect is not "mysql".
+    """
+
+    dialect = "sqlite"
+
+    @property
+    def label(self):
+        return f"sqlite:{self.connect_args['database']}"
+
+    def _connect(self):
+        cache_size = getattr(settings, "PREPARED_STATEMENTS", {}).get("cache_size", 64)
+        return SQLiteConnection(self.connect_args["database"], cached_statements=cache_size)
+
+    def _is_healthy(self, connection, last_used):
+        return True
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def _new_pool(connect_args, dialect="mysql"):
+    options = getattr(settings, "MYSQL_POOL", {})
+    if dialect == "sqlite":
+        pool = SQLitePool(connect_args, **options)
+        logger.info("Created SQLite connection pool for %s (size=%d)", connect_args["database"], pool.size)
+    else:
+        pool = ConnectionPool(connect_args, **options)
+        logger.info("Created connection pool for %s@%s/%s (size=%d)",
+                    connect_args.get("user"), connect_args.get("host"),
+                    connect_args.get("database"), pool.size)
+    return pool
+
+
+def _shared_pool(key, connect_args, dialect):
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            pool = _pools[key] = _new_pool(connect_args, dialect)
+        return pool
+
+
+def get_pool(**connect_args):
+    """
+    Return the shared pool for the given connection arguments, creating it on first use.
+    """
+    return _shared_pool(tuple(sorted(connect_args.items())), connect_args, "mysql")
+
+
+def get_sqlite_pool(database):
+    """Return the shared SQLite pool for the given database file."""
+    return _shared_pool(("sqlite", database), {"database": database}, "sqlite")
+
+
+def open_pool(connect_args, dialect="mysql"):
+    """
+    Create a pool for a single owner, such as a tenant datasource, instead of
+    sharing one per connection arguments like get_pool(): its owner can close
+    it with discard_pool() without closing connections anyone else is using.
+    """
+    pool = _new_pool(connect_args, dialect)
+    with _pools_lock:
+        _pools[("owned", id(pool))] = pool  # Listed in all_pool_stats() until discarded
+    return pool
+
+
+def get_default_pool():
+    """
+    Return the pool for the database configured in settings.MYSQL_DATABASE, or
+    settings.SQLITE_DATABASE when settings.SQL_BACKEND is "sqlite".
+    """
+    if getattr(settings, "SQL_BACKEND", "mysql") == "sqlite":
+        return get_sqlite_pool(str(settings.SQLITE_DATABASE))
+    return get_pool(**settings.MYSQL_DATABASE)
+
+
+def discard_pool(pool):
+    """Close a shared pool and forget it; the next get_pool() for its arguments creates a new one."""
+    with _pools_lock:
+        for key, candidate in list(_pools.items()):
+            if candidate is pool:
+                del _pools[key]
+    pool.close()
+
+
+def all_pool_stats():
+    """Return stats for every pool in this process, keyed by user@host/database (or sqlite:path)."""
+    with _pools_lock:
+        pools = list(_pools.values())
+    return {p.label: p.stats() for p in pools}
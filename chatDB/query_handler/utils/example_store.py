@@ -0,0 +1,269 @@
+import logging
+import re
+import threading
+import time
+import zlib
+from collections import deque
+
+from django.conf import settings
+
+from .datasources import DEFAULT_DATASOURCE
+from .schema_retrieval import get_schema_index, question_tokens
+from .sql_guard import guard_settings, join_limit, split_limit
+from .sql_validation import SQLValidationError, parse_sql
+from .translation_cache import normalize_question
+
+logger = logging.getLogger(__name__)
+
+COMMENT_RE = re.compile(r"/\*.*?\*/", re.DOTALL)  # Including optimizer hints such as the guard's
+
+
+def few_shot_settings():
+    return getattr(settings, "FEW_SHOT", {})
+
+
+def estimate_tokens(text):
+    return len(text) // 4  # ~4 characters per token, as in the prompt_build span
+
+
+def format_example(question, sql):
+    return f"User Query: {question}\nSQL: {sql.rstrip(';')};\n\n"
+
+
+def clean_example_sql(sql):
+    """
+    Saved SQL as the model would have written it: without the query guard's
+    time-limit hint and row cap, on one line.
+    """
+    sql = " ".join(COMMENT_RE.sub(" ", sql).split())
+    base, row_count, offset = split_limit(sql)
+    if row_count == guard_settings()["max_rows"] and not offset:
+        return base
+    return join_limit(base, row_count, offset) if row_count is not None else base
+
+
+def fallback_example(snapshot, question):
+    """A minimal example over the table most relevant to the question, for when history has nothing similar."""
+    tables = get_schema_index(snapshot).relevant_tables(question, top_k=1, max_tables=1)
+    if not tables:
+        return None
+    return f"Show 10 rows from {tables[0]}.", f"SELECT * FROM {tables[0]} LIMIT 10"
+
+
+class QuestionVectorizer:
+    """
+    Hashed bag of stemmed words and word pairs, L2-normalized, so vectors of
+    questions seen at different times are comparable without a shared vocabulary.
+    """
+
+    def __init__(self, dimensions=1024):
+        self.dimensions = dimensions
+
+    def vector(self, question):
+        import numpy as np  # Imported on first use, like in schema_retrieval.py
+
+        tokens = question_tokens(question)
+        features = tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+        vector = np.zeros(self.dimensions, dtype=np.float32)
+        for feature in features:
+            vector[zlib.crc32(feature.encode()) % self.dimensions] += 1.0
+        np.log1p(vector, out=vector)  # Sublinear term frequency
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+
+class ExampleIndex:
+    """
+    The past question/SQL pairs asked of one datasource whose SQL validates
+    against one schema version, with their question vectors stacked into a
+    matrix. `lock` guards it while it is extended and searched.
+    """
+
+    def __init__(self, snapshot, vectorizer, max_examples):
+        import numpy as np
+
+        self.lock = threading.Lock()
+        self.snapshot = snapshot
+        self.vectorizer = vectorizer
+        self.max_examples = max_examples
+        self.questions = []
+        self.sqls = []
+        self.matrix = np.zeros((0, vectorizer.dimensions), dtype=np.float32)
+        self.positions = {}  # Normalized question -> row
+        self.seen = 0  # Sequence number of the last stored row considered
+
+    def extend(self, rows):
+        """Add (seq, question, sql) rows newer than the last call; SQL that no longer validates is skipped."""
+        vectors = []
+        for seq, question, sql in rows:
+            if seq <= self.seen:
+                continue
+            self.seen = seq
+            try:
+                parse_sql(sql, self.snapshot.schema)
+            except SQLValidationError:
+                continue
+            key = normalize_question(question)
+            row = self.positions.get(key)
+            if row is not None:
+                self.sqls[row] = sql  # Same question answered again; keep the newest SQL
+                continue
+            self.positions[key] = len(self.questions)
+            self.questions.append(question)
+            self.sqls.append(sql)
+            vectors.append(self.vectorizer.vector(question))
+        if vectors:
+            import numpy as np
+
+            self.matrix = np.vstack([self.matrix, np.stack(vectors)])
+        if len(self.questions) > self.max_examples:
+            drop = len(self.questions) - self.max_examples
+            self.questions, self.sqls, self.matrix = self.questions[drop:], self.sqls[drop:], self.matrix[drop:]
+            self.positions = {normalize_question(q): i for i, q in enumerate(self.questions)}
+
+    def nearest(self, question, k, min_similarity):
+        """Return up to k (similarity, question, sql) triples, most similar first."""
+        if not self.questions:
+            return []
+        scores = self.matrix @ self.vectorizer.vector(question)
+        ranked = (-scores).argsort(kind="stable")[:k]
+        return [(float(scores[i]), self.questions[i], self.sqls[i]) for i in ranked if scores[i] >= min_similarity]
+
+
+class ExampleStore:
+    """
+    Few-shot examples for the prompt, taken from successfully answered
+    UserQuery rows. New rows are loaded at most every `refresh_interval`
+    seconds. Each datasource and schema version gets its own index of the
+    datasource's rows whose SQL still validates against it, so one tenant's
+    questions and literals never reach another tenant's prompt. Also counts
+    how often the model's first answer to a question validates, with and
+    without examples in the prompt.
+    """
+
+    def __init__(self, enabled=True, top_k=3, token_budget=400, min_similarity=0.3, max_examples=5000,
+                 refresh_interval=30.0, dimensions=1024, max_indexes=32):
+        self.enabled = enabled
+        self.top_k = top_k
+        self.token_budget = token_budget
+        self.min_similarity = min_similarity
+        self.max_examples = max_examples
+        self.refresh_interval = refresh_interval
+        self.max_indexes = max_indexes  # (datasource, schema version) pairs kept indexed
+        self.vectorizer = QuestionVectorizer(dimensions)
+        self._lock = threading.Lock()
+        self._rows = {}  # datasource -> deque of its last max_examples (seq, question, sql), oldest first
+        self._last_id = 0
+        self._last_refresh = None
+        self._indexes = {}  # (datasource, schema version) -> ExampleIndex, least recently used first
+        self.refreshes = 0
+        self.lookups = 0
+        self.injected = 0
+        self.counts = {"with_examples": [0, 0], "without_examples": [0, 0]}  # [generations, valid]
+
+    def due(self):
+        return self.enabled and (
+            self._last_refresh is None or time.monotonic() - self._last_refresh >= self.refresh_interval)
+
+    def refresh(self):
+        """Load completed queries saved since the last refresh. Needs database access."""
+        from ..models import UserQuery  # Imported lazily: apps must be loaded first
+
+        with self._lock:
+            last_id = self._last_id
+            self._last_refresh = time.monotonic()
+        rows = (UserQuery.objects.filter(status=UserQuery.STATUS_COMPLETED, error__isnull=True, id__gt=last_id)
+                .exclude(generated_query__isnull=True).exclude(generated_query="")
+                .order_by("-id").values_list("id", "datasource", "query", "generated_query")[:self.max_examples])
+        rows = list(reversed(rows))  # Oldest first so the newest end up last
+        with self._lock:
+            for pk, datasource, question, sql in rows:
+                if pk > self._last_id:
+                    # Bounded per datasource, so a busy tenant can't push out the others' examples
+                    rows_of = self._rows.setdefault(datasource, deque(maxlen=self.max_examples))
+                    rows_of.append((pk, question, clean_example_sql(sql)))
+                    self._last_id = pk
+            self.refreshes += 1
+        if rows:
+            logger.info("Loaded %d few-shot examples from query history", len(rows))
+
+    def _index(self, snapshot, datasource):
+        """The datasource's index for the schema version; the caller must hold its lock to use it."""
+        key = (datasource, snapshot.version)
+        with self._lock:
+            index = self._indexes.pop(key, None)
+            if index is None:
+                index = ExampleIndex(snapshot, self.vectorizer, self.max_examples)
+            self._indexes[key] = index
+            while len(self._indexes) > self.max_indexes:
+                self._indexes.pop(next(iter(self._indexes)))
+            rows = [row for row in self._rows.get(datasource, ()) if row[0] > index.seen]
+        return index, rows
+
+    def examples_for(self, snapshot, question, datasource=DEFAULT_DATASOURCE):
+        """
+        The most similar past (question, sql) pairs asked of `datasource` for
+        the prompt: at most top_k, above min_similarity, and within
+        token_budget altogether.
+        """
+        if not self.enabled or not snapshot.schema:
+            return []
+        index, rows = self._index(snapshot, datasource)
+        # Validating new rows can take a while after a schema change; only this index waits for it
+        with index.lock:
+            index.extend(rows)
+            candidates = index.nearest(question, self.top_k, self.min_similarity)
+        with self._lock:
+            self.lookups += 1
+        examples, budget = [], self.token_budget
+        for _, past_question, sql in candidates:
+            cost = estimate_tokens(format_example(past_question, sql))
+            if cost > budget:
+                break
+            examples.append((past_question, sql))
+            budget -= cost
+        with self._lock:
+            self.injected += len(examples)
+        return examples
+
+    def record_generation(self, valid, with_examples):
+        """Count a model answer to a new question and whether its SQL validated."""
+        with self._lock:
+            counts = self.counts["with_examples" if with_examples else "without_examples"]
+            counts[0] += 1
+            counts[1] += int(valid)
+
+    def stats(self):
+        with self._lock:
+            stats = {
+                "enabled": self.enabled,
+                "history_rows": sum(len(rows) for rows in self._rows.values()),
+                "indexes": len(self._indexes),
+                "indexed": {f"{datasource}@{version}": len(index.questions)
+                            for (datasource, version), index in self._indexes.items()},
+                "refreshes": self.refreshes,
+                "lookups": self.lookups,
+                "examples_injected": self.injected,
+            }
+            counts = {name: list(values) for name, values in self.counts.items()}
+        generations = sum(c[0] for c in counts.values())
+        valid = sum(c[1] for c in counts.values())
+        stats.update(generations=generations, first_try_valid=valid,
+                     first_try_success_rate=valid / generations if generations else 0.0)
+        for name, (total, ok) in counts.items():
+            stats[f"generations_{name}"] = total
+            stats[f"success_rate_{name}"] = ok / total if total else 0.0
+        return stats
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_example_store():
+    """Return the process-wide example store configured by settings.FEW_SHOT."""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = ExampleStore(**few_shot_settings())
+        return _store
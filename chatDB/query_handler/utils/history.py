@@ -0,0 +1,55 @@
+import datetime
+import re
+
+from django.core import signing
+from django.db import connection
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+CURSOR_SALT = "query_handler.history"
+
+
+def search_terms(text):
+    return re.findall(r"\w+", text or "")
+
+
+def apply_search(queryset, text):
+    """
+    Restrict `queryset` to UserQuery rows whose question or generated SQL
+    contains every word of `text` (as a prefix). Uses the FTS5 table on
+    SQLite and the FULLTEXT index on MySQL; other backends fall back to
+    substring matching.
+    """
+    terms = search_terms(text)
+    if not terms:
+        return queryset
+
+    if connection.vendor == "sqlite":
+        match = " ".join(f'"{term}"*' for term in terms)
+        return queryset.filter(id__in=RawSQL(
+            "SELECT rowid FROM query_handler_userquery_fts WHERE query_handler_userquery_fts MATCH %s", [match]))
+    if connection.vendor == "mysql":
+        against = " ".join(f"+{term}*" for term in terms)
+        return queryset.extra(where=["MATCH (query, generated_query) AGAINST (%s IN BOOLEAN MODE)"],
+                              params=[against])
+
+    for term in terms:
+        queryset = queryset.filter(Q(query__icontains=term) | Q(generated_query__icontains=term))
+    return queryset
+
+
+def make_cursor(user_query):
+    """Opaque, signed keyset cursor pointing just past `user_query` in (timestamp, id) order."""
+    return signing.dumps([user_query.timestamp.isoformat(), user_query.id], salt=CURSOR_SALT, compress=True)
+
+
+def read_cursor(token):
+    """Return (timestamp, id); raises signing.BadSignature or ValueError."""
+    timestamp, pk = signing.loads(token, salt=CURSOR_SALT)
+    return datetime.datetime.fromisoformat(timestamp), int(pk)
+
+
+def after_cursor(queryset, token):
+    """Rows strictly older than the cursor, in the newest-first order history is listed in."""
+    timestamp, pk = read_cursor(token)
+    return queryset.filter(Q(timestamp__lt=timestamp) | Q(timestamp=timestamp, id__lt=pk))
@@ -0,0 +1,106 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections
+
+logger = logging.getLogger(__name__)
+
+
+class QueueFull(Exception):
+    """Raised when the job queue is at capacity; clients should retry later."""
+
+
+class JobQueue:
+    """
+    Bounded in-process worker pool for background query jobs.
+
+    At most `workers` jobs run at once and at most `max_queue` more wait;
+    submissions beyond that raise QueueFull instead of piling up. Job state
+    itself lives on the UserQuery row, so any worker process can report it;
+    the condition here only lets same-process waiters wake up early.
+    """
+
+    def __init__(self, workers=4, max_queue=100):
+        self.workers = workers
+        self.max_queue = max_queue
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="query-job")
+        self._slots = threading.BoundedSemaphore(workers + max_queue)
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+        self._generation = 0  # Bumped on every job state change
+        self.pending = 0
+        self.running = 0
+        self.submitted = 0
+        self.rejected = 0
+        self.crashed = 0
+
+    def submit(self, job_id, run):
+        """Queue run(job_id); raises QueueFull when workers and queue are all taken."""
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self.rejected += 1
+            raise QueueFull(f"{self.workers + self.max_queue} jobs already queued or running.")
+        with self._lock:
+            self.pending += 1
+            self.submitted += 1
+        self._executor.submit(self._run, job_id, run)
+
+    def _run(self, job_id, run):
+        with self._lock:
+            self.pending -= 1
+            self.running += 1
+        try:
+            run(job_id)
+        except Exception:
+            logger.exception("Query job %s crashed", job_id)
+            with self._lock:
+                self.crashed += 1
+        finally:
+            close_old_connections()  # Worker threads outlive requests; don't leak DB connections
+            with self._lock:
+                self.running -= 1
+            self._slots.release()
+            self.notify()
+
+    def notify(self):
+        """Wake up waiters after a job's state changed."""
+        with self._changed:
+            self._generation += 1
+            self._changed.notify_all()
+
+    def wait(self, timeout):
+        """
+        Block until some job's state changes in this process, or `timeout`
+        seconds pass; callers re-read the job they care about either way.
+        """
+        with self._changed:
+            seen = self._generation
+            self._changed.wait_for(lambda: self._generation != seen, timeout)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "max_queue": self.max_queue,
+                "pending": self.pending,
+                "running": self.running,
+                "submitted": self.submitted,
+                "rejected": self.rejected,
+                "crashed": self.crashed,
+            }
+
+
+_job_queue = None
+_job_queue_lock = threading.Lock()
+
+
+def get_job_queue():
+    """Return the process-wide job queue configured by settings.QUERY_JOBS."""
+    global _job_queue
+    with _job_queue_lock:
+        if _job_queue is None:
+            options = getattr(settings, "QUERY_JOBS", {})
+            _job_queue = JobQueue(options.get("workers", 4), options.get("max_queue", 100))
+        return _job_queue
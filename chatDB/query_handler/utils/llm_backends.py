@@ -0,0 +1,223 @@
+import asyncio
+import logging
+import queue
+import re
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+
+logger = logging.getLogger(__name__)
+
+
+class LLMBackend:
+    """
+    Interface for anything that turns a prompt into generated text.
+
+    Subclasses implement generate_batch(); generate(), agenerate() and
+    warm_up() have sensible defaults.
+    """
+
+    name = "base"
+
+    def generate_batch(self, prompts):
+        raise NotImplementedError
+
+    def generate(self, prompt):
+        return self.generate_batch([prompt])[0]
+
+    async def agenerate(self, prompt):
+        return await sync_to_async(self.generate, thread_sensitive=False)(prompt)
+
+    def warm_up(self):
+        """Load whatever the backend needs so the first real request is not slow."""
+
+    def close(self):
+        pass
+
+
+class HuggingFaceAPIBackend(LLMBackend):
+    """
+    The hosted inference API, called through the given sync/async functions.
+
+    The API takes one prompt per request, so batches are sent as up to
+    `max_parallel` concurrent requests over the client's kept-alive connections.
+    """
+
+    name = "huggingface"
+
+    def __init__(self, call, acall, max_parallel=8):
+        self._call = call
+        self._acall = acall
+        self.max_parallel = max_parallel
+
+    def generate(self, prompt):
+        return self._call(prompt)
+
+    def generate_batch(self, prompts):
+        if len(prompts) <= 1 or self.max_parallel <= 1:
+            return [self._call(prompt) for prompt in prompts]
+        with ThreadPoolExecutor(max_workers=min(len(prompts), self.max_parallel),
+                                thread_name_prefix="llm-batch") as executor:
+            return list(executor.map(self._call, prompts))
+
+    async def agenerate(self, prompt):
+        return await self._acall(prompt)
+
+
+class MicroBatcher:
+    """
+    Collects prompts submitted from many threads for up to `max_wait_ms` (or
+    until `max_batch_size` is reached) and runs them through `run_batch` as one batch.
+    """
+
+    def __init__(self, run_batch, max_batch_size=8, max_wait_ms=5.0):
+        self.run_batch = run_batch
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self._queue = queue.Queue()
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self.batches = 0
+        self.items = 0
+
+    def _ensure_started(self):
+        if self._thread is None:
+            with self._start_lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._loop, name="llm-micro-batcher", daemon=True)
+                    self._thread.start()
+
+    def submit(self, prompt):
+        """Queue a prompt and return a concurrent.futures.Future for its output."""
+        self._ensure_started()
+        future = Future()
+        self._queue.put((prompt, future))
+        return future
+
+    def _loop(self):
+        while True:
+            batch = [self._queue.get()]  # Block until there is work
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            prompts = [prompt for prompt, _ in batch]
+            try:
+                outputs = self.run_batch(prompts)
+            except Exception as e:
+                logger.exception("Batched generation failed")
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+
+            self.batches += 1
+            self.items += len(batch)
+            for (_, future), output in zip(batch, outputs):
+                future.set_result(output)
+
+    def stats(self):
+        return {
+            "batches": self.batches,
+            "items": self.items,
+            "avg_batch_size": self.items / self.batches if self.batches else 0.0,
+            "queued": self._queue.qsize(),
+        }
+
+
+class BatchingBackend(LLMBackend):
+    """Base for in-process engines: single prompts are funnelled through a MicroBatcher."""
+
+    def __init__(self, max_batch_size=8, max_wait_ms=5.0):
+        self.batcher = MicroBatcher(self.generate_batch, max_batch_size, max_wait_ms)
+
+    def generate(self, prompt):
+        return self.batcher.submit(prompt).result()
+
+    async def agenerate(self, prompt):
+        return await asyncio.wrap_future(self.batcher.submit(prompt))
+
+
+class LocalModelBackend(BatchingBackend):
+    """
+    Runs a seq2seq model (flan-t5 by default) in process with transformers.
+
+    The model is loaded on warm_up() or on the first request.
+    """
+
+    name = "local"
+
+    def __init__(self, model_name="google/flan-t5-large", device=None, max_new_tokens=128, **batch_options):
+        super().__init__(**batch_options)
+        self.model_name = model_name
+        self.device = device
+        self.max_new_tokens = max_new_tokens
+        self._model = None
+        self._tokenizer = None
+        self._load_lock = threading.Lock()
+
+    def _load(self):
+        with self._load_lock:
+            if self._model is None:
+                from transformers import AutoModelForSeq2SeqLM, AutoTokenizer
+
+                start = time.monotonic()
+                self._tokenizer = AutoTokenizer.from_pretrained(self.model_name)
+                model = AutoModelForSeq2SeqLM.from_pretrained(self.model_name)
+                if self.device:
+                    model = model.to(self.device)
+                model.eval()
+                self._model = model
+                logger.info("Loaded %s in %.1fs", self.model_name, time.monotonic() - start)
+
+    def generate_batch(self, prompts):
+        if self._model is None:
+            self._load()
+        import torch
+
+        inputs = self._tokenizer(prompts, return_tensors="pt", padding=True, truncation=True)
+        if self.device:
+            inputs = inputs.to(self.device)
+        with torch.no_grad():
+            outputs = self._model.generate(**inputs, max_new_tokens=self.max_new_tokens)
+        return self._tokenizer.batch_decode(outputs, skip_special_tokens=True)
+
+    def warm_up(self):
+        self._load()
+        self.generate_batch(["SQL: SELECT 1"])
+
+
+class StubBackend(BatchingBackend):
+    """
+    Deterministic offline stand-in: selects everything from the first schema
+    table named in the question (or the first table in the schema).
+    """
+
+    name = "stub"
+
+    TABLE_RE = re.compile(r"Table '([^']+)'")
+
+    def __init__(self, latency_ms=0.0, **batch_options):
+        super().__init__(**batch_options)
+        self.latency = latency_ms / 1000.0
+
+    def _answer(self, prompt):
+        tables = self.TABLE_RE.findall(prompt)
+        question = prompt.rsplit("User Query:", 1)[-1].lower()
+        for table in tables:
+            singular = table[:-1] if table.endswith("s") else table
+            if table.lower() in question or singular.lower() in question:
+                return f"SELECT * FROM {table}"
+        return f"SELECT * FROM {tables[0]}" if tables else "Error: No tables in prompt"
+
+    def generate_batch(self, prompts):
+        if self.latency:
+            time.sleep(self.latency)  # Once per batch, like a real batched forward pass
+        return [self._answer(prompt) for prompt in prompts]
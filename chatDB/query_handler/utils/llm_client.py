@@ -0,0 +1,415 @@
+import asyncio
+import logging
+import random
+import threading
+import time
+import weakref
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import requests
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from requests.adapters import HTTPAdapter
+
+from .tracing import current_span, span
+
+logger = logging.getLogger(__name__)
+
+RETRYABLE_STATUS = {408, 429, 500, 502, 503, 504}
+
+
+class LLMError(Exception):
+    """Base class for failures talking to the model provider."""
+
+    http_status = 502  # What the API reports to its own clients
+    retryable = False
+
+
+class LLMTimeout(LLMError):
+    http_status = 504
+    retryable = True
+
+
+class LLMConnectionError(LLMError):
+    retryable = True
+
+
+class LLMHTTPError(LLMError):
+    def __init__(self, status_code, message, retry_after=None):
+        super().__init__(f"Model provider returned HTTP {status_code}: {message}")
+        self.status_code = status_code
+        self.retry_after = retry_after
+        self.retryable = status_code in RETRYABLE_STATUS
+
+
+class LLMResponseError(LLMError):
+    """The provider answered, but not in the expected format."""
+
+
+class LLMNotConfigured(LLMError, ImproperlyConfigured):
+    """The selected backend is missing required settings, e.g. HUGGINGFACE_API_TOKEN."""
+
+    http_status = 503
+
+
+class LLMUnavailable(LLMError):
+    """The circuit breaker is open: recent calls failed, so this one isn't attempted."""
+
+    http_status = 503
+
+    def __init__(self, message, retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """
+    Opens after `failure_threshold` consecutive failures, rejecting calls for
+    `reset_timeout` seconds; then lets one trial call through (half-open) and
+    closes again if it succeeds.
+    """
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at = None
+        self._trial_in_flight = False
+        self.opened = 0
+        self.rejected = 0
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._state()
+
+    def _state(self):
+        if self._opened_at is None:
+            return "closed"
+        if time.monotonic() - self._opened_at >= self.reset_timeout:
+            return "half_open"
+        return "open"
+
+    def before_call(self):
+        """Raise LLMUnavailable unless a call may go out now."""
+        with self._lock:
+            state = self._state()
+            if state == "closed":
+                return
+            if state == "half_open" and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return
+            self.rejected += 1
+            retry_after = max(0.0, self.reset_timeout - (time.monotonic() - self._opened_at))
+        raise LLMUnavailable("Model provider is failing; not calling it for now.", retry_after=retry_after)
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            trial_failed = self._trial_in_flight
+            self._trial_in_flight = False
+            if trial_failed or (self._opened_at is None and self._failures >= self.failure_threshold):
+                if self._opened_at is None or trial_failed:
+                    self.opened += 1
+                self._opened_at = time.monotonic()
+                logger.warning("LLM circuit breaker opened after %d consecutive failures", self._failures)
+
+    def stats(self):
+        with self._lock:
+            state = self._state()
+            return {
+                "state": state,
+                "open": int(state == "open"),
+                "consecutive_failures": self._failures,
+                "opened": self.opened,
+                "rejected": self.rejected,
+            }
+
+
+class LatencyTracker:
+    """Rolling window of successful call latencies, for choosing the hedging delay."""
+
+    def __init__(self, samples=512):
+        self._samples = deque(maxlen=samples)
+        self._lock = threading.Lock()
+
+    def record(self, seconds):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, p, min_samples=1):
+        with self._lock:
+            if len(self._samples) < min_samples:
+                return None
+            ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(p * len(ordered)))]
+
+
+def parse_generated_text(result):
+    if isinstance(result, list) and result and isinstance(result[0], dict) and "generated_text" in result[0]:
+        return result[0]["generated_text"]
+    raise LLMResponseError(f"Unexpected API response format: {str(result)[:200]}")
+
+
+def _retry_after(headers):
+    try:
+        return float(headers.get("Retry-After"))
+    except (TypeError, ValueError):
+        return None
+
+
+class LLMClient:
+    """
+    Client for the hosted inference API.
+
+    - One requests.Session (sync) and one httpx.AsyncClient per event loop
+      (async), so connections are kept alive instead of re-established per call.
+    - Retryable failures (timeouts, connection errors, 408/429/5xx) back off
+      exponentially with full jitter, honouring Retry-After.
+    - A circuit breaker fails fast with LLMUnavailable while the provider is down.
+    - With `hedge` on, a second identical request goes out if the first hasn't
+      answered within the observed p95 latency; the first answer wins.
+
+    Every failure is raised as an LLMError subclass.
+    """
+
+    def __init__(self, url, token=None, timeout=10.0, max_retries=3, backoff_base=0.5, backoff_max=8.0,
+                 breaker_failures=5, breaker_reset=30.0, hedge=False, hedge_percentile=0.95,
+                 hedge_min_samples=20, pool_size=20):
+        self.url = url
+        self.headers = {"Authorization": f"Bearer {token}"} if token else {}
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.hedge = hedge
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_samples = hedge_min_samples
+        self.pool_size = pool_size
+        self.breaker = CircuitBreaker(breaker_failures, breaker_reset)
+        self.latencies = LatencyTracker()
+
+        self.session = requests.Session()
+        self.session.headers.update(self.headers)
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self._hedge_executor = ThreadPoolExecutor(max_workers=pool_size, thread_name_prefix="llm-hedge") \
+            if hedge else None
+        self._async_clients = weakref.WeakKeyDictionary()  # event loop -> httpx.AsyncClient
+
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.retries = 0
+        self.failures = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+
+    def _count(self, name, amount=1):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + amount)
+
+    def backoff(self, attempt, error):
+        """Seconds to wait before retry number `attempt` (0-based)."""
+        retry_after = getattr(error, "retry_after", None)
+        if retry_after is not None:
+            return min(retry_after, self.backoff_max)
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    def _hedge_delay(self):
+        if not self.hedge:
+            return None
+        return self.latencies.percentile(self.hedge_percentile, self.hedge_min_samples)
+
+    # Sync path
+
+    def _post(self, prompt):
+        start = time.perf_counter()
+        try:
+            response = self.session.post(self.url, json={"inputs": prompt}, timeout=self.timeout)
+        except requests.Timeout as e:
+            raise LLMTimeout(f"Model provider timed out after {self.timeout}s") from e
+        except requests.RequestException as e:
+            raise LLMConnectionError(f"Could not reach the model provider: {e}") from e
+        if response.status_code >= 400:
+            raise LLMHTTPError(response.status_code, response.text[:200], _retry_after(response.headers))
+        try:
+            text = parse_generated_text(response.json())
+        except ValueError as e:
+            raise LLMResponseError("Model provider returned invalid JSON.") from e
+        self.latencies.record(time.perf_counter() - start)
+        return text
+
+    def _post_hedged(self, prompt):
+        delay = self._hedge_delay()
+        if delay is None:
+            return self._post(prompt)
+        first = self._hedge_executor.submit(self._post, prompt)
+        done, _ = wait([first], timeout=delay)
+        if done:
+            return first.result()
+
+        self._count("hedges")
+        second = self._hedge_executor.submit(self._post, prompt)
+        pending = {first, second}
+        error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    if future is second:
+                        self._count("hedge_wins")
+                    return future.result()
+                error = future.exception()
+        raise error
+
+    def generate(self, prompt):
+        self._count("calls")
+        for attempt in range(self.max_retries):
+            self.breaker.before_call()
+            try:
+                text = self._post_hedged(prompt)
+            except LLMError as e:
+                self.breaker.record_failure()
+                logger.error(f"Error calling model provider (attempt {attempt + 1}/{self.max_retries}): {e}")
+                if not e.retryable or attempt + 1 >= self.max_retries:
+                    self._count("failures")
+                    raise
+                self._count("retries")
+                current_span().add("retries")
+                with span("llm_retry_sleep"):
+                    time.sleep(self.backoff(attempt, e))
+                continue
+            self.breaker.record_success()
+            return text
+        raise LLMError("No attempts were made.")  # Only reachable with max_retries < 1
+
+    # Async path
+
+    def _async_client(self):
+        import httpx  # Only async views need it; imported on first use to keep startup light
+
+        loop = asyncio.get_running_loop()
+        client = self._async_clients.get(loop)
+        if client is None or client.is_closed:
+            client = httpx.AsyncClient(
+                headers=self.headers,
+                timeout=self.timeout,
+                limits=httpx.Limits(max_connections=self.pool_size * 5, max_keepalive_connections=self.pool_size),
+            )
+            self._async_clients[loop] = client
+        return client
+
+    async def _apost(self, prompt):
+        import httpx
+
+        start = time.perf_counter()
+        try:
+            response = await self._async_client().post(self.url, json={"inputs": prompt})
+        except httpx.TimeoutException as e:
+            raise LLMTimeout(f"Model provider timed out after {self.timeout}s") from e
+        except httpx.HTTPError as e:
+            raise LLMConnectionError(f"Could not reach the model provider: {e}") from e
+        if response.status_code >= 400:
+            raise LLMHTTPError(response.status_code, response.text[:200], _retry_after(response.headers))
+        try:
+            text = parse_generated_text(response.json())
+        except ValueError as e:
+            raise LLMResponseError("Model provider returned invalid JSON.") from e
+        self.latencies.record(time.perf_counter() - start)
+        return text
+
+    async def _apost_hedged(self, prompt):
+        delay = self._hedge_delay()
+        if delay is None:
+            return await self._apost(prompt)
+        first = asyncio.ensure_future(self._apost(prompt))
+        done, _ = await asyncio.wait([first], timeout=delay)
+        if done:
+            return first.result()
+
+        self._count("hedges")
+        second = asyncio.ensure_future(self._apost(prompt))
+        pending = {first, second}
+        error = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is second:
+                            self._count("hedge_wins")
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def agenerate(self, prompt):
+        self._count("calls")
+        for attempt in range(self.max_retries):
+            self.breaker.before_call()
+            try:
+                text = await self._apost_hedged(prompt)
+            except LLMError as e:
+                self.breaker.record_failure()
+                logger.error(f"Error calling model provider (attempt {attempt + 1}/{self.max_retries}): {e}")
+                if not e.retryable or attempt + 1 >= self.max_retries:
+                    self._count("failures")
+                    raise
+                self._count("retries")
+                current_span().add("retries")
+                with span("llm_retry_sleep"):
+                    await asyncio.sleep(self.backoff(attempt, e))
+                continue
+            self.breaker.record_success()
+            return text
+        raise LLMError("No attempts were made.")
+
+    def close(self):
+        self.session.close()
+        if self._hedge_executor:
+            self._hedge_executor.shutdown(wait=False)
+
+    def stats(self):
+        p50 = self.latencies.percentile(0.50)
+        p95 = self.latencies.percentile(0.95)
+        with self._lock:
+            counters = {
+                "calls": self.calls,
+                "retries": self.retries,
+                "failures": self.failures,
+                "hedges": self.hedges,
+                "hedge_wins": self.hedge_wins,
+            }
+        return {
+            **counters,
+            "latency_ms_p50": p50 * 1000 if p50 is not None else None,
+            "latency_ms_p95": p95 * 1000 if p95 is not None else None,
+            "breaker": self.breaker.stats(),
+        }
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_llm_client():
+    """Return the process-wide client for settings.HUGGINGFACE_API_URL, configured by settings.LLM_CLIENT."""
+    global _client
+    with _client_lock:
+        if _client is None or _client.url != settings.HUGGINGFACE_API_URL:
+            if _client is not None:
+                _client.close()
+            _client = LLMClient(settings.HUGGINGFACE_API_URL, getattr(settings, "HUGGINGFACE_API_TOKEN", None),
+                                **getattr(settings, "LLM_CLIENT", {}))
+        return _client
@@ -1,51 +1,37 @@
-import requests
-import os
 import logging
 import json
-from dotenv import load_dotenv
-import time
 import re
+import sqlparse
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import DatabaseError
+from .schema_registry import format_schema, get_schema_registry
+from .translation_cache import TranslationCache, normalize_question
+from .sql_validation import SQLValidationError, parse_sql
+from .schema_retrieval import get_schema_index, schema_for_question
+from .datasources import DEFAULT_DATASOURCE
+from .example_store import fallback_example, format_example, get_example_store
+from .llm_backends import HuggingFaceAPIBackend, LocalModelBackend, StubBackend
+from .llm_client import LLMError, LLMNotConfigured, get_llm_client
+from .tracing import span
+from .single_flight import get_single_flight
+from .admission import AdmissionRejected, acharge, charge
 logger = logging.getLogger(__name__)
 
-load_dotenv()  # Load environment variables from a .env file
+_backend = None
+_translation_cache = None
+_warmed_versions = set()  # Schema versions the cache has been seeded from history for
 
-# Hugging Face API details
-API_URL = "https://api-inference.huggingface.co/models/google/flan-t5-large"
-# API_URL = "https://api-inference.huggingface.co/models/meta-llama/Llama-3.2-1B"
-# API_URL = "https://api-inference.huggingface.co/models/codellama/CodeLlama-7b-hf"
-# API_URL = "https://api.deepseek.com/v1/query"
-API_TOKEN = os.getenv("HUGGINGFACE_API_TOKEN") # Get the token from the environment
-
-if not API_TOKEN:
-    raise ValueError("HUGGINGFACE_API_TOKEN is not set in the environment.")
-
-
-headers = {
-    "Authorization": f"Bearer {API_TOKEN}"
-}
 
 # Function to call HF API
-def call_huggingface_api(prompt, max_retries=3):
-    payload = {"inputs": prompt}
-    
-    for attempt in range(max_retries):
-        try:
-            response = requests.post(API_URL, headers=headers, json=payload, timeout=10)
-            response.raise_for_status()
-            result = response.json()
-            print(f"API Response: {result}")  # <== Debug print
-            
-            if isinstance(result, list) and "generated_text" in result[0]:
-                return result[0]["generated_text"]
-            else:
-                logger.error(f"Unexpected API response format: {result}")
-                return "Error: Unexpected API response format"
-        except requests.exceptions.RequestException as e:
-            logger.error(f"Error calling Hugging Face API (attempt {attempt+1}/{max_retries}): {e}")
-            time.sleep(2)
+def call_huggingface_api(prompt):
+    """Return the model's generated text; raises an LLMError subclass on failure."""
+    return get_llm_client().generate(prompt)
 
-    return "Error: Failed to process query after multiple attempts."
 
+async def acall_huggingface_api(prompt):
+    """Async counterpart of call_huggingface_api; retries sleep without blocking the loop."""
+    return await get_llm_client().agenerate(prompt)
 
 
 def load_schema(schema_file="db_schema.json"):
@@ -64,58 +50,315 @@ def load_schema(schema_file="db_schema.json"):
         return None
 
 
-def format_schema(schema):
+STATEMENT_START_RE = re.compile(r"\b(SELECT|SHOW)\s", re.IGNORECASE)
+CTE_START_RE = re.compile(r"\bWITH\s+(RECURSIVE\s+)?\w+\s*(\([^()]*\)\s*)?AS\s*\(", re.IGNORECASE)
+
+
+def extract_sql(response):
+    """Return the first SQL statement in the model's response."""
+    # WITH only starts the statement when it opens a CTE, not in prose such as "a query with a join"
+    matches = [m for m in (CTE_START_RE.search(response), STATEMENT_START_RE.search(response)) if m]
+    sql_match = min(matches, key=lambda m: m.start()) if matches else None
+    if not sql_match:
+        return "Error: Failed to extract SQL"
+    # Stop at the end of the statement, or at the first blank line of any trailing prose
+    text = re.split(r"\n\s*\n", response[sql_match.start():], maxsplit=1)[0]
+    statements = sqlparse.split(text)
+    return statements[0].strip() if statements else "Error: Failed to extract SQL"
+
+
+def get_backend():
     """
-    Format the schema into a human-readable string for the prompt.
+    Return the SQL generation backend selected by settings.LLM_BACKEND
+    ("huggingface", "local" or "stub").
     """
-    if not schema:
-        return "No schema information available."
+    global _backend
+    if _backend is None:
+        name = getattr(settings, "LLM_BACKEND", "huggingface")
+        options = getattr(settings, "LLM_BACKEND_OPTIONS", {}).get(name, {})
+        if name == "huggingface":
+            if not getattr(settings, "HUGGINGFACE_API_TOKEN", None):
+                # An LLMError, so requests get a 503 like other provider failures; also ImproperlyConfigured
+                raise LLMNotConfigured("HUGGINGFACE_API_TOKEN is not set in the environment.")
+            _backend = HuggingFaceAPIBackend(call_huggingface_api, acall_huggingface_api, **options)
+        elif name == "local":
+            _backend = LocalModelBackend(**options)
+        elif name == "stub":
+            _backend = StubBackend(**options)
+        else:
+            raise ValueError(f"Unknown LLM_BACKEND '{name}'.")
+    return _backend
 
-    schema_details = []
-    for table, columns in schema.items():
-        column_names = [col["Field"] for col in columns]
-        schema_details.append(f"Table '{table}': Columns ({', '.join(column_names)})")
-    return "\n".join(schema_details)
 
-def extract_sql(response):
-    sql_match = re.search(r"(SELECT|SHOW)\s.*", response, re.IGNORECASE)
-    return sql_match.group(0) if sql_match else "Error: Failed to extract SQL"
+def get_translation_cache():
+    """Return the process-wide translation cache, configured from settings.TRANSLATION_CACHE."""
+    global _translation_cache
+    if _translation_cache is None:
+        _translation_cache = TranslationCache(**getattr(settings, "TRANSLATION_CACHE", {}))
+    return _translation_cache
 
 
-def process_query(user_query, schema_file="db_schema.json"):
-    schema = load_schema(schema_file)
-    if not schema:
-        print("Schema loading failed!")
-        return {"user_query": user_query, "structured_query": None, "error": "Database schema not loaded."}
+def warm_up(llm=True, schema=True, schema_file=None):
+    """
+    Do the one-off work the first request would otherwise wait for, from
+    AppConfig.ready(): load the backend (and open the provider client), and
+    parse the schema and build its prompt index (importing numpy). Nothing
+    here touches the application database.
+    """
+    if llm:
+        get_backend().warm_up()
+        if getattr(settings, "LLM_BACKEND", "huggingface") == "huggingface":
+            get_llm_client()
+    if schema:
+        snapshot = get_schema_registry(schema_file or settings.SCHEMA_FILE).get()
+        if snapshot.schema:
+            get_schema_index(snapshot)
+            get_example_store().vectorizer.vector("")
+        else:
+            logger.warning("Schema warm-up: no schema loaded from '%s'", schema_file or settings.SCHEMA_FILE)
+
+
+def warm_translation_cache(snapshot, limit=1000):
+    """
+    Seed the cache from past UserQuery rows whose SQL still validates against the current schema.
+    """
+    from ..models import UserQuery  # Imported lazily: apps must be loaded first
 
-    formatted_schema = format_schema(schema)
-    print(f"Formatted Schema:\n{formatted_schema}")  # Debug print
+    cache = get_translation_cache()
+    rows = (UserQuery.objects.exclude(generated_query__isnull=True).exclude(generated_query="")
+            .order_by("-timestamp").values_list("query", "generated_query")[:limit])
+    seeded = 0
+    for question, sql_query in reversed(rows):  # Oldest first so the newest end up most recent
+        if validate_sql(sql_query, snapshot.schema) is None:
+            cache.put(question, snapshot.version, sql_query)
+            seeded += 1
+    logger.info("Seeded translation cache with %d past queries", seeded)
 
-    prompt = (
+
+def build_prompt(user_query, formatted_schema, examples=()):
+    """`examples` are (question, sql) pairs shown before the question, see utils/example_store.py."""
+    shots = "".join(format_example(question, sql) for question, sql in examples)
+    return (
         f"You are a MySQL query generator. Based on the given schema, generate a valid SQL query.\n"
         f"Schema:\n{formatted_schema}\n\n"
-        f"Example:\n"
-        f"User Query: Show all users who registered last month.\n"
-        f"SQL: SELECT * FROM users WHERE registration_date >= DATE_SUB(CURDATE(), INTERVAL 1 MONTH);\n\n"
+        f"{'Examples' if len(examples) > 1 else 'Example'}:\n{shots}"
         f"User Query: {user_query}\nSQL:"
     )
 
 
-    structured_query = call_huggingface_api(prompt)
-    print(f"Raw AI Response: {structured_query}")  # Debug print
+def check_sql(sql_query, schema, database=None):
+    """
+    Parse generated SQL and resolve it against the schema.
+
+    Returns a ValidatedSQL; raises SQLValidationError for anything that isn't a
+    single read-only query over known tables and columns of `database`.
+    """
+    if not sql_query or sql_query.lower().startswith("error:"):
+        raise SQLValidationError("Failed to generate a valid SQL query.")
+    return parse_sql(sql_query, schema, database)
+
+
+def validate_sql(sql_query, schema):
+    """Return an error message if the generated SQL can't be run, otherwise None."""
+    try:
+        check_sql(sql_query, schema)
+    except SQLValidationError as e:
+        return str(e)
+    return None
+
+
+def _translation_result(user_query, validated, **extra):
+    return {
+        "user_query": user_query,
+        "structured_query": validated.sql,
+        "normalized_query": validated.normalized,
+        "fingerprint": validated.fingerprint,
+        "tables": sorted(validated.tables),
+        **extra,
+    }
+
+
+def _lookup_cached(user_query, snapshot, database=None):
+    """
+    Return a finished result if the question can be answered without the model, otherwise None.
+    """
+    if not snapshot.schema:
+        logger.warning("Schema loading failed!")
+        return {"user_query": user_query, "structured_query": None, "error": "Database schema not loaded."}
+
+    # Repeated or trivially reworded questions skip the model entirely
+    with span("translation_cache") as stage:
+        cached_query = get_translation_cache().get(user_query, snapshot.version)
+        stage.set("hit", bool(cached_query))
+    if cached_query:
+        try:
+            return _translation_result(user_query, check_sql(cached_query, snapshot.schema, database), cached=True)
+        except SQLValidationError:
+            pass  # Seeded before validation got stricter; ask the model again
+    return None
+
+
+def _finish_translation(user_query, snapshot, structured_query, with_examples=False, database=None):
+    logger.debug("Raw AI Response: %s", structured_query)
 
     sql_query = extract_sql(structured_query)
-    print(f"Extracted SQL Query: {sql_query}")  # Debug print
+    logger.debug("Extracted SQL Query: %s", sql_query)
+
+    try:
+        with span("sql_validation"):
+            validated = check_sql(sql_query, snapshot.schema, database)
+    except SQLValidationError as e:
+        get_example_store().record_generation(False, with_examples)
+        return {"user_query": user_query, "structured_query": None, "error": str(e)}
+
+    get_example_store().record_generation(True, with_examples)
+
+    get_translation_cache().put(user_query, snapshot.version, validated.sql)
+    return _translation_result(user_query, validated)
+
+
+def _warm_once(snapshot):
+    if snapshot.schema and snapshot.version not in _warmed_versions:
+        _warmed_versions.add(snapshot.version)
+        try:
+            warm_translation_cache(snapshot)
+        except DatabaseError as e:
+            logger.error(f"Could not seed translation cache from history: {e}")
+
+
+def _prompt_for(user_query, snapshot, datasource):
+    """Return the prompt and whether it carries examples from the datasource's query history."""
+    with span("prompt_build") as stage:
+        examples = get_example_store().examples_for(snapshot, user_query, datasource)
+        stage.set("examples", len(examples))
+        fallback = None if examples else fallback_example(snapshot, user_query)
+        prompt = build_prompt(user_query, schema_for_question(snapshot, user_query),
+                              examples or ([fallback] if fallback else []))
+        stage.set("prompt_chars", len(prompt))
+        stage.set("prompt_tokens_est", len(prompt) // 4)  # ~4 characters per token
+    return prompt, bool(examples)
+
+
+def _refresh_examples():
+    store = get_example_store()
+    if store.due():
+        try:
+            store.refresh()
+        except DatabaseError as e:
+            logger.error(f"Could not load few-shot examples from history: {e}")
+
+
+def _llm_failure(user_query, error):
+    """
+    Result for a question the model could not be asked, or that its client
+    has no LLM budget left for; `error_status` is the HTTP status to report.
+    """
+    return {
+        "user_query": user_query,
+        "structured_query": None,
+        "error": str(error),
+        "error_status": error.http_status,
+        "retry_after": getattr(error, "retry_after", None),
+    }
 
-    if not sql_query or sql_query.lower() == "error: unexpected api response format":
-        return {"user_query": user_query, "structured_query": None, "error": "Failed to generate a valid SQL query."}
 
-    if not sql_query.lower().startswith(("select", "show")):
-        return {"user_query": user_query, "structured_query": None, "error": "Invalid query type generated."}
+def _flight_key(user_query, snapshot, datasource):
+    # Per datasource: the prompt carries that datasource's own examples
+    return datasource, snapshot.version, normalize_question(user_query)
 
-    for table in schema.keys():
-        if table.lower() in sql_query.lower():
-            return {"user_query": user_query, "structured_query": sql_query}
 
-    return {"user_query": user_query, "structured_query": None, "error": "Generated query references unknown table."}
+def process_query(user_query, schema_file="db_schema.json", datasource=DEFAULT_DATASOURCE, database=None):
+    with span("schema_load") as stage:
+        snapshot = get_schema_registry(schema_file).get()  # Parsed and formatted once, reloaded on change
+        stage.set("schema_version", snapshot.version)
+    _warm_once(snapshot)
 
+    result = _lookup_cached(user_query, snapshot, database)
+    if result:
+        return result
+
+    def translate():
+        _refresh_examples()
+        prompt, with_examples = _prompt_for(user_query, snapshot, datasource)
+        with span("llm_call") as stage:
+            structured_query = get_backend().generate(prompt)
+            stage.set("response_chars", len(structured_query or ""))
+        return _finish_translation(user_query, snapshot, structured_query, with_examples, database)
+
+    # Identical questions arriving while this one is with the model wait for its answer
+    try:
+        charge("llm")
+        result = get_single_flight("translation").do(_flight_key(user_query, snapshot, datasource), translate)
+    except (LLMError, AdmissionRejected) as e:
+        return _llm_failure(user_query, e)
+    return {**result, "user_query": user_query}
+
+
+def process_queries(user_queries, schema_file="db_schema.json", datasource=DEFAULT_DATASOURCE, database=None):
+    """
+    Batch counterpart of process_query. Questions the translation cache can't
+    answer go to the backend in a single generate_batch() call, each distinct
+    question once. Returns one result per question, in order.
+    """
+    with span("schema_load") as stage:
+        snapshot = get_schema_registry(schema_file).get()
+        stage.set("schema_version", snapshot.version)
+    _warm_once(snapshot)
+
+    results = [_lookup_cached(user_query, snapshot, database) for user_query in user_queries]
+    misses = {}  # flight key -> indexes of the questions it answers
+    for index, result in enumerate(results):
+        if result is None:
+            misses.setdefault(_flight_key(user_queries[index], snapshot, datasource), []).append(index)
+    if not misses:
+        return results
+
+    groups = list(misses.values())
+    _refresh_examples()
+    prompts, with_examples = zip(*(_prompt_for(user_queries[indexes[0]], snapshot, datasource)
+                                   for indexes in groups))
+    try:
+        charge("llm", cost=len(groups))  # One LLM call per distinct question, as for process_query
+        with span("llm_call") as stage:
+            responses = get_backend().generate_batch(list(prompts))
+            stage.set("batch_size", len(prompts))
+    except (LLMError, AdmissionRejected) as e:
+        for indexes in groups:
+            for index in indexes:
+                results[index] = _llm_failure(user_queries[index], e)
+        return results
+
+    for indexes, response, examples_used in zip(groups, responses, with_examples):
+        result = _finish_translation(user_queries[indexes[0]], snapshot, response, examples_used, database)
+        for index in indexes:
+            results[index] = {**result, "user_query": user_queries[index]}
+    return results
+
+
+async def aprocess_query(user_query, schema_file="db_schema.json", datasource=DEFAULT_DATASOURCE, database=None):
+    """Async counterpart of process_query."""
+    with span("schema_load") as stage:
+        snapshot = get_schema_registry(schema_file).get()
+        stage.set("schema_version", snapshot.version)
+    if snapshot.schema and snapshot.version not in _warmed_versions:
+        await sync_to_async(_warm_once)(snapshot)
+
+    result = _lookup_cached(user_query, snapshot, database)
+    if result:
+        return result
+
+    async def translate():
+        if get_example_store().due():
+            await sync_to_async(_refresh_examples)()
+        prompt, with_examples = _prompt_for(user_query, snapshot, datasource)
+        with span("llm_call") as stage:
+            structured_query = await get_backend().agenerate(prompt)
+            stage.set("response_chars", len(structured_query or ""))
+        return _finish_translation(user_query, snapshot, structured_query, with_examples, database)
+
+    try:
+        await acharge("llm")
+        result = await get_single_flight("translation").ado(_flight_key(user_query, snapshot, datasource), translate)
+    except (LLMError, AdmissionRejected) as e:
+        return _llm_failure(user_query, e)
+    return {**result, "user_query": user_query}
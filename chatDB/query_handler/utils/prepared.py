@@ -0,0 +1,236 @@
+import hashlib
+import logging
+import threading
+import weakref
+from collections import OrderedDict
+from decimal import Decimal
+
+import sqlparse
+from django.conf import settings
+from sqlparse import tokens as T
+
+from .result_format import ResultSet
+
+logger = logging.getLogger(__name__)
+
+# Clauses whose literals are values that can become parameters. Literals elsewhere stay inline:
+# in the select list they name result columns, in ORDER/GROUP BY an integer is a column position.
+PARAMETER_CLAUSES = {"where", "having", "on", "limit"}
+CLAUSE_KEYWORDS = {
+    "SELECT": "select", "FROM": "from", "WHERE": "where", "HAVING": "having", "ON": "on",
+    "GROUP BY": "order", "ORDER BY": "order", "LIMIT": "limit", "OFFSET": "limit",
+    "UNION": "select", "UNION ALL": "select",
+}
+
+
+def prepared_settings():
+    return getattr(settings, "PREPARED_STATEMENTS", {})
+
+
+class ParameterizedSQL:
+    """
+    A query with its literal values lifted out: `template` has a placeholder
+    where each value was, `params` holds the values in order, and `shape` is
+    a fingerprint shared by every query that differs only in those values.
+    """
+
+    def __init__(self, sql, template, params, normalized):
+        self.sql = sql
+        self.template = template
+        self.params = tuple(params)
+        self.normalized = normalized  # Template with '?' placeholders, whitespace collapsed, keywords upper-cased
+        self.shape = hashlib.sha1(normalized.encode()).hexdigest()[:16]
+
+
+def _literal_value(token, dialect):
+    """Python value of a string or number literal, or None if it should stay inline."""
+    if token.ttype is T.Literal.String.Single:
+        inner = token.value[1:-1]
+        if "\\" in inner:
+            return None  # MySQL backslash escapes; not worth decoding here
+        return inner.replace("''", "'")
+    if token.ttype is T.Literal.Number.Integer:
+        return int(token.value)
+    if token.ttype is T.Literal.Number.Float:
+        # Decimal keeps MySQL's exact-value semantics for literals like 2.50; SQLite can't bind it
+        return float(token.value) if dialect == "sqlite" else Decimal(token.value)
+    return None
+
+
+def parameterize(sql, dialect="mysql"):
+    """
+    Lift the literal values out of a validated SELECT so that queries of the
+    same shape share one prepared statement. Placeholders are '%s' for
+    MySQL and '?' for SQLite. Statements that keep a '%' or '?' inside an
+    inline literal come back unchanged, with no params.
+    """
+    placeholder = "?" if dialect == "sqlite" else "%s"
+    statement = sqlparse.parse(sql)[0]
+    tokens = list(statement.flatten())
+
+    template, normalized, params = [], [], []
+    clauses = [None]  # Clause per parenthesis level
+    previous = None  # Last significant token
+    pending_space = False
+    for token in tokens:
+        if token.is_whitespace or token.ttype in T.Comment:
+            template.append(token.value)  # Comments such as the guard's optimizer hint are kept as is
+            pending_space = True
+            continue
+        if pending_space and normalized:
+            normalized.append(" ")
+        pending_space = False
+
+        is_keyword = token.ttype in T.Keyword
+        word = token.normalized.upper() if is_keyword else None
+        if word in CLAUSE_KEYWORDS:
+            clauses[-1] = CLAUSE_KEYWORDS[word]
+        elif word and word.endswith("JOIN"):
+            clauses[-1] = "from"
+        elif token.match(T.Punctuation, "("):
+            clauses.append(clauses[-1])
+        elif token.match(T.Punctuation, ")") and len(clauses) > 1:
+            clauses.pop()
+
+        value = _literal_value(token, dialect) if clauses[-1] in PARAMETER_CLAUSES else None
+        if value is not None and token.value[0] in "+-" and not (
+                previous is None or previous.ttype in T.Operator or previous.ttype in T.Keyword
+                or previous.match(T.Punctuation, ("(", ","))):
+            value = None  # `a -1` is a subtraction, not a negative literal
+        if value is not None:
+            template.append(placeholder)
+            normalized.append("?")
+            params.append(value)
+        else:
+            template.append(token.value)
+            normalized.append(token.normalized if is_keyword else token.value)
+            if token.ttype in T.Literal and ("%" in token.value or "?" in token.value):
+                # The driver would read these as placeholders
+                return ParameterizedSQL(sql, sql, (), " ".join(sql.split()))
+        previous = token
+
+    if not params:
+        return ParameterizedSQL(sql, sql, (), "".join(normalized).strip())
+    return ParameterizedSQL(sql, "".join(template), params, "".join(normalized).strip())
+
+
+class StatementCache:
+    """
+    Least recently used prepared statements of one connection, keyed by
+    template. MySQL statements are server-side, one prepared cursor each;
+    closing the cursor deallocates the statement. SQLite compiles and caches
+    statements itself (see SQLiteConnection), so only the keys are tracked.
+    """
+
+    def __init__(self, connection, dialect, size=64):
+        self.connection = connection
+        self.dialect = dialect
+        self.size = size
+        self._statements = OrderedDict()  # template -> (template object, cursor or None)
+
+    def _entry(self, template):
+        entry = self._statements.get(template)
+        if entry is not None:
+            self._statements.move_to_end(template)
+            _stats.record("hits")
+            return entry
+        cursor = self.connection.cursor(prepared=True) if self.dialect == "mysql" else None
+        # MySQLCursorPrepared only reuses a statement when given the very same string object
+        entry = self._statements[template] = (template, cursor)
+        _stats.record("prepares")
+        while len(self._statements) > self.size:
+            _, (_, stale) = self._statements.popitem(last=False)
+            _stats.record("evictions")
+            if stale is not None:
+                stale.close()
+        return entry
+
+    def execute(self, prepared):
+        """Run a ParameterizedSQL; returns its rows as a ResultSet, or None if it has no result set."""
+        template, cursor = self._entry(prepared.template)
+        owned = cursor is None
+        if owned:
+            cursor = self.connection.cursor()
+        try:
+            cursor.execute(template, prepared.params)
+            return ResultSet.from_cursor(cursor)
+        except Exception:
+            if not owned:
+                self.discard(prepared.template)
+            raise
+        finally:
+            if owned:
+                cursor.close()
+
+    def discard(self, template):
+        _, cursor = self._statements.pop(template, (None, None))
+        if cursor is not None:
+            try:
+                cursor.close()
+            except Exception:
+                pass
+
+
+class _Stats:
+    """Process-wide statement cache counters and per-shape execution counts."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters = {"hits": 0, "prepares": 0, "evictions": 0}
+        self.shapes = OrderedDict()  # shape -> {"template", "executions", "total_ms"}
+
+    def record(self, name):
+        with self._lock:
+            self.counters[name] += 1
+
+    def record_shape(self, prepared, elapsed_ms):
+        max_shapes = prepared_settings().get("max_shapes", 500)
+        with self._lock:
+            entry = self.shapes.get(prepared.shape)
+            if entry is None:
+                entry = self.shapes[prepared.shape] = {"template": prepared.normalized, "executions": 0,
+                                                       "total_ms": 0.0}
+                while len(self.shapes) > max_shapes:
+                    self.shapes.popitem(last=False)
+            self.shapes.move_to_end(prepared.shape)
+            entry["executions"] += 1
+            entry["total_ms"] += elapsed_ms
+
+    def snapshot(self, top=20):
+        with self._lock:
+            counters = dict(self.counters)
+            shapes = [(shape, dict(entry)) for shape, entry in self.shapes.items()]
+        lookups = counters["hits"] + counters["prepares"]
+        shapes.sort(key=lambda item: item[1]["executions"], reverse=True)
+        return {
+            **counters,
+            "hit_rate": counters["hits"] / lookups if lookups else 0.0,
+            "shapes": len(shapes),
+            "top_shapes": [
+                {"shape": shape, **entry, "avg_ms": entry["total_ms"] / entry["executions"]}
+                for shape, entry in shapes[:top]
+            ],
+        }
+
+
+_stats = _Stats()
+_caches = weakref.WeakKeyDictionary()  # connection -> StatementCache
+_caches_lock = threading.Lock()
+
+
+def statement_cache(connection, dialect):
+    """Return the StatementCache of a pooled connection; it lives as long as the connection."""
+    with _caches_lock:
+        cache = _caches.get(connection)
+        if cache is None:
+            cache = _caches[connection] = StatementCache(connection, dialect,
+                                                         prepared_settings().get("cache_size", 64))
+        return cache
+
+
+def record_shape(prepared, elapsed_ms):
+    _stats.record_shape(prepared, elapsed_ms)
+
+
+def prepared_stats(top=20):
+    return _stats.snapshot(top)
@@ -0,0 +1,287 @@
+import hashlib
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+
+from .result_format import ResultSet
+
+logger = logging.getLogger(__name__)
+
+UPDATE_TIMES_SQL = (
+    "SELECT TABLE_NAME, UPDATE_TIME FROM information_schema.TABLES WHERE TABLE_SCHEMA = DATABASE()"
+)
+
+
+def result_key(normalized_sql, params=None, variant=None):
+    """Cache key for a normalized query, its parameters and how it was rewritten for execution."""
+    payload = json.dumps([normalized_sql, params, variant], default=str, sort_keys=True)
+    return hashlib.sha1(payload.encode()).hexdigest()
+
+
+class BaseResultCache:
+    """
+    Query result cache with per-table invalidation.
+
+    Every table has a version number that is part of each entry's key, so
+    bumping a table's version makes every result that read from it
+    unreachable. Versions are bumped explicitly through invalidate_tables(),
+    or when information_schema.TABLES.UPDATE_TIME changes.
+
+    UPDATE_TIME is only as fresh as MySQL's statistics cache; set
+    information_schema_stats_expiry = 0 on MySQL 8 for prompt invalidation,
+    and keep a TTL as a backstop.
+    """
+
+    def __init__(self, ttl=300.0, update_check_interval=5.0):
+        self.ttl = ttl
+        self.update_check_interval = update_check_interval
+        self._last_update_check = 0.0
+        self._update_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.invalidations = 0
+
+    # Subclasses provide table versions, last-seen UPDATE_TIMEs and storage
+    def table_versions(self, tables):
+        raise NotImplementedError
+
+    def invalidate_tables(self, tables):
+        raise NotImplementedError
+
+    def _seen_update_times(self):
+        raise NotImplementedError
+
+    def _set_seen_update_times(self, update_times):
+        raise NotImplementedError
+
+    def _get(self, key):
+        raise NotImplementedError
+
+    def _set(self, key, value, size, tables):
+        raise NotImplementedError
+
+    def _versioned_key(self, key, tables):
+        versions = self.table_versions(sorted(tables))
+        return f"{key}:{':'.join(str(versions[t]) for t in sorted(tables))}"
+
+    def get(self, key, tables):
+        """Return the cached result for `key`, or None."""
+        value = self._get(self._versioned_key(key, tables))
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    def set(self, key, tables, value):
+        # A ResultSet's payload is encoded once and reused by the result store and the response
+        encoded_size = len(value.payload()) if isinstance(value, ResultSet) else len(json.dumps(value, default=str))
+        if self._set(self._versioned_key(key, tables), value, encoded_size, tables):
+            self.stores += 1
+
+    def sync_update_times(self, pool):
+        """
+        Invalidate tables whose UPDATE_TIME moved since the last check, at most
+        once every `update_check_interval` seconds.
+        """
+        if pool.dialect != "mysql":
+            return  # UPDATE_TIME comes from MySQL's information_schema
+        now = time.monotonic()
+        if now - self._last_update_check < self.update_check_interval:
+            return
+        if not self._update_lock.acquire(blocking=False):
+            return  # Another thread is already checking
+        try:
+            self._last_update_check = now
+            with pool.connection() as connection:
+                cursor = connection.cursor()
+                try:
+                    cursor.execute(UPDATE_TIMES_SQL)
+                    current = {name: str(update_time) for name, update_time in cursor.fetchall()}
+                finally:
+                    cursor.close()
+            seen = self._seen_update_times()
+            changed = [t for t, update_time in current.items() if seen.get(t) not in (None, update_time)]
+            if changed:
+                self.invalidate_tables(changed)
+                logger.info("Result cache invalidated for changed tables: %s", ", ".join(changed))
+            self._set_seen_update_times(current)
+        except Exception as e:
+            logger.error(f"Could not check table UPDATE_TIMEs: {e}")
+        finally:
+            self._update_lock.release()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "stores": self.stores,
+            "invalidations": self.invalidations,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+
+class MemoryResultCache(BaseResultCache):
+    """In-process cache bounded by an approximate byte budget, evicting least recently used entries."""
+
+    def __init__(self, max_bytes=64 * 1024 * 1024, **options):
+        super().__init__(**options)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # versioned key -> (value, size, tables, expires_at)
+        self._by_table = {}  # table -> set of versioned keys, for eager removal on invalidation
+        self._versions = {}
+        self._update_times = {}
+        self.bytes = 0
+        self.evictions = 0
+
+    def table_versions(self, tables):
+        with self._lock:
+            return {t: self._versions.get(t, 0) for t in tables}
+
+    def invalidate_tables(self, tables):
+        with self._lock:
+            for table in tables:
+                self._versions[table] = self._versions.get(table, 0) + 1
+                for key in self._by_table.pop(table, ()):
+                    self._remove(key)
+                self.invalidations += 1
+
+    def _seen_update_times(self):
+        return dict(self._update_times)
+
+    def _set_seen_update_times(self, update_times):
+        self._update_times = update_times
+
+    def _remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        self.bytes -= entry[1]
+        for table in entry[2]:
+            keys = self._by_table.get(table)
+            if keys:
+                keys.discard(key)
+
+    def _get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[3] <= time.monotonic():
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def _set(self, key, value, size, tables):
+        if size > self.max_bytes:
+            return False
+        with self._lock:
+            self._remove(key)
+            self._entries[key] = (value, size, tuple(tables), time.monotonic() + self.ttl)
+            self.bytes += size
+            for table in tables:
+                self._by_table.setdefault(table, set()).add(key)
+            while self.bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+        return True
+
+    def stats(self):
+        with self._lock:
+            return {
+                **super().stats(),
+                "backend": "memory",
+                "entries": len(self._entries),
+                "bytes": self.bytes,
+                "max_bytes": self.max_bytes,
+                "evictions": self.evictions,
+            }
+
+
+class DjangoResultCache(BaseResultCache):
+    """
+    Stores results and table versions in one of Django's CACHES, so every
+    worker shares them. Eviction is left to the cache backend; entries above
+    `max_entry_bytes` are not cached.
+    """
+
+    PREFIX = "query_handler:results"
+
+    def __init__(self, cache_alias="default", max_entry_bytes=1024 * 1024, namespace=None, **options):
+        super().__init__(**options)
+        if namespace:
+            self.PREFIX = f"{self.PREFIX}:{namespace}"  # Keeps datasources' tables and entries apart
+        self.cache = caches[cache_alias]
+        self.cache_alias = cache_alias
+        self.max_entry_bytes = max_entry_bytes
+
+    def _version_key(self, table):
+        return f"{self.PREFIX}:version:{table}"
+
+    def table_versions(self, tables):
+        found = self.cache.get_many([self._version_key(t) for t in tables])
+        return {t: found.get(self._version_key(t), 0) for t in tables}
+
+    def invalidate_tables(self, tables):
+        for table in tables:
+            key = self._version_key(table)
+            self.cache.add(key, 0, timeout=None)
+            try:
+                self.cache.incr(key)
+            except ValueError:  # Evicted between add() and incr()
+                self.cache.set(key, 1, timeout=None)
+            self.invalidations += 1
+
+    def _seen_update_times(self):
+        return self.cache.get(f"{self.PREFIX}:update_times") or {}
+
+    def _set_seen_update_times(self, update_times):
+        self.cache.set(f"{self.PREFIX}:update_times", update_times, timeout=None)
+
+    def _get(self, key):
+        return self.cache.get(f"{self.PREFIX}:entry:{key}")
+
+    def _set(self, key, value, size, tables):
+        if size > self.max_entry_bytes:
+            return False
+        self.cache.set(f"{self.PREFIX}:entry:{key}", value, timeout=self.ttl)
+        return True
+
+    def stats(self):
+        return {**super().stats(), "backend": f"django:{self.cache_alias}"}
+
+
+_result_cache = None
+
+
+def create_result_cache(namespace=None):
+    """
+    Build a result cache configured by settings.RESULT_CACHE. `namespace`
+    separates the entries of caches that share a Django cache backend.
+    """
+    options = dict(getattr(settings, "RESULT_CACHE", {}))
+    backend = options.pop("backend", "memory")
+    if backend == "django":
+        options.pop("max_bytes", None)
+        return DjangoResultCache(namespace=namespace, **options)
+    options.pop("cache_alias", None)
+    options.pop("max_entry_bytes", None)
+    return MemoryResultCache(**options)
+
+
+def get_result_cache():
+    """Return the process-wide result cache configured by settings.RESULT_CACHE."""
+    global _result_cache
+    if _result_cache is None:
+        _result_cache = create_result_cache()
+    return _result_cache
@@ -0,0 +1,137 @@
+import datetime
+import functools
+import json
+from decimal import Decimal
+
+
+class ResultSet(list):
+    """
+    Query rows as tuples, as read from a plain (non-dictionary) cursor, plus
+    their column names, which are kept once rather than in every row.
+
+    payload() is the compact JSON encoding, {"columns": [...], "rows": [[...]]}.
+    It is computed at most once and shared by the result cache, the result
+    store and the response. as_dicts() gives the list-of-row-dicts shape the
+    API returns by default.
+    """
+
+    def __init__(self, columns, rows=()):
+        super().__init__(rows)
+        self.columns = list(columns)
+        self._payload = None
+
+    @classmethod
+    def from_cursor(cls, cursor):
+        """The remaining rows of an executed cursor; None if it has no result set."""
+        if not cursor.description:
+            return None
+        return cls([col[0] for col in cursor.description], cursor.fetchall())
+
+    @classmethod
+    def from_dicts(cls, rows):
+        columns = list(rows[0]) if rows else []
+        return cls(columns, [tuple(row.get(column) for column in columns) for row in rows])
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return ResultSet(self.columns, super().__getitem__(index))
+        return super().__getitem__(index)
+
+    def __getstate__(self):
+        return {"columns": self.columns, "_payload": None}  # Pickled by the django result cache; rows go as list items
+
+    def as_dicts(self):
+        columns = self.columns
+        return [dict(zip(columns, row)) for row in self]
+
+    def columnar(self):
+        return {"columns": self.columns, "rows": self}
+
+    def payload(self):
+        if self._payload is None:
+            self._payload = encode_json(self.columnar())
+        return self._payload
+
+
+def as_result_set(results):
+    """ResultSet for row results, including lists of row dicts cached or stored before ResultSet; others as is."""
+    if isinstance(results, list) and not isinstance(results, ResultSet):
+        return ResultSet.from_dicts(results)
+    return results
+
+
+def json_default(value):
+    """Values the JSON encoders don't handle themselves, rendered as the API has always shown them."""
+    if isinstance(value, Decimal):
+        return str(value)  # Exact, like DRF's default
+    if isinstance(value, (datetime.date, datetime.time)):
+        return value.isoformat()
+    if isinstance(value, (bytes, bytearray)):
+        return value.decode("utf-8", "replace")
+    return str(value)
+
+
+@functools.lru_cache(maxsize=None)
+def _orjson():
+    try:
+        import orjson
+    except ImportError:
+        return None
+    return orjson
+
+
+def encode_json(data):
+    """
+    Compact JSON bytes, with orjson when it is installed (dates and tuples
+    natively, several times faster than the json module) and json otherwise.
+    """
+    orjson = _orjson()
+    if orjson is not None:
+        try:
+            return orjson.dumps(data, default=json_default)
+        except orjson.JSONEncodeError:
+            pass  # e.g. integers beyond 64 bits; json handles them
+    return json.dumps(data, default=json_default, separators=(",", ":"), ensure_ascii=False).encode()
+
+
+def encode_response(data, key="results"):
+    """
+    Encode a response dict whose `key` is a ResultSet, splicing in the
+    result's cached payload instead of encoding the rows again.
+    """
+    results = data[key]
+    envelope = encode_json({name: value for name, value in data.items() if name != key})
+    separator = b"," if len(envelope) > 2 else b""
+    return envelope[:-1] + separator + json.dumps(key).encode() + b":" + results.payload() + b"}"
+
+
+def encode_msgpack(data):
+    import msgpack  # Optional dependency, only for clients asking for application/x-msgpack
+
+    data = {name: value.columnar() if isinstance(value, ResultSet) else value for name, value in data.items()}
+    return msgpack.packb(data, default=json_default, use_bin_type=True)
+
+
+def encode_arrow(data, key="results"):
+    """
+    Arrow IPC stream of the ResultSet under `key`, one column per result
+    column; the rest of `data` goes into the schema metadata as JSON.
+    """
+    import pyarrow as pa  # Optional dependency, only for clients asking for Arrow
+
+    results = data.get(key)
+    arrays, names = [], []
+    if isinstance(results, ResultSet):
+        names = results.columns
+        for values in (zip(*results) if results else [[] for _ in names]):
+            values = list(values)
+            try:
+                arrays.append(pa.array(values))
+            except (pa.ArrowInvalid, pa.ArrowTypeError):  # Mixed types in one column
+                arrays.append(pa.array([None if v is None else json_default(v) for v in values], pa.string()))
+    envelope = {name: value for name, value in data.items() if name != key or not isinstance(value, ResultSet)}
+    table = pa.Table.from_arrays(arrays, names=names, metadata={b"envelope": encode_json(envelope)})
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
@@ -0,0 +1,122 @@
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import zlib
+
+from django.conf import settings
+
+from .result_format import as_result_set
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"CQR2"  # zlib-compressed ResultSet payload: {"columns": [...], "rows": [[...], ...]}
+
+
+class StoredResult:
+    """Metadata of a result written to the store; `ref` is None if it wasn't stored."""
+
+    def __init__(self, ref, result_hash, row_count, columns, stored_rows, stored_bytes):
+        self.ref = ref
+        self.result_hash = result_hash
+        self.row_count = row_count
+        self.columns = columns
+        self.stored_rows = stored_rows
+        self.stored_bytes = stored_bytes
+
+
+def store_settings():
+    return getattr(settings, "RESULT_STORE", {})
+
+
+def encode_columnar(rows):
+    """
+    Encode a ResultSet (or a list of row dicts) as its compressed compact
+    payload. Column names appear once instead of once per row, and the
+    payload is the same bytes the columnar response sends, so the rows are
+    serialized once for both.
+
+    Returns (blob, sha256 of the uncompressed payload, columns).
+    """
+    rows = as_result_set(rows)
+    payload = rows.payload()
+    level = store_settings().get("compression_level", 6)
+    return MAGIC + zlib.compress(payload, level), hashlib.sha256(payload).hexdigest(), rows.columns
+
+
+def decode_columnar(blob):
+    if not blob.startswith(MAGIC):
+        raise ValueError("Not a stored query result.")
+    payload = json.loads(zlib.decompress(blob[len(MAGIC):]))
+    columns = payload["columns"]
+    return [dict(zip(columns, values)) for values in payload["rows"]]
+
+
+def _path(ref):
+    # Shard by hash prefix so no directory grows unbounded
+    return os.path.join(str(store_settings().get("path", "query_results")), ref[:2], f"{ref}.cqr")
+
+
+def store_result(rows, row_count=None):
+    """
+    Write up to RESULT_STORE['max_rows'] rows to a content-addressed file and
+    return its StoredResult. Identical results share one file. Results whose
+    compressed size exceeds RESULT_STORE['max_bytes'] keep their metadata only.
+    """
+    options = store_settings()
+    row_count = len(rows) if row_count is None else row_count
+    max_rows = options.get("max_rows", 10_000)
+    if len(rows) > max_rows:
+        rows = rows[:max_rows]  # Otherwise keep the ResultSet itself, and its encoded payload
+    blob, result_hash, columns = encode_columnar(rows)
+    if len(blob) > options.get("max_bytes", 8 * 1024 * 1024):
+        logger.info("Result of %d rows is %d bytes compressed; storing metadata only", len(rows), len(blob))
+        return StoredResult(None, result_hash, row_count, columns, 0, 0)
+
+    path = _path(result_hash)
+    if os.path.exists(path):
+        os.utime(path)  # Fresh mtime: compaction must not delete it before the referencing row is saved
+    else:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".result-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(blob)
+            os.replace(tmp_path, path)  # Readers never see a partial file
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+    return StoredResult(result_hash, result_hash, row_count, columns, len(rows), len(blob))
+
+
+def load_result(ref):
+    """Read a stored result back into a list of row dicts; None if it has been deleted."""
+    try:
+        with open(_path(ref), "rb") as f:
+            return decode_columnar(f.read())
+    except FileNotFoundError:
+        return None
+
+
+def delete_result(ref):
+    try:
+        os.unlink(_path(ref))
+        return True
+    except FileNotFoundError:
+        return False
+
+
+def stored_refs():
+    """Yield (ref, size in bytes, modification time) for every file in the store."""
+    root = str(store_settings().get("path", "query_results"))
+    if not os.path.isdir(root):
+        return
+    for shard in os.listdir(root):
+        directory = os.path.join(root, shard)
+        if not os.path.isdir(directory):
+            continue
+        for name in os.listdir(directory):
+            if name.endswith(".cqr"):
+                stat = os.stat(os.path.join(directory, name))
+                yield name[:-4], stat.st_size, stat.st_mtime
@@ -0,0 +1,117 @@
+import json
+import logging
+
+from django.core import signing
+
+from .result_format import ResultSet
+from .sql_guard import is_read, join_limit, split_limit
+
+logger = logging.getLogger(__name__)
+
+PAGE_TOKEN_SALT = "query_handler.page"
+
+
+def stream_results(pool, query, fmt="ndjson", envelope=None, chunk_size=1000, preview_rows=100,
+                   on_complete=None):
+    """
+    Run `query` on a server-side (unbuffered) cursor and yield the rows as bytes,
+    `chunk_size` rows at a time, so memory stays flat however big the result is.
+
+    fmt="ndjson" yields `envelope` on the first line and then one JSON object per row;
+    fmt="json" yields `envelope` as a single JSON object with the rows under "results".
+    When the stream ends, on_complete(preview, row_count, error) is called with the
+    first `preview_rows` rows.
+    """
+    envelope = envelope or {}
+    preview = []
+    row_count = 0
+    error = None
+    if fmt == "json":
+        head = json.dumps(envelope, default=str)[:-1]  # Drop the closing brace
+        yield (head + (", " if envelope else "") + '"results": [').encode()
+    else:
+        yield (json.dumps(envelope, default=str) + "\n").encode()
+
+    connection = None
+    drained = False
+    try:
+        connection = pool.acquire()
+        cursor = connection.cursor()  # Unbuffered: rows stay on the server until fetched
+        cursor.execute(query)
+        columns = [col[0] for col in cursor.description or []]
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            lines = []
+            for row in rows:
+                record = dict(zip(columns, row))
+                if len(preview) < preview_rows:
+                    preview.append(record)
+                encoded = json.dumps(record, default=str)
+                if fmt == "json":
+                    lines.append(("," if row_count else "") + encoded)
+                else:
+                    lines.append(encoded + "\n")
+                row_count += 1
+            yield "".join(lines).encode()
+        drained = True
+        cursor.close()
+    except Exception as e:
+        error = str(e)
+        logger.error(f"Streaming query failed after {row_count} rows: {e}")
+    finally:
+        if connection is not None:
+            if drained:
+                pool.release(connection)
+            else:
+                # Unread rows would have to be drained before reuse; dropping the connection is cheaper
+                pool.discard(connection)
+        if on_complete:
+            on_complete(preview, row_count, error)
+
+    # The status line is already sent, so a failure is reported in the body
+    if fmt == "json":
+        tail = f', "error": {json.dumps(error)}' if error else ""
+        yield f'], "row_count": {row_count}{tail}}}'.encode()
+    elif error:
+        yield (json.dumps({"error": error, "row_count": row_count}) + "\n").encode()
+
+
+def fetch_page(pool, query, offset, page_size):
+    """
+    Fetch one page of `query` as a ResultSet, plus whether more rows follow.
+
+    The page window is applied inside the query's own LIMIT, if it has one.
+    """
+    base, row_count, base_offset = split_limit(query)
+    size = page_size + 1  # One extra row tells us whether there is a next page
+    if row_count is not None:
+        size = min(size, row_count - offset)
+        if size <= 0:
+            return ResultSet([]), False
+
+    with pool.connection() as connection:
+        cursor = connection.cursor()
+        try:
+            cursor.execute(join_limit(base, size, base_offset + offset))
+            rows = ResultSet.from_cursor(cursor)
+        finally:
+            cursor.close()
+    return rows[:page_size], len(rows) > page_size
+
+
+def make_page_token(query, offset, page_size, datasource="default"):
+    """Signed, opaque cursor for the next page, so clients can't tamper with the SQL or its database."""
+    return signing.dumps({"q": query, "o": offset, "n": page_size, "d": datasource},
+                         salt=PAGE_TOKEN_SALT, compress=True)
+
+
+def read_page_token(token, max_age=3600):
+    """Return (query, offset, page_size, datasource); raises signing.BadSignature if invalid or expired."""
+    data = signing.loads(token, salt=PAGE_TOKEN_SALT, max_age=max_age)
+    return data["q"], data["o"], data["n"], data.get("d", "default")
+
+
+def pageable(query):
+    return is_read(query)
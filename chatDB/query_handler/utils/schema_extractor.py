@@ -0,0 +1,183 @@
+import json
+import logging
+import os
+import tempfile
+
+logger = logging.getLogger(__name__)
+
+# One row per table: timestamps plus a checksum of its column definitions, so
+# both data changes (UPDATE_TIME) and DDL (CREATE_TIME / column checksum) show up.
+TABLE_STATE_SQL = """
+    SELECT t.TABLE_NAME, t.CREATE_TIME, t.UPDATE_TIME, c.COLUMN_COUNT, c.COLUMN_CHECKSUM
+    FROM information_schema.TABLES t
+    LEFT JOIN (
+        SELECT TABLE_NAME, COUNT(*) AS COLUMN_COUNT,
+               SUM(CRC32(CONCAT_WS('.', COLUMN_NAME, COLUMN_TYPE, IS_NULLABLE,
+                                   COLUMN_KEY, ORDINAL_POSITION))) AS COLUMN_CHECKSUM
+        FROM information_schema.COLUMNS
+        WHERE TABLE_SCHEMA = DATABASE()
+        GROUP BY TABLE_NAME
+    ) c ON c.TABLE_NAME = t.TABLE_NAME
+    WHERE t.TABLE_SCHEMA = DATABASE()
+"""
+
+# Columns with their foreign-key target (if any) in a single pass
+COLUMNS_SQL = """
+    SELECT c.TABLE_NAME, c.COLUMN_NAME, c.COLUMN_TYPE, c.IS_NULLABLE, c.COLUMN_KEY,
+           c.COLUMN_DEFAULT, c.EXTRA, k.REFERENCED_TABLE_NAME, k.REFERENCED_COLUMN_NAME
+    FROM information_schema.COLUMNS c
+    LEFT JOIN information_schema.KEY_COLUMN_USAGE k
+        ON k.TABLE_SCHEMA = c.TABLE_SCHEMA
+        AND k.TABLE_NAME = c.TABLE_NAME
+        AND k.COLUMN_NAME = c.COLUMN_NAME
+        AND k.REFERENCED_TABLE_NAME IS NOT NULL
+    WHERE c.TABLE_SCHEMA = DATABASE(){table_filter}
+    ORDER BY c.TABLE_NAME, c.ORDINAL_POSITION
+"""
+
+INDEXES_SQL = """
+    SELECT TABLE_NAME, INDEX_NAME, NON_UNIQUE, COLUMN_NAME
+    FROM information_schema.STATISTICS
+    WHERE TABLE_SCHEMA = DATABASE(){table_filter}
+    ORDER BY TABLE_NAME, INDEX_NAME, SEQ_IN_INDEX
+"""
+
+
+def _table_filter(tables):
+    if tables is None:
+        return "", ()
+    placeholders = ", ".join(["%s"] * len(tables))
+    return f" AND {{alias}}TABLE_NAME IN ({placeholders})", tuple(tables)
+
+
+def _as_text(value):
+    if isinstance(value, (bytes, bytearray)):
+        return value.decode()
+    return value
+
+
+def fetch_table_states(cursor):
+    """Return {table: state} used to decide which tables need re-introspection."""
+    cursor.execute(TABLE_STATE_SQL)
+    states = {}
+    for name, create_time, update_time, column_count, checksum in cursor.fetchall():
+        states[_as_text(name)] = {
+            "create_time": str(create_time) if create_time else None,
+            "update_time": str(update_time) if update_time else None,
+            "column_count": int(column_count or 0),
+            "checksum": str(checksum) if checksum is not None else None,
+        }
+    return states
+
+
+def introspect_tables(cursor, tables=None):
+    """
+    Introspect columns, keys, foreign keys and indexes of `tables` (all tables
+    if None) with two information_schema queries.
+    """
+    schema = {}
+    if tables is not None and not tables:
+        return schema
+
+    table_filter, params = _table_filter(tables)
+
+    cursor.execute(COLUMNS_SQL.format(table_filter=table_filter.format(alias="c.")), params)
+    for (table, column, column_type, nullable, key, default, extra,
+         ref_table, ref_column) in cursor.fetchall():
+        table, column = _as_text(table), _as_text(column)
+        entry = schema.setdefault(table, {"columns": [], "indexes": [], "foreign_keys": []})
+        columns = entry["columns"]
+        if columns and columns[-1]["name"] == column:
+            pass  # Same column joined to a second foreign key
+        else:
+            columns.append({
+                "name": column,
+                "type": _as_text(column_type),
+                "nullable": nullable == "YES",
+                "key": _as_text(key) or "",
+                "default": _as_text(default),
+                "extra": _as_text(extra) or "",
+            })
+        if ref_table:
+            entry["foreign_keys"].append({
+                "column": column,
+                "references_table": _as_text(ref_table),
+                "references_column": _as_text(ref_column),
+            })
+
+    cursor.execute(INDEXES_SQL.format(table_filter=table_filter.format(alias="")), params)
+    for table, index_name, non_unique, column in cursor.fetchall():
+        table = _as_text(table)
+        entry = schema.get(table)
+        if entry is None:
+            continue
+        indexes = entry["indexes"]
+        index_name = _as_text(index_name)
+        if not indexes or indexes[-1]["name"] != index_name:
+            indexes.append({"name": index_name, "unique": not int(non_unique), "columns": []})
+        indexes[-1]["columns"].append(_as_text(column))
+
+    return schema
+
+
+def load_schema_file(schema_file):
+    try:
+        with open(schema_file, "r") as file:
+            return json.load(file)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+def write_schema_file(schema, schema_file):
+    """Write the schema atomically: readers see either the old or the new file, never a partial one."""
+    directory = os.path.dirname(os.path.abspath(schema_file))
+    os.makedirs(directory, exist_ok=True)  # Per-datasource schemas live under DATASOURCE_REGISTRY['schema_dir']
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".schema-", suffix=".json")
+    try:
+        with os.fdopen(fd, "w") as f:
+            json.dump(schema, f, indent=4, default=str)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, schema_file)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def refresh_schema(connection, schema_file, full=False):
+    """
+    Bring `schema_file` up to date with the database, re-introspecting only
+    the tables whose UPDATE_TIME or DDL changed since the last refresh.
+
+    Returns the list of tables that were (re-)introspected.
+    """
+    previous = {} if full else load_schema_file(schema_file)
+    # Files written by older extractors hold bare column lists and no state
+    previous = {t: v for t, v in previous.items() if isinstance(v, dict) and "state" in v}
+
+    cursor = connection.cursor()
+    try:
+        states = fetch_table_states(cursor)
+        changed = [t for t, state in states.items()
+                   if t not in previous or previous[t]["state"] != state]
+        removed = [t for t in previous if t not in states]
+
+        if not changed and not removed:
+            return []
+
+        # Introspect everything in one go when most tables changed anyway
+        fresh = introspect_tables(cursor, None if len(changed) == len(states) else changed)
+    finally:
+        cursor.close()
+
+    schema = {}
+    for table in sorted(states):
+        entry = fresh.get(table) or previous.get(table)
+        if entry is None:
+            continue
+        entry["state"] = states[table]
+        schema[table] = entry
+
+    write_schema_file(schema, schema_file)
+    logger.info("Schema refreshed: %d table(s) introspected, %d removed", len(changed), len(removed))
+    return changed
@@ -0,0 +1,186 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Cheap fingerprint of the live schema: one row, no matter how many tables there are
+SCHEMA_CHECKSUM_SQL = (
+    "SELECT COUNT(*), COALESCE(SUM(CRC32(CONCAT_WS('.', TABLE_NAME, COLUMN_NAME, "
+    "COLUMN_TYPE, ORDINAL_POSITION))), 0) "
+    "FROM information_schema.COLUMNS WHERE TABLE_SCHEMA = DATABASE()"
+)
+
+
+def normalize_column(column):
+    """
+    Return a column as {"name", "type", ...}.
+
+    The extractor writes `name`/`type` while DESCRIBE output (and older schema
+    files) use `Field`/`Type`; both shapes are accepted.
+    """
+    if isinstance(column, str):
+        return {"name": column, "type": None}
+    normalized = {k.lower(): v for k, v in column.items()}
+    if "field" in normalized:
+        normalized["name"] = normalized.pop("field")
+    normalized.setdefault("type", None)
+    return normalized
+
+
+def table_columns(entry):
+    """
+    Return the column list of a schema entry.
+
+    Entries are either a bare column list or, as written by schema_extractor,
+    a dict with "columns", "indexes" and "foreign_keys".
+    """
+    return entry["columns"] if isinstance(entry, dict) else entry
+
+
+def normalize_schema(schema):
+    """Normalize every column of a schema into {table: [columns]}."""
+    return {table: [normalize_column(col) for col in table_columns(entry)] for table, entry in schema.items()}
+
+
+def format_schema(schema):
+    """
+    Format the schema into a human-readable string for the prompt.
+    """
+    if not schema:
+        return "No schema information available."
+
+    schema_details = []
+    for table, entry in schema.items():
+        column_names = [normalize_column(col)["name"] for col in table_columns(entry)]
+        schema_details.append(f"Table '{table}': Columns ({', '.join(column_names)})")
+    return "\n".join(schema_details)
+
+
+class SchemaSnapshot:
+    """An immutable view of the schema plus its precomputed prompt fragment."""
+
+    def __init__(self, schema):
+        self.schema = normalize_schema(schema) if schema else None
+        self.foreign_keys = {
+            table: entry.get("foreign_keys", [])
+            for table, entry in (schema or {}).items() if isinstance(entry, dict)
+        }
+        self.indexes = {
+            table: entry.get("indexes", [])
+            for table, entry in (schema or {}).items() if isinstance(entry, dict)
+        }
+        self.formatted = format_schema(self.schema)
+        # Versioned on structure only, so data-only changes don't invalidate caches
+        encoded = json.dumps([self.schema, self.foreign_keys], sort_keys=True, default=str).encode()
+        self.version = hashlib.sha1(encoded).hexdigest()[:12]
+        self.tables = {table.lower(): table for table in (self.schema or {})}
+
+
+class SchemaRegistry:
+    """
+    Keeps the parsed schema in process and reloads it only when it changes.
+
+    The schema file is stat()ed at most every `check_interval` seconds; the live
+    database is compared through SCHEMA_CHECKSUM_SQL at most every
+    `db_check_interval` seconds.
+    """
+
+    def __init__(self, schema_file, check_interval=1.0, db_check_interval=60.0):
+        self.schema_file = schema_file
+        self.check_interval = check_interval
+        self.db_check_interval = db_check_interval
+        self._lock = threading.Lock()
+        self._snapshot = None
+        self._file_stamp = None
+        self._last_file_check = 0.0
+        self._db_checksum = None
+        self._last_db_check = 0.0
+
+    def _stamp(self):
+        try:
+            stat = os.stat(self.schema_file)
+            return (stat.st_mtime_ns, stat.st_size)
+        except FileNotFoundError:
+            return None
+
+    def _load(self):
+        try:
+            with open(self.schema_file, "r") as file:
+                return json.load(file)
+        except FileNotFoundError:
+            logger.error(f"Schema file '{self.schema_file}' not found.")
+        except json.JSONDecodeError:
+            logger.error(f"Error decoding JSON from schema file '{self.schema_file}'.")
+        return None
+
+    def get(self):
+        """Return the current SchemaSnapshot, reloading the file if it changed on disk."""
+        now = time.monotonic()
+        snapshot = self._snapshot
+        if snapshot is not None and now - self._last_file_check < self.check_interval:
+            return snapshot
+
+        with self._lock:
+            self._last_file_check = now
+            stamp = self._stamp()
+            if self._snapshot is None or stamp != self._file_stamp:
+                self._snapshot = SchemaSnapshot(self._load())
+                self._file_stamp = stamp
+                logger.info("Loaded schema from %s (version %s)", self.schema_file, self._snapshot.version)
+            return self._snapshot
+
+    def invalidate(self):
+        """Force the next get() to re-read the schema file."""
+        with self._lock:
+            self._snapshot = None
+
+    def database_checksum(self, connection):
+        cursor = connection.cursor()
+        try:
+            cursor.execute(SCHEMA_CHECKSUM_SQL)
+            return tuple(cursor.fetchone())
+        finally:
+            cursor.close()
+
+    def sync_with_database(self, connection, extract, force=False):
+        """
+        Re-extract the schema through `extract(connection)` only if the live
+        database's checksum changed since the last extraction.
+        """
+        now = time.monotonic()
+        if not force and self._db_checksum is not None and now - self._last_db_check < self.db_check_interval:
+            return False
+        self._last_db_check = now
+
+        checksum = self.database_checksum(connection)
+        if not force and checksum == self._db_checksum and self._stamp() is not None:
+            return False
+
+        extract(connection)
+        self._db_checksum = checksum
+        self.invalidate()
+        return True
+
+
+_registries = {}
+_registries_lock = threading.Lock()
+
+
+def get_schema_registry(schema_file="db_schema.json"):
+    """Return the process-wide registry for a schema file."""
+    key = os.path.abspath(schema_file)
+    with _registries_lock:
+        registry = _registries.get(key)
+        if registry is None:
+            registry = _registries[key] = SchemaRegistry(schema_file)
+        return registry
+
+
+def discard_schema_registry(schema_file):
+    """Drop the registry for a schema file, releasing its parsed schema."""
+    with _registries_lock:
+        _registries.pop(os.path.abspath(schema_file), None)
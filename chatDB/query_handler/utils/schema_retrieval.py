@@ -0,0 +1,124 @@
+import re
+import threading
+import weakref
+
+from django.conf import settings
+
+from .schema_registry import format_schema
+from .translation_cache import STOPWORDS, stem
+
+TABLE_NAME_WEIGHT = 2.0  # A question naming a table matters more than one naming a column
+
+
+def identifier_tokens(name):
+    """Split snake_case / camelCase identifiers into stemmed lowercase words."""
+    words = re.sub(r"([a-z0-9])([A-Z])", r"\1 \2", name).replace("_", " ").lower().split()
+    return [stem(w) for w in words if w]
+
+
+def question_tokens(question):
+    return [stem(w) for w in re.findall(r"[a-z0-9]+", question.lower()) if w not in STOPWORDS]
+
+
+class SchemaIndex:
+    """
+    TF-IDF matrix over table and column names, built once per schema version,
+    used to pick the tables relevant to a question.
+    """
+
+    def __init__(self, snapshot):
+        import numpy as np  # Imported on first use: only pruned prompts need it
+
+        schema = snapshot.schema or {}
+        self.tables = list(schema)
+        documents = []
+        for table in self.tables:
+            weights = {}
+            for token in identifier_tokens(table):
+                weights[token] = weights.get(token, 0.0) + TABLE_NAME_WEIGHT
+            for column in schema[table]:
+                for token in identifier_tokens(column["name"]):
+                    weights[token] = weights.get(token, 0.0) + 1.0
+            documents.append(weights)
+
+        self.vocabulary = {}
+        for weights in documents:
+            for token in weights:
+                self.vocabulary.setdefault(token, len(self.vocabulary))
+
+        matrix = np.zeros((len(self.tables), len(self.vocabulary)), dtype=np.float32)
+        for row, weights in enumerate(documents):
+            for token, weight in weights.items():
+                matrix[row, self.vocabulary[token]] = weight
+        document_frequency = np.count_nonzero(matrix, axis=0)
+        idf = np.log((1 + len(self.tables)) / (1 + document_frequency)) + 1.0
+        matrix *= idf
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        self.matrix = matrix / np.where(norms == 0, 1.0, norms)
+
+        # Undirected foreign-key graph for pulling in join partners
+        self.neighbours = {table: set() for table in self.tables}
+        for table, foreign_keys in snapshot.foreign_keys.items():
+            for fk in foreign_keys:
+                target = fk.get("references_table")
+                if table in self.neighbours and target in self.neighbours:
+                    self.neighbours[table].add(target)
+                    self.neighbours[target].add(table)
+
+    def scores(self, question):
+        import numpy as np
+
+        vector = np.zeros(len(self.vocabulary), dtype=np.float32)
+        for token in question_tokens(question):
+            column = self.vocabulary.get(token)
+            if column is not None:
+                vector[column] += 1.0
+        return self.matrix @ vector
+
+    def relevant_tables(self, question, top_k=5, max_tables=None):
+        """
+        The top_k best-matching tables plus their foreign-key neighbours,
+        capped at max_tables (default 2 * top_k).
+        """
+        max_tables = max_tables or 2 * top_k
+        scores = self.scores(question)
+        ranked = [i for i in (-scores).argsort(kind="stable") if scores[i] > 0][:top_k]
+        if not ranked:
+            ranked = list(range(min(top_k, len(self.tables))))
+
+        selected = [self.tables[i] for i in ranked]
+        chosen = set(selected)
+        for table in list(selected):
+            for neighbour in sorted(self.neighbours[table]):
+                if len(selected) >= max_tables:
+                    break
+                if neighbour not in chosen:
+                    selected.append(neighbour)
+                    chosen.add(neighbour)
+        return selected
+
+
+_indexes = weakref.WeakKeyDictionary()  # SchemaSnapshot -> SchemaIndex
+_indexes_lock = threading.Lock()
+
+
+def get_schema_index(snapshot):
+    with _indexes_lock:
+        index = _indexes.get(snapshot)
+        if index is None:
+            index = _indexes[snapshot] = SchemaIndex(snapshot)
+        return index
+
+
+def schema_for_question(snapshot, question):
+    """
+    Return the prompt's schema fragment: the whole schema for small databases,
+    otherwise only the tables relevant to the question.
+    """
+    options = getattr(settings, "SCHEMA_PRUNING", {})
+    top_k = options.get("top_k", 5)
+    if not snapshot.schema or len(snapshot.schema) <= options.get("min_tables", 10):
+        return snapshot.formatted
+
+    tables = get_schema_index(snapshot).relevant_tables(question, top_k, options.get("max_tables"))
+    return format_schema({table: snapshot.schema[table] for table in tables})
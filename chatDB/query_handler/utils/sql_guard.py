@@ -0,0 +1,243 @@
+import json
+import logging
+import re
+import threading
+import time
+from collections import Counter, deque
+
+import sqlparse
+from django.conf import settings
+from sqlparse import tokens as T
+
+from .sql_validation import statement_type
+
+logger = logging.getLogger(__name__)
+
+LIMIT_ARGS_RE = re.compile(r"^\s*(\d+)\s*(?:,\s*(\d+)|\s+OFFSET\s+(\d+))?\s*$", re.IGNORECASE)
+# Statements that return rows from tables: capped, time-limited and EXPLAINed
+READ_STATEMENTS = {"SELECT", "WITH"}
+
+DEFAULTS = {
+    "max_rows": 1000,  # LIMIT injected into / capped on buffered SELECTs
+    "confirm_estimated_rows": 100_000,  # Above this EXPLAIN estimate, ask the client to confirm
+    "reject_estimated_rows": 10_000_000,  # Above this, refuse outright
+    "max_execution_time_ms": 10_000,  # MAX_EXECUTION_TIME optimizer hint
+    "recent_decisions": 500,  # How many decisions to keep in memory for tuning
+}
+
+
+def guard_settings():
+    return {**DEFAULTS, **getattr(settings, "QUERY_GUARD", {})}
+
+
+def split_limit(sql):
+    """
+    Split a statement into (sql_without_limit, row_count, offset).
+
+    Only a top-level LIMIT is considered; LIMITs inside subqueries are left alone.
+    row_count is None when there is no LIMIT; the original SQL is returned when
+    the LIMIT clause can't be parsed.
+    """
+    sql = sql.strip().rstrip(";").strip()
+    statement = sqlparse.parse(sql)[0]
+    position = 0
+    limit_at = None
+    for token in statement.tokens:
+        if token.ttype is T.Keyword and token.normalized == "LIMIT":
+            limit_at = position
+        position += len(token.value)
+
+    if limit_at is None:
+        return sql, None, 0
+
+    match = LIMIT_ARGS_RE.match(sql[limit_at + len("LIMIT"):])
+    if not match:
+        return sql, None, 0
+    first, second, offset = match.groups()
+    if second is not None:  # LIMIT offset, row_count
+        return sql[:limit_at].rstrip(), int(second), int(first)
+    return sql[:limit_at].rstrip(), int(first), int(offset or 0)
+
+
+def join_limit(sql, row_count, offset=0):
+    return f"{sql} LIMIT {row_count}" + (f" OFFSET {offset}" if offset else "")
+
+
+def is_read(sql):
+    return statement_type(sql) in READ_STATEMENTS
+
+
+def outer_select_at(sql):
+    """
+    Return the offset of the statement's outermost SELECT keyword: the one after
+    a WITH clause's CTEs, or the first at the shallowest parenthesis level.
+    None if there is no SELECT.
+    """
+    depth = position = 0
+    outer = None
+    for token in sqlparse.parse(sql)[0].flatten():
+        if token.match(T.Punctuation, "("):
+            depth += 1
+        elif token.match(T.Punctuation, ")"):
+            depth -= 1
+        elif token.ttype is T.Keyword.DML and token.normalized == "SELECT" and (outer is None or depth < outer[0]):
+            outer = (depth, position)
+        position += len(token.value)
+    return outer and outer[1]
+
+
+def apply_row_limit(sql, max_rows):
+    """Inject a LIMIT, or cap an existing one, so at most max_rows rows come back."""
+    base, row_count, offset = split_limit(sql)
+    if row_count is None:
+        return join_limit(base, max_rows, offset), "limit_injected"
+    if row_count > max_rows:
+        return join_limit(base, max_rows, offset), "limit_capped"
+    return sql.strip().rstrip(";").strip(), None
+
+
+def add_execution_time_hint(sql, max_execution_time_ms):
+    """Add a MAX_EXECUTION_TIME optimizer hint to the outermost SELECT."""
+    if not max_execution_time_ms or "MAX_EXECUTION_TIME" in sql.upper():
+        return sql
+    at = outer_select_at(sql)
+    if at is None:
+        return sql
+    at += len("SELECT")
+    return f"{sql[:at]} /*+ MAX_EXECUTION_TIME({int(max_execution_time_ms)}) */{sql[at:]}"
+
+
+def estimate_rows(columns, rows):
+    """
+    Estimate rows examined from EXPLAIN output: within one SELECT the tables of
+    a join multiply (rows * filtered%), and separate SELECTs add up.
+    """
+    columns = [c.lower() for c in columns]
+    id_at, rows_at = columns.index("id"), columns.index("rows")
+    filtered_at = columns.index("filtered") if "filtered" in columns else None
+
+    per_select = {}
+    for row in rows:
+        examined = float(row[rows_at] or 1)
+        if filtered_at is not None and row[filtered_at] is not None:
+            examined *= max(float(row[filtered_at]), 1.0) / 100.0
+        per_select[row[id_at]] = per_select.get(row[id_at], 1.0) * max(examined, 1.0)
+    return sum(per_select.values())
+
+
+class GuardDecision:
+    """Outcome of checking one generated query before it runs."""
+
+    def __init__(self, action, sql, original_sql, estimated_rows=None, reason=None, streaming=False):
+        self.action = action  # allow | limit_injected | limit_capped | confirm | reject
+        self.sql = sql
+        self.original_sql = original_sql
+        self.estimated_rows = estimated_rows
+        self.reason = reason
+        self.streaming = streaming
+        self.timestamp = time.time()
+
+    @property
+    def allowed(self):
+        return self.action not in ("confirm", "reject")
+
+    def as_dict(self):
+        return {
+            "action": self.action,
+            "sql": self.sql,
+            "original_sql": self.original_sql,
+            "estimated_rows": self.estimated_rows,
+            "reason": self.reason,
+            "streaming": self.streaming,
+            "timestamp": self.timestamp,
+        }
+
+
+_recent = deque(maxlen=DEFAULTS["recent_decisions"])
+_counts = Counter()
+_record_lock = threading.Lock()
+
+
+def record_decision(decision):
+    """Keep every decision in memory and in the log so thresholds can be tuned."""
+    global _recent
+    with _record_lock:
+        maxlen = guard_settings()["recent_decisions"]
+        if _recent.maxlen != maxlen:
+            _recent = deque(_recent, maxlen=maxlen)
+        _recent.append(decision.as_dict())
+        _counts[decision.action] += 1
+    logger.info("query_guard %s", json.dumps(decision.as_dict(), default=str))
+
+
+def decision_stats():
+    with _record_lock:
+        return {"counts": dict(_counts), "recent": list(_recent)}
+
+
+def plan_query(sql, streaming=False, paginated=False):
+    """
+    Rewrite a generated query for execution: cap its rows (buffered results only)
+    and bound its run time. Returns (sql, action).
+
+    Paginated queries keep the time limit but not the row cap, since each page
+    is already bounded by its page size.
+    """
+    options = guard_settings()
+    sql = sql.strip().rstrip(";").strip()
+    if not is_read(sql):
+        return sql, "allow"
+
+    action = "allow"
+    if not streaming:
+        if not paginated:
+            sql, limit_action = apply_row_limit(sql, options["max_rows"])
+            action = limit_action or action
+        # Streams are expected to run long, so only buffered queries get a time limit
+        sql = add_execution_time_hint(sql, options["max_execution_time_ms"])
+    return sql, action
+
+
+def decide(original_sql, sql, action, estimated_rows, confirmed=False, streaming=False):
+    """Turn an EXPLAIN estimate into a recorded GuardDecision."""
+    options = guard_settings()
+    reason = None
+    if estimated_rows is not None and estimated_rows > options["reject_estimated_rows"]:
+        action = "reject"
+        reason = f"Estimated {estimated_rows:,.0f} rows examined exceeds the limit of {options['reject_estimated_rows']:,}."
+    elif estimated_rows is not None and estimated_rows > options["confirm_estimated_rows"] and not confirmed:
+        action = "confirm"
+        reason = f"Estimated {estimated_rows:,.0f} rows examined; resend with confirm=true to run it."
+
+    decision = GuardDecision(action, sql, original_sql, estimated_rows, reason, streaming)
+    record_decision(decision)
+    return decision
+
+
+def explain(connection, sql):
+    """Run EXPLAIN on a pooled connection and return the estimated rows examined."""
+    cursor = connection.cursor()
+    try:
+        cursor.execute(f"EXPLAIN {sql}")
+        columns = [col[0] for col in cursor.description]
+        return estimate_rows(columns, cursor.fetchall())
+    finally:
+        cursor.close()
+
+
+def guard_query(pool, sql, confirmed=False, streaming=False, paginated=False):
+    """
+    Check a generated query before execution: cap its LIMIT, add a time limit,
+    and EXPLAIN it to reject or ask confirmation for expensive plans.
+    """
+    planned, action = plan_query(sql, streaming, paginated)
+    estimated_rows = None
+    if is_read(planned) and pool.dialect == "mysql":  # Cost estimates come from MySQL's EXPLAIN
+        try:
+            with pool.connection() as connection:
+                estimated_rows = explain(connection, planned)
+        except Exception as e:
+            decision = GuardDecision("reject", planned, sql, reason=f"EXPLAIN failed: {e}", streaming=streaming)
+            record_decision(decision)
+            return decision
+    return decide(sql, planned, action, estimated_rows, confirmed, streaming)
@@ -0,0 +1,282 @@
+import hashlib
+
+import sqlparse
+from sqlparse import tokens as T
+
+# Clause keywords that change what the following names mean
+CLAUSES = {
+    "SELECT": "select", "FROM": "from", "WHERE": "where", "GROUP BY": "group", "HAVING": "having",
+    "ORDER BY": "order", "LIMIT": "limit", "OFFSET": "limit", "ON": "on", "USING": "on",
+    "UNION": "select", "UNION ALL": "select", "WITH": "with",
+}
+# Keywords that never belong in a read-only query
+WRITE_KEYWORDS = {"INTO", "OUTFILE", "DUMPFILE", "LOCK", "FOR UPDATE", "SHARE", "HANDLER", "CALL", "SET"}
+# No EXPLAIN: it wraps any statement, and EXPLAIN ANALYZE runs it
+ALLOWED_STATEMENTS = {"SELECT", "SHOW", "WITH", "DESCRIBE", "DESC"}
+# Functions that stall the server or read its files
+BLOCKED_FUNCTIONS = {"SLEEP", "BENCHMARK", "LOAD_FILE"}
+# SHOW statements that reach beyond the datasource's own tables
+BLOCKED_SHOW = {"DATABASES", "SCHEMAS", "GRANTS"}
+
+
+class SQLValidationError(ValueError):
+    """Raised when generated SQL is not a single, read-only query over known tables."""
+
+
+class ValidatedSQL:
+    """A query that passed validation, with its normalized text and the schema objects it uses."""
+
+    def __init__(self, sql, normalized, statement_type, tables, columns):
+        self.sql = sql
+        self.normalized = normalized
+        self.statement_type = statement_type
+        self.tables = tables  # Schema table names, as spelled in the schema
+        self.columns = columns  # {(table or None, column)}
+        self.fingerprint = hashlib.sha1(normalized.encode()).hexdigest()[:16]
+
+
+def _name(token):
+    return token.value.strip("`\"")
+
+
+def _check_database(name, database):
+    """Tables may only be qualified with the active datasource's own database."""
+    if database is None or name.lower() != str(database).lower():
+        raise SQLValidationError(f"Generated query references another database '{name}'.")
+
+
+class _Scope:
+    """Parse state for one parenthesis level."""
+
+    __slots__ = ("clause", "expect", "last_table", "subquery")
+
+    def __init__(self, clause=None):
+        self.clause = clause
+        self.expect = None  # "table", "alias", "cte" or None
+        self.last_table = None
+        self.subquery = False
+
+
+def statement_type(sql):
+    """
+    Return the kind of statement `sql` is, classified the way parse_sql does it:
+    its first keyword, with comments and opening parentheses skipped, so
+    "(SELECT ...)" is a SELECT and "WITH ... SELECT ..." is a WITH.
+    """
+    for statement in sqlparse.parse(sql or ""):
+        for token in statement.flatten():
+            if token.is_whitespace or token.ttype in T.Comment or token.match(T.Punctuation, "("):
+                continue
+            is_keyword = token.ttype in T.Keyword or token.ttype is T.Name.Builtin
+            return token.normalized.upper() if is_keyword else token.value.upper()
+    return None
+
+
+def parse_sql(sql, schema, database=None):
+    """
+    Validate `sql` against `schema` ({table: [columns]}) in a single pass over
+    its tokens: reject anything but one read-only statement, resolve table and
+    column references, and build the normalized text. Tables qualified with a
+    database name other than `database` are rejected.
+
+    Returns a ValidatedSQL; raises SQLValidationError.
+    """
+    sql = (sql or "").strip()
+    statements = [s for s in sqlparse.split(sql) if s.strip().rstrip(";").strip()]
+    if len(statements) != 1:
+        raise SQLValidationError("Expected exactly one SQL statement.")
+
+    tables_by_name = {t.lower(): t for t in schema}
+    columns_by_table = {t.lower(): {c["name"].lower() for c in cols} for t, cols in schema.items()}
+    all_columns = set().union(*columns_by_table.values()) if columns_by_table else set()
+
+    tokens = [t for t in sqlparse.parse(statements[0])[0].flatten()]
+    significant = [t for t in tokens if not t.is_whitespace and t.ttype not in T.Comment]
+
+    statement_type = None
+    normalized = []
+    pending_space = False
+    tables = set()
+    aliases = {}  # alias/table name (lower) -> schema table, or None for derived tables and CTEs
+    output_aliases = set()
+    column_refs = []  # (qualifier or None, column, is_keyword)
+    stack = [_Scope()]
+    previous = None
+
+    position = 0
+    metadata_only = False
+    previous_word = None
+    for token in tokens:
+        # Normalized text: comments dropped, whitespace collapsed, keywords upper-cased
+        if token.ttype in T.Comment or token.is_whitespace:
+            pending_space = True
+            continue
+        if pending_space and normalized:
+            normalized.append(" ")
+        pending_space = False
+        is_keyword = token.ttype in T.Keyword or token.ttype is T.Name.Builtin
+        normalized.append(token.normalized if is_keyword else token.value)
+
+        following = significant[position + 1] if position + 1 < len(significant) else None
+        position += 1
+        word = token.normalized.upper() if is_keyword else None
+        if metadata_only:
+            # SHOW ... FROM/IN names a table of the schema or a database
+            if token.ttype in T.Name and (
+                    (following is not None and following.match(T.Punctuation, "."))
+                    or (previous_word in ("FROM", "IN") and _name(token).lower() not in tables_by_name)):
+                _check_database(_name(token), database)
+            previous_word = word
+            continue
+        scope = stack[-1]
+
+        if statement_type is None:
+            if token.match(T.Punctuation, "("):
+                stack.append(_Scope())
+                continue
+            statement_type = word or token.value.upper()
+            if statement_type not in ALLOWED_STATEMENTS:
+                raise SQLValidationError(f"Only read-only queries are allowed, got {statement_type}.")
+            if statement_type == "SHOW" and following is not None and following.value.upper() in BLOCKED_SHOW:
+                raise SQLValidationError(f"SHOW {following.value.upper()} is not allowed.")
+            # Metadata statements carry no column references to resolve
+            metadata_only = statement_type in ("SHOW", "DESCRIBE", "DESC")
+            stack[-1].clause = CLAUSES.get(statement_type)
+            stack[-1].expect = "cte" if statement_type == "WITH" else None
+            previous = token
+            continue
+
+        # Writes of any kind
+        if (token.ttype in (T.Keyword.DML, T.Keyword.DDL) and word != "SELECT") or word in WRITE_KEYWORDS:
+            raise SQLValidationError(f"Only read-only queries are allowed, found {word}.")
+
+        if token.match(T.Punctuation, "("):
+            child = _Scope(scope.clause)
+            child.subquery = scope.expect in ("table", "cte_body")
+            stack.append(child)
+            previous = token
+            continue
+        if token.match(T.Punctuation, ")"):
+            child = stack.pop() if len(stack) > 1 else scope
+            scope = stack[-1]
+            if child.subquery and scope.clause == "from":
+                scope.expect = "alias"  # Derived table: its alias maps to no schema table
+                scope.last_table = None
+            elif scope.expect == "cte_body":
+                scope.expect = None
+            previous = token
+            continue
+        if token.match(T.Punctuation, ","):
+            if scope.clause == "from":
+                scope.expect = "table"
+            elif scope.clause == "with":
+                scope.expect = "cte"
+            previous = token
+            continue
+
+        # Clause structure
+        if word in CLAUSES or word == "FROM" or (word and word.endswith("JOIN")):
+            if word.endswith("JOIN") or word == "FROM":
+                scope.clause, scope.expect = "from", "table"
+            else:
+                scope.clause, scope.expect = CLAUSES[word], None
+            previous = token
+            continue
+        if word == "AS":
+            if scope.clause == "from":
+                scope.expect = "alias"
+            elif scope.clause == "with":
+                scope.expect = "cte_body"
+            elif scope.clause == "select":
+                scope.expect = "output_alias"
+            previous = token
+            continue
+
+        is_name = token.ttype in T.Name and token.ttype is not T.Name.Builtin
+        # Plain keywords may still be column or table names (e.g. `position`)
+        if not is_name and token.ttype is not T.Keyword:
+            previous = token
+            continue
+
+        name = _name(token)
+        lowered = name.lower()
+        qualified = previous is not None and previous.match(T.Punctuation, ".")
+        is_qualifier = following is not None and following.match(T.Punctuation, ".")
+        is_function = following is not None and following.match(T.Punctuation, "(")
+        if is_function and name.upper() in BLOCKED_FUNCTIONS:
+            raise SQLValidationError(f"Function {name.upper()}() is not allowed.")
+
+        if scope.clause == "with" and scope.expect == "cte":
+            aliases[lowered] = None
+            scope.expect = "cte_as"
+        elif scope.clause == "with":
+            pass  # Column list of a CTE
+        elif scope.clause == "from" and scope.expect == "table":
+            if is_qualifier:
+                _check_database(name, database)  # Database name of db.table
+            elif lowered in aliases and aliases[lowered] is None:
+                scope.expect = "alias"  # A CTE used as a table
+                scope.last_table = None
+            elif lowered not in tables_by_name:
+                raise SQLValidationError(f"Generated query references unknown table '{name}'.")
+            else:
+                table = tables_by_name[lowered]
+                tables.add(table)
+                aliases[lowered] = table
+                scope.last_table = table
+                scope.expect = "alias"
+        elif scope.clause == "from" and scope.expect == "alias" and is_name:
+            aliases[lowered] = scope.last_table
+            scope.expect = None
+        elif scope.expect == "output_alias" or (
+                scope.clause == "select" and is_name and previous is not None and not qualified
+                and (previous.ttype in T.Name or previous.ttype in T.Literal or previous.match(T.Punctuation, ")"))):
+            output_aliases.add(lowered)
+            scope.expect = None
+        elif is_qualifier or is_function:
+            pass
+        elif not is_name and previous is not None and previous.ttype in T.Literal.Number:
+            pass  # Unit of an INTERVAL, e.g. INTERVAL 1 YEAR
+        else:
+            qualifier = None
+            if qualified and position >= 3:
+                # The qualifier is the significant token before the '.'
+                qualifier = _name(significant[position - 3]).lower()
+            column_refs.append((qualifier, lowered, not is_name))
+
+        previous = token
+
+    # Resolve column references now that every table and alias in the statement is known
+    columns = set()
+    has_derived = any(table is None for table in aliases.values())
+    for qualifier, column, is_keyword in column_refs:
+        if qualifier is not None:
+            if qualifier not in aliases:
+                raise SQLValidationError(f"Generated query references unknown table or alias '{qualifier}'.")
+            table = aliases[qualifier]
+            if table is None:
+                continue  # Columns of derived tables and CTEs aren't in the schema
+            if column not in columns_by_table[table.lower()]:
+                raise SQLValidationError(f"Generated query references unknown column '{qualifier}.{column}'.")
+            columns.add((table, column))
+            continue
+
+        owners = [t for t in tables if column in columns_by_table[t.lower()]]
+        if owners:
+            columns.update((t, column) for t in owners)
+        elif column in output_aliases or has_derived or column in aliases:
+            continue  # A SELECT alias or a column of a derived table
+        elif is_keyword and column not in all_columns:
+            continue  # An ordinary SQL keyword
+        elif column in all_columns:
+            raise SQLValidationError(f"Column '{column}' is not in any table the query reads from.")
+        else:
+            raise SQLValidationError(f"Generated query references unknown column '{column}'.")
+
+    if statement_type in ("SELECT", "WITH") and not tables and not has_derived:
+        raise SQLValidationError("Generated query references unknown table.")
+
+    text = "".join(normalized).strip()
+    while text.endswith(";"):
+        text = text[:-1].rstrip()
+    return ValidatedSQL(statements[0].strip().rstrip(";").strip(), text, statement_type, tables, columns)
@@ -0,0 +1,260 @@
+import contextvars
+import json
+import logging
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+from django.conf import settings
+
+logger = logging.getLogger("query_handler.trace")
+
+# Seconds; covers sub-millisecond cache hits up to slow model calls
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_current_trace = contextvars.ContextVar("query_handler_trace", default=None)
+_current_span = contextvars.ContextVar("query_handler_span", default=None)
+
+
+def tracing_enabled():
+    return getattr(settings, "TRACING", {}).get("enabled", False)
+
+
+class Histogram:
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.count += 1
+        self.sum += value
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+
+
+class Metrics:
+    """Process-wide counters and histograms, rendered in Prometheus text format."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters = {}  # (name, labels) -> value
+        self.histograms = {}  # (name, labels) -> Histogram
+        self.help = {}
+
+    def inc(self, name, value=1, help_text=None, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+            if help_text:
+                self.help[name] = help_text
+
+    def observe(self, name, value, help_text=None, buckets=DEFAULT_BUCKETS, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram(buckets)
+            histogram.observe(value)
+            if help_text:
+                self.help[name] = help_text
+
+    def reset(self):
+        with self._lock:
+            self.counters.clear()
+            self.histograms.clear()
+
+
+metrics = Metrics()
+
+
+def _label_value(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(labels, extra=None):
+    items = list(labels) + list(extra or [])
+    if not items:
+        return ""
+    return "{" + ",".join(f'{k}="{_label_value(v)}"' for k, v in items) + "}"
+
+
+def _metric_name(name):
+    return "chatdb_" + "".join(c if c.isalnum() else "_" for c in name)
+
+
+def render_prometheus(gauges=None):
+    """
+    Render all counters and histograms, plus `gauges` ({name: {labels_tuple: value}}
+    or {name: value}), in the Prometheus text exposition format.
+    """
+    lines = []
+    with metrics._lock:
+        counters = dict(metrics.counters)
+        histograms = {k: (h.buckets, list(h.counts), h.count, h.sum) for k, h in metrics.histograms.items()}
+        help_texts = dict(metrics.help)
+
+    for name in sorted({n for n, _ in counters}):
+        metric = _metric_name(name)
+        if name in help_texts:
+            lines.append(f"# HELP {metric} {help_texts[name]}")
+        lines.append(f"# TYPE {metric} counter")
+        for (n, labels), value in sorted(counters.items()):
+            if n == name:
+                lines.append(f"{metric}{_labels(labels)} {value}")
+
+    for name in sorted({n for n, _ in histograms}):
+        metric = _metric_name(name)
+        if name in help_texts:
+            lines.append(f"# HELP {metric} {help_texts[name]}")
+        lines.append(f"# TYPE {metric} histogram")
+        for (n, labels), (buckets, counts, count, total) in sorted(histograms.items()):
+            if n != name:
+                continue
+            for bound, bucket_count in zip(buckets, counts):
+                lines.append(f"{metric}_bucket{_labels(labels, [('le', bound)])} {bucket_count}")
+            lines.append(f"{metric}_bucket{_labels(labels, [('le', '+Inf')])} {count}")
+            lines.append(f"{metric}_sum{_labels(labels)} {total}")
+            lines.append(f"{metric}_count{_labels(labels)} {count}")
+
+    for name, values in sorted((gauges or {}).items()):
+        metric = _metric_name(name)
+        lines.append(f"# TYPE {metric} gauge")
+        if isinstance(values, dict):
+            for labels, value in sorted(values.items()):
+                lines.append(f"{metric}{_labels(labels)} {value}")
+        else:
+            lines.append(f"{metric} {values}")
+    return "\n".join(lines) + "\n"
+
+
+class _NoopSpan:
+    """Returned when tracing is off, so instrumented code pays almost nothing."""
+
+    __slots__ = ()
+
+    def set(self, key, value):
+        pass
+
+    def add(self, key, amount=1):
+        pass
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+class Span:
+    __slots__ = ("name", "start", "duration", "attributes", "trace")
+
+    def __init__(self, trace, name):
+        self.trace = trace
+        self.name = name
+        self.start = time.perf_counter()
+        self.duration = None
+        self.attributes = {}
+
+    def set(self, key, value):
+        self.attributes[key] = value
+
+    def add(self, key, amount=1):
+        self.attributes[key] = self.attributes.get(key, 0) + amount
+
+    def as_dict(self):
+        return {
+            "name": self.name,
+            "start_ms": round((self.start - self.trace.start) * 1000, 3),
+            "duration_ms": round((self.duration or 0) * 1000, 3),
+            **self.attributes,
+        }
+
+
+class Trace:
+    def __init__(self, name):
+        self.name = name
+        self.trace_id = uuid.uuid4().hex[:16]
+        self.start = time.perf_counter()
+        self.spans = []
+        self.attributes = {}
+        self.status = "ok"
+
+    def as_dict(self, duration):
+        return {
+            "trace_id": self.trace_id,
+            "name": self.name,
+            "status": self.status,
+            "duration_ms": round(duration * 1000, 3),
+            **self.attributes,
+            "spans": [span.as_dict() for span in self.spans],
+        }
+
+
+@contextmanager
+def start_trace(name, **attributes):
+    """Trace one request; yields the Trace, or None when tracing is disabled."""
+    if not tracing_enabled():
+        yield None
+        return
+
+    trace = Trace(name)
+    trace.attributes.update(attributes)
+    token = _current_trace.set(trace)
+    try:
+        yield trace
+    except Exception:
+        trace.status = "error"
+        raise
+    finally:
+        _current_trace.reset(token)
+        duration = time.perf_counter() - trace.start
+        metrics.inc("requests_total", help_text="Traced requests.", endpoint=trace.name, status=trace.status)
+        metrics.observe("request_duration_seconds", duration,
+                        help_text="End-to-end request latency.", endpoint=trace.name)
+        if getattr(settings, "TRACING", {}).get("log", True):
+            logger.info(json.dumps(trace.as_dict(duration), default=str))
+
+
+@contextmanager
+def span(name):
+    """
+    Time one pipeline stage of the current trace. Yields a span whose set()/add()
+    record attributes (retry counts, token sizes, row counts...).
+    """
+    trace = _current_trace.get()
+    if trace is None:
+        yield NOOP_SPAN
+        return
+
+    current = Span(trace, name)
+    token = _current_span.set(current)
+    try:
+        yield current
+    except Exception as e:
+        current.set("error", type(e).__name__)
+        raise
+    finally:
+        current.duration = time.perf_counter() - current.start
+        _current_span.reset(token)
+        trace.spans.append(current)
+        metrics.observe("stage_duration_seconds", current.duration,
+                        help_text="Time spent in each pipeline stage.", stage=name)
+
+
+def current_span():
+    """The innermost active span, or a no-op span outside of any trace."""
+    return _current_span.get() or NOOP_SPAN
+
+
+def current_trace():
+    return _current_trace.get()
+
+
+def add_stats_gauges(gauges, prefix, stats, **labels):
+    """Add the numeric values of a stats() dict to `gauges` as `<prefix>_<key>`."""
+    label_items = tuple(sorted(labels.items()))
+    for key, value in stats.items():
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            gauges.setdefault(f"{prefix}_{key}", {})[label_items] = value
+    return gauges
@@ -0,0 +1,160 @@
+import re
+import threading
+import time
+from collections import OrderedDict
+from difflib import SequenceMatcher
+
+# Words that don't change which SQL a question maps to
+STOPWORDS = {
+    "a", "all", "an", "and", "any", "are", "by", "can", "could", "do", "does", "each", "every",
+    "find", "for", "from", "get", "give", "have", "in", "is", "list", "me", "of", "on", "please",
+    "return", "show", "tell", "that", "the", "there", "to", "what", "which", "who", "whose", "with",
+}
+
+
+def normalize_question(text):
+    """Lowercase, strip punctuation and collapse whitespace."""
+    return " ".join(re.findall(r"[a-z0-9_']+", text.lower()))
+
+
+def stem(token):
+    if len(token) > 3 and token.endswith("ies"):
+        return token[:-3] + "y"
+    if len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+        return token[:-1]
+    return token
+
+
+# Stopwords that still decide the SQL: "from paris to london" is not "from london to paris"
+DIRECTION_WORDS = {"from", "to"}
+
+
+def significant_tokens(normalized):
+    """Content and direction words of a normalized question, crudely stemmed, in question order."""
+    return [stem(t) for t in normalized.split() if t not in STOPWORDS or t in DIRECTION_WORDS]
+
+
+def is_literal(token):
+    """Numbers and quoted values: a question about 50000 is not one about 60000."""
+    return "'" in token or any(c.isdigit() for c in token)
+
+
+def _trigrams(tokens):
+    text = f" {' '.join(tokens)} "
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def _tokens_match(tokens, other, min_ratio):
+    """
+    True if both token lists are the same up to small typos: tokens pair up
+    in order, and each pair is identical, or near-identical words. Literals
+    must always be identical.
+    """
+    if len(tokens) != len(other):
+        return False
+    for token, candidate in zip(tokens, other):
+        if token == candidate:
+            continue
+        if is_literal(token) or is_literal(candidate) or SequenceMatcher(None, token, candidate).ratio() < min_ratio:
+            return False
+    return True
+
+
+class _Entry:
+    __slots__ = ("sql", "tokens", "trigrams", "expires_at")
+
+    def __init__(self, sql, tokens, expires_at):
+        self.sql = sql
+        self.tokens = tokens
+        self.trigrams = _trigrams(tokens)
+        self.expires_at = expires_at
+
+
+class TranslationCache:
+    """
+    Two-tier cache from natural-language questions to generated SQL.
+
+    Exact tier: normalized question text plus schema version.
+    Similarity tier: questions that differ only in stopwords, plurals or
+    small typos in words (never in numbers or quoted values), with the
+    same word order, pre-filtered by trigram Jaccard similarity.
+    Entries are evicted LRU beyond `max_entries` and expire after `ttl` seconds.
+    """
+
+    def __init__(self, max_entries=1024, ttl=3600.0, similarity_threshold=0.8, token_match_ratio=0.8):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.similarity_threshold = similarity_threshold
+        self.token_match_ratio = token_match_ratio
+        self._entries = OrderedDict()  # (schema_version, normalized) -> _Entry
+        self._lock = threading.Lock()
+        self.exact_hits = 0
+        self.similar_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def _similar(self, tokens, schema_version, now):
+        trigrams = _trigrams(tokens)
+        best_key, best_score = None, 0.0
+        for key, entry in self._entries.items():
+            if key[0] != schema_version or entry.expires_at <= now:
+                continue
+            union = len(trigrams | entry.trigrams)
+            score = len(trigrams & entry.trigrams) / union if union else 0.0
+            if score >= self.similarity_threshold and score > best_score \
+                    and _tokens_match(tokens, entry.tokens, self.token_match_ratio):
+                best_key, best_score = key, score
+        return best_key
+
+    def get(self, question, schema_version):
+        """Return cached SQL for the question, or None."""
+        normalized = normalize_question(question)
+        now = time.monotonic()
+        with self._lock:
+            key = (schema_version, normalized)
+            entry = self._entries.get(key)
+            if entry is not None and entry.expires_at <= now:
+                del self._entries[key]
+                self.expirations += 1
+                entry = None
+            if entry is not None:
+                self.exact_hits += 1
+            else:
+                key = self._similar(significant_tokens(normalized), schema_version, now)
+                if key is None:
+                    self.misses += 1
+                    return None
+                entry = self._entries[key]
+                self.similar_hits += 1
+            self._entries.move_to_end(key)
+            return entry.sql
+
+    def put(self, question, schema_version, sql):
+        normalized = normalize_question(question)
+        entry = _Entry(sql, significant_tokens(normalized), time.monotonic() + self.ttl)
+        with self._lock:
+            key = (schema_version, normalized)
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.exact_hits + self.similar_hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_entries": self.max_entries,
+                "exact_hits": self.exact_hits,
+                "similar_hits": self.similar_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "hit_rate": (self.exact_hits + self.similar_hits) / lookups if lookups else 0.0,
+            }
@@ -2,142 +2,941 @@ from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
 from .models import UserQuery
-from .serializers import UserQuerySerializer
-from .utils.nlp_utils import process_query, load_schema
-from django.http import JsonResponse
+from .serializers import QueryOptionsSerializer, UserQuerySerializer
+from .utils.nlp_utils import aprocess_query, get_translation_cache, process_queries, process_query, load_schema
+from .utils.async_db import aexecute_query, aguard_query
+from .utils.db_pool import DATABASE_ERRORS, PoolTimeout, all_pool_stats
+from .utils.schema_extractor import refresh_schema
+from .utils.sql_guard import decision_stats, guard_query, guard_settings
+from .utils.result_cache import result_key
+from .utils.result_stream import fetch_page, make_page_token, pageable, read_page_token, stream_results
+from .utils.tracing import add_stats_gauges, render_prometheus, span
+from .utils.jobs import QueueFull, get_job_queue
+from .utils.single_flight import all_single_flight_stats, get_single_flight
+from .utils.result_store import store_result
+from .utils.result_format import ResultSet, as_result_set, encode_response
+from .renderers import result_renderer_classes, wants_columnar
+from .utils.history import after_cursor, apply_search, make_cursor
+from .utils.llm_client import get_llm_client
+from .utils.example_store import get_example_store
+from .utils.admission import AdmissionRejected, acharge, charge, charging, current_ticket, get_admission
+from .utils.prepared import parameterize, prepared_settings, prepared_stats, record_shape, statement_cache
+from .utils.datasources import DEFAULT_DATASOURCE, DatasourceBusy, UnknownDatasource, get_datasource_registry
+from django.conf import settings
+from django.core import signing
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
 from django.db import connections
+from django.urls import reverse
+from django.utils import timezone
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from asgiref.sync import sync_to_async
 import mysql.connector
 from mysql.connector import Error
 from rest_framework.decorators import api_view
 import json
-from dotenv import load_dotenv
-import os
-load_dotenv()
+import logging
+import math
+import time
 
-# Establish a reusable database connection
-DB_CONNECTION = None
-SCHEMA_FILE = "db_schema.json"
+logger = logging.getLogger(__name__)
 
-def get_db_connection():
-    global DB_CONNECTION
-    if DB_CONNECTION and DB_CONNECTION.is_connected():
-        return DB_CONNECTION  # Reuse if already connected
 
+def get_db_pool(datasource):
+    """
+    Return the datasource's connection pool, re-extracting its schema only
+    when the database's information_schema checksum changes.
+    """
+    pool = datasource.pool
+    if pool.dialect != "mysql":
+        return pool  # Schema extraction reads information_schema; other backends keep their schema file as is
     try:
-        DB_CONNECTION = mysql.connector.connect(
-            host='localhost',  
-            user='root',
-            password=os.getenv('env_password'),  
-            database='django_db',  
-            port=3306
-        )
-        
-        # Extract schema and save it
-        extract_and_save_schema(DB_CONNECTION)
-
-        return DB_CONNECTION
-    except mysql.connector.Error as e:
-        print(f"Error connecting to database: {e}")
-        DB_CONNECTION = None
+        with span("schema_sync"), pool.connection() as connection:
+            datasource.schema_registry.sync_with_database(
+                connection, partial(extract_and_save_schema, schema_file=datasource.schema_file))
+    except (*DATABASE_ERRORS, PoolTimeout) as e:
+        logger.error("Error connecting to datasource %s: %s", datasource.name, e)
         return None
-    
+    return pool
 
-def extract_and_save_schema(connection):
+
+def extract_and_save_schema(connection, schema_file):
     """Extracts the database schema and saves it to a JSON file."""
     try:
-        cursor = connection.cursor()
-        cursor.execute("SHOW TABLES")
-        tables = [table[0] for table in cursor.fetchall()]
-
-        schema = {}
-
-        for table in tables:
-            cursor.execute(f"DESCRIBE {table}")
-            columns = cursor.fetchall()
-            schema[table] = [{"name": col[0], "type": col[1]} for col in columns]
+        changed = refresh_schema(connection, schema_file)
+        if changed:
+            logger.info("Database schema saved to %s (%d table(s) refreshed)", schema_file, len(changed))
+    except mysql.connector.Error as e:
+        logger.error("Error extracting schema: %s", e)
 
-        # Save schema to a JSON file
-        with open(SCHEMA_FILE, "w") as f:
-            json.dump(schema, f, indent=4, default=str)
 
-        print(f"Database schema saved to {SCHEMA_FILE}")
+def datasource_error(e):
+    """Response for a request naming an unknown datasource, or one at its concurrency limit."""
+    if isinstance(e, UnknownDatasource):
+        return JsonResponse({"error": str(e)}, status=404)
+    response = JsonResponse({"error": f"{e} Retry later."}, status=429)
+    response["Retry-After"] = "1"
+    return response
 
-    except mysql.connector.Error as e:
-        print(f"Error extracting schema: {e}")
-
-    finally:
-        cursor.close()
-            
 
 def connect_database_view(request):  # Django view must take `request`
-    connection = get_db_connection()
-    
-    if connection:
-        return JsonResponse({"message": "Database connection successful"})
+    try:
+        with get_datasource_registry().use(request.GET.get('database')) as datasource:
+            pool = get_db_pool(datasource)
+    except (UnknownDatasource, DatasourceBusy) as e:
+        return datasource_error(e)
+
+    if pool:
+        return JsonResponse({"message": "Database connection successful", "pool": pool.stats()})
     else:
         return JsonResponse({"error": "Failed to connect to the database"}, status=500)
 
 
-def execute_query(query):
-    connection = get_db_connection()
-    if not connection:
+def datasources_view(request):
+    """Report every configured datasource and the open ones' concurrency, pool and cache stats."""
+    registry = get_datasource_registry()
+    return JsonResponse({"names": registry.names(), **registry.stats()})
+
+
+def pool_stats_view(request):
+    """Report occupancy and checkout wait-time metrics for every connection pool."""
+    return JsonResponse(all_pool_stats())
+
+
+def translation_cache_stats_view(request):
+    """Report hit/miss counters of the natural-language -> SQL translation cache."""
+    return JsonResponse(get_translation_cache().stats())
+
+
+def execute_query(query, datasource):
+    pool = get_db_pool(datasource)
+    if not pool:
         return {"error": "Failed to connect to the database."}
 
+    # Literals become parameters, so each shape of query is parsed once per connection
+    prepared = parameterize(query, pool.dialect)
+    try:
+        with span("sql_execute") as stage, pool.connection() as connection:
+            stage.set("shape", prepared.shape)
+            start = time.perf_counter()
+            # Only validated read-only queries get here; nothing is ever committed, and
+            # returning the connection to the pool rolls back anything that slipped through
+            if prepared_settings().get("enabled", True):
+                rows = statement_cache(connection, pool.dialect).execute(prepared)
+            else:
+                rows = execute_inline(connection, query)
+            record_shape(prepared, (time.perf_counter() - start) * 1000)
+            if rows is not None:  # Only SELECT-like queries have a result set
+                results = rows
+                stage.set("rows", len(results))
+            else:
+                results = {"message": "Query executed successfully"}
+        return results
+    except PoolTimeout as e:
+        logger.warning("Datasource %s busy: %s", datasource.name, e)
+        return {"error": f"Database busy: {e}"}
+    except DATABASE_ERRORS as e:
+        logger.error("SQL Execution Error on datasource %s: %s", datasource.name, e)
+        return {"error": f"SQL Execution Error: {e}"}
+
+
+def execute_inline(connection, query):
+    """Run a query as is, without parameters; returns a ResultSet or None."""
+    cursor = connection.cursor()
     try:
-        cursor = connection.cursor(dictionary=True)
         cursor.execute(query)
+        return ResultSet.from_cursor(cursor)
+    finally:
+        cursor.close()  # Close only the cursor; the connection goes back to the pool
+
+
+def prepared_statements_view(request):
+    """Report statement cache hits and the most frequently executed query shapes."""
+    try:
+        top = int(request.GET.get('top', 20))
+        if top < 1:
+            raise ValueError(top)
+    except ValueError:
+        return JsonResponse({"error": "top must be a positive integer."}, status=400)
+    return JsonResponse(prepared_stats(top=top))
+
+
+def result_fields(results, row_count=None):
+    """
+    UserQuery fields for a query result: rows go to the compressed result
+    store and only their metadata to the table.
+    """
+    if not isinstance(results, list):
+        return {"response": json.dumps(results, default=str)}  # e.g. {"message": ...}
+    try:
+        with span("serialize") as stage:
+            stored = store_result(results, row_count)
+            stage.set("bytes", stored.stored_bytes)
+    except OSError as e:
+        logger.error("Could not store query result: %s", e)
+        return {"row_count": len(results) if row_count is None else row_count}
+    return {
+        "row_count": stored.row_count,
+        "columns": stored.columns,
+        "result_hash": stored.result_hash,
+        "result_ref": stored.ref,
+        "result_rows": stored.stored_rows,
+        "result_bytes": stored.stored_bytes,
+    }
+
+
+def response_results(results, columnar):
+    """
+    Row results as a ResultSet, rendered {"columns": [...], "rows": [[...]]},
+    when `columnar`; otherwise the list of row dicts the API has always returned.
+    """
+    results = as_result_set(results)
+    if not isinstance(results, ResultSet):
+        return results  # e.g. {"message": ...}
+    return results if columnar else results.as_dicts()
+
+
+def stream_query_response(serializer, structured_query, fmt, datasource):
+    """
+    Stream the rows of structured_query and save the UserQuery once the
+    stream finishes. The stream outlives the request's datasource slot; the
+    pool's size still bounds it.
+    """
+    pool = get_db_pool(datasource)
+    if not pool:
+        return JsonResponse({"error": "Failed to connect to the database."}, status=500)
+    exceeded = sql_budget_exceeded()
+    if exceeded:
+        return error_response(exceeded)
+
+    def save(preview, row_count, error):
+        serializer.save(generated_query=structured_query, error=error, datasource=datasource.name,
+                        status=UserQuery.STATUS_FAILED if error else UserQuery.STATUS_COMPLETED,
+                        **result_fields(preview, row_count))
+
+    envelope = {"query": serializer.validated_data['query'], "generated_query": structured_query}
+    return StreamingHttpResponse(
+        stream_results(pool, structured_query, fmt=fmt, envelope=envelope,
+                       chunk_size=settings.STREAM_CHUNK_SIZE,
+                       preview_rows=settings.RESULT_STORE['max_rows'], on_complete=save),
+        content_type="application/json" if fmt == "json" else "application/x-ndjson",
+        status=status.HTTP_201_CREATED,
+    )
+
+
+def query_page(structured_query, offset, page_size, datasource):
+    """Return (rows, next_page_token) or ({"error": ...}, None)."""
+    pool = get_db_pool(datasource)
+    if not pool:
+        return {"error": "Failed to connect to the database."}, None
+    exceeded = sql_budget_exceeded()
+    if exceeded:
+        return exceeded, None
+    try:
+        rows, has_more = fetch_page(pool, structured_query, offset, page_size)
+    except (*DATABASE_ERRORS, PoolTimeout) as e:
+        logger.error("SQL Execution Error on datasource %s: %s", datasource.name, e)
+        return {"error": f"SQL Execution Error: {e}"}, None
+    next_token = make_page_token(structured_query, offset + page_size, page_size, datasource.name) if has_more else None
+    return rows, next_token
 
-        # Determine if the query is SELECT
-        if cursor.description:  # This is only populated for SELECT queries
-            results = cursor.fetchall()
-        else:
-            connection.commit()  # Ensure changes are saved for non-SELECT queries
-            results = {"message": "Query executed successfully"}
 
-        cursor.close()
+def rejected_result(error):
+    """Error result, like execute_query's, for SQL that admission control won't let run."""
+    return {"error": str(error), "error_status": error.http_status, "retry_after": error.retry_after}
+
+
+def sql_budget_exceeded(cost=1):
+    """Charge the request's SQL budget; returns an error result if it is used up, else None."""
+    try:
+        charge("sql", cost=cost)
+    except AdmissionRejected as e:
+        return rejected_result(e)
+    return None
+
+
+def result_cache_lookup(nlp_result, decision, datasource):
+    """
+    Return (key, cached results or None) for a translated query in the
+    datasource's result cache; key is None if the query can't be cached.
+    """
+    tables = nlp_result.get('tables')
+    normalized_query = nlp_result.get('normalized_query')
+    if not tables or not normalized_query:
+        return None, None
+
+    cache = datasource.result_cache
+    pool = get_db_pool(datasource)
+    if pool:
+        cache.sync_update_times(pool)
+
+    # The guard's rewrite (LIMIT cap) changes the result, so it is part of the key
+    key = result_key(normalized_query, variant=[decision.action, guard_settings()["max_rows"]])
+    with span("result_cache") as stage:
+        results = cache.get(key, tables)
+        stage.set("hit", results is not None)
+    return key, results
+
+
+def execute_cached_query(structured_query, nlp_result, decision, datasource):
+    """
+    Run execute_query behind the datasource's result cache, keyed by the
+    normalized SQL and invalidated per table. Identical queries already
+    running against the same datasource are waited on instead of being run again.
+    """
+    key, results = result_cache_lookup(nlp_result, decision, datasource)
+    if results is not None:
         return results
-    except mysql.connector.Error as e:
-        print(f"SQL Execution Error: {e}")
-        return {"error": f"SQL Execution Error: {e}"}
-    finally:
-        if connection and connection.is_connected():
-            cursor.close()  # Close only the cursor, not the connection
+    exceeded = sql_budget_exceeded()
+    if exceeded:
+        return exceeded
+
+    flight = get_single_flight("sql")
+    if key is None:
+        return flight.do((datasource.name, structured_query), lambda: execute_query(structured_query, datasource))
+
+    def run():
+        results = execute_query(structured_query, datasource)
+        if isinstance(results, list):
+            datasource.result_cache.set(key, nlp_result['tables'], results)
+        return results
+
+    return flight.do((datasource.name, key), run)
+
+
+async def aexecute_cached_query(structured_query, nlp_result, decision, datasource):
+    """
+    Async counterpart of execute_cached_query, sharing its result cache:
+    MySQL datasources run on aiomysql, others run execute_query in a thread.
+    """
+    key, results = await sync_to_async(result_cache_lookup, thread_sensitive=False)(nlp_result, decision, datasource)
+    if results is not None:
+        return results
+    try:
+        await acharge("sql")
+    except AdmissionRejected as e:
+        return rejected_result(e)
+
+    async def execute():
+        if datasource.dialect != "mysql":
+            return await sync_to_async(execute_query, thread_sensitive=False)(structured_query, datasource)
+        with span("sql_execute") as stage:
+            results = await aexecute_query(structured_query, datasource)
+            if isinstance(results, list):
+                stage.set("rows", len(results))
+        return results
+
+    flight = get_single_flight("sql")
+    if key is None:
+        return await flight.ado((datasource.name, structured_query), execute)
+
+    async def run():
+        results = await execute()
+        if isinstance(results, list):
+            await sync_to_async(datasource.result_cache.set, thread_sensitive=False)(
+                key, nlp_result['tables'], results)
+        return results
+
+    return await flight.ado((datasource.name, key), run)
+
+
+class ResultCacheView(APIView):
+    def get(self, request):
+        """Report a datasource's (?database=, default 'default') result cache hit/miss and size counters."""
+        try:
+            with get_datasource_registry().use(request.query_params.get('database')) as datasource:
+                return Response(datasource.result_cache.stats())
+        except (UnknownDatasource, DatasourceBusy) as e:
+            return datasource_error(e)
+
+    def post(self, request):
+        """Invalidate a datasource's cached results for the given tables, e.g. after an ETL load."""
+        tables = request.data.get('tables')
+        if not isinstance(tables, list) or not tables:
+            return Response({"error": "Provide a non-empty list of tables."}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            with get_datasource_registry().use(request.data.get('database')) as datasource:
+                datasource.result_cache.invalidate_tables(tables)
+        except (UnknownDatasource, DatasourceBusy) as e:
+            return datasource_error(e)
+        return Response({"invalidated": tables})
+
+
+def guard_response(decision, structured_query):
+    """Return the HTTP response for a query the guard refused, or None if it may run."""
+    if decision.action == "reject":
+        return JsonResponse({"error": decision.reason, "generated_query": structured_query}, status=422)
+    if decision.action == "confirm":
+        return JsonResponse({
+            "error": decision.reason,
+            "requires_confirmation": True,
+            "estimated_rows": decision.estimated_rows,
+            "generated_query": structured_query,
+        }, status=409)
+    return None
+
+
+def coalescing_stats_view(request):
+    """Report how many translations and SQL executions were shared with an identical in-flight call."""
+    return JsonResponse(all_single_flight_stats())
+
+
+def llm_client_stats_view(request):
+    """Report model provider calls, retries, hedged requests, latency and circuit breaker state."""
+    return JsonResponse(get_llm_client().stats())
+
+
+def admission_stats_view(request):
+    """Report requests in flight and waiting, and how many were admitted, queued or turned away."""
+    return JsonResponse(get_admission().stats())
+
+
+def few_shot_stats_view(request):
+    """Report the few-shot example store and the first-try SQL success rate with and without examples."""
+    return JsonResponse(get_example_store().stats())
+
+
+def query_guard_stats_view(request):
+    """Report query guard decisions (counts and the most recent ones) for threshold tuning."""
+    return JsonResponse(decision_stats())
+
+
+def translation_failed(nlp_result):
+    """
+    Response for a question that produced no SQL: 400 if the model's answer
+    was unusable, 502/503/504 if the model provider itself failed, 429 if
+    the client's LLM budget is used up.
+    """
+    if not nlp_result.get("error_status"):
+        return JsonResponse({"error": "Failed to generate a structured query."}, status=400)
+    return error_response(nlp_result)
+
+
+def error_response(result, default_status=500):
+    """
+    Response for an error result: its own `error_status` if it has one
+    (e.g. 429 from admission control), with Retry-After when it says when
+    to come back.
+    """
+    response = JsonResponse({"error": result["error"]}, status=result.get("error_status") or default_status)
+    if result.get("retry_after") is not None:
+        response["Retry-After"] = str(max(1, round(result["retry_after"])))
+    return response
+
+
+def metrics_view(request):
+    """
+    Prometheus metrics: request and per-stage latency histograms recorded by
+    tracing, plus the pool, cache and query guard counters as gauges.
+    """
+    gauges = {}
+    for name, stats in all_pool_stats().items():
+        add_stats_gauges(gauges, "db_pool", stats, pool=name)
+    add_stats_gauges(gauges, "translation_cache", get_translation_cache().stats())
+    datasources = get_datasource_registry().stats()
+    for name, stats in datasources.pop("datasources").items():
+        add_stats_gauges(gauges, "datasource", stats, datasource=name)
+        if "result_cache" in stats:
+            add_stats_gauges(gauges, "result_cache", stats["result_cache"], datasource=name)
+    add_stats_gauges(gauges, "datasource_registry", datasources)
+    add_stats_gauges(gauges, "query_jobs", get_job_queue().stats())
+    add_stats_gauges(gauges, "prepared_statements", prepared_stats(top=0))
+    add_stats_gauges(gauges, "few_shot", get_example_store().stats())
+    add_stats_gauges(gauges, "admission", get_admission().stats())
+    llm_stats = get_llm_client().stats()
+    add_stats_gauges(gauges, "llm_client", llm_stats)
+    add_stats_gauges(gauges, "llm_breaker", llm_stats["breaker"])
+    for name, stats in all_single_flight_stats().items():
+        add_stats_gauges(gauges, "single_flight", stats, group=name)
+    for action, count in decision_stats()["counts"].items():
+        gauges.setdefault("query_guard_decisions", {})[(("action", action),)] = count
+    return HttpResponse(render_prometheus(gauges), content_type="text/plain; version=0.0.4; charset=utf-8")
 
 
 class QueryView(APIView):
+    renderer_classes = result_renderer_classes()
+
     def post(self, request):
         # Step 1: Save user query
         serializer = UserQuerySerializer(data=request.data)
-        if serializer.is_valid():
-            user_query = serializer.validated_data['query']
+        options = QueryOptionsSerializer(data=request.data)
+        valid = serializer.is_valid() & options.is_valid()  # Both run, so all errors are reported
+        if valid:
+            # Each request names its target database; one busy tenant can't take every worker
+            try:
+                with get_datasource_registry().use(request.data.get('database')) as datasource:
+                    return self.answer(request, serializer, datasource, options.validated_data.get('page_size'))
+            except (UnknownDatasource, DatasourceBusy) as e:
+                return datasource_error(e)
+
+        return Response({**serializer.errors, **options.errors}, status=status.HTTP_400_BAD_REQUEST)
+
+    def answer(self, request, serializer, datasource, page_size=None):
+        user_query = serializer.validated_data['query']
+
+        # Step 2: Process the query using NLP model
+        translation_start = time.perf_counter()
+        nlp_result = process_query(user_query, datasource.schema_file, datasource.name, datasource.database)
+        translation_ms = (time.perf_counter() - translation_start) * 1000
+
+        # Step 3: Execute the generated SQL query
+        structured_query = nlp_result.get('structured_query')
+        logger.debug("Generated SQL Query: %s", structured_query)
+
+        if not structured_query:
+            return translation_failed(nlp_result)
+
+        # Cap rows, bound run time and check the plan cost before running it
+        execution_start = time.perf_counter()
+        pool = get_db_pool(datasource)
+        if not pool:
+            return JsonResponse({"error": "Failed to connect to the database."}, status=500)
+        with span("query_guard") as stage:
+            decision = guard_query(pool, structured_query,
+                                   confirmed=bool(request.data.get('confirm')),
+                                   streaming=bool(request.data.get('stream')),
+                                   paginated=bool(page_size))
+            stage.set("action", decision.action)
+        refused = guard_response(decision, structured_query)
+        if refused:
+            return refused
+        structured_query = decision.sql
+
+        # Large results: stream straight from a server-side cursor instead of buffering
+        if request.data.get('stream'):
+            fmt = 'json' if request.data.get('format') == 'json' else 'ndjson'
+            return stream_query_response(serializer, structured_query, fmt, datasource)
+
+        next_page_token = None
+        if page_size and pageable(structured_query):
+            query_results, next_page_token = query_page(structured_query, 0, page_size, datasource)
+        else:
+            query_results = execute_cached_query(structured_query, nlp_result, decision, datasource)
+
+        if "error" in query_results:
+            return error_response(query_results)
 
-            # Step 2: Process the query using NLP model
-            nlp_result = process_query(user_query)
-            # print("NLP Result:", nlp_result)
+        # Step 4: Save the structured query and response
+        execution_ms = (time.perf_counter() - execution_start) * 1000
+        stored_fields = result_fields(query_results)
+        with span("orm_save"):
+            user_query_instance = serializer.save(generated_query=structured_query, datasource=datasource.name,
+                                                  translation_ms=translation_ms, execution_ms=execution_ms,
+                                                  latency_ms=translation_ms + execution_ms, **stored_fields)
 
-            # Step 3: Execute the generated SQL query
-            structured_query = nlp_result.get('structured_query')
-            print(f"Generated SQL Query: {structured_query}")  # Debugging
+        # Step 5: Return the processed data and query results
+        data = {
+            "query": user_query_instance.query,
+            "generated_query": user_query_instance.generated_query,
+            # Rendered in one pass by ResultJSONRenderer, or as MessagePack/Arrow if negotiated
+            "results": response_results(query_results, wants_columnar(request)),
+        }
+        if page_size:
+            data["next_page_token"] = next_page_token
+        return Response(data, status=status.HTTP_201_CREATED)
 
-            if not structured_query:
-                return JsonResponse({"error": "Failed to generate a structured query."}, status=400)
 
-            query_results = execute_query(structured_query)
+def _run_batch_item(nlp_result, datasource, pool, confirmed, columnar=False):
+    """
+    Guard and execute one translated question of a batch. Returns the
+    UserQuery fields for it plus its entry in the response.
+    """
+    fields = {"query": nlp_result["user_query"], "datasource": datasource.name,
+              "status": UserQuery.STATUS_FAILED}
+    item = {"query": nlp_result["user_query"], "status": "failed"}
+    structured_query = nlp_result.get("structured_query")
+    if not structured_query:
+        fields["error"] = item["error"] = nlp_result.get("error") or "Failed to generate a structured query."
+        return fields, item
 
+    start = time.perf_counter()
+    try:
+        decision = guard_query(pool, structured_query, confirmed=confirmed)
+        fields["generated_query"] = item["generated_query"] = decision.sql
+        if not decision.allowed:
+            fields["error"] = item["error"] = decision.reason
+            if decision.action == "confirm":
+                item["status"] = "requires_confirmation"
+                item["estimated_rows"] = decision.estimated_rows
+        else:
+            query_results = execute_cached_query(decision.sql, nlp_result, decision, datasource)
             if "error" in query_results:
-                return JsonResponse({"error": query_results["error"]}, status=500)
-
-            # Step 4: Save the structured query and response
-            user_query_instance = serializer.save(
-                generated_query=structured_query,
-                response=json.dumps(query_results, default=str)  # Convert dates & non-serializable objects
-            )
-
-            # Step 5: Return the processed data and query results
-            return Response({
-                "query": user_query_instance.query,
-                "generated_query": user_query_instance.generated_query,
-                "results": query_results  # No need for json.dumps() here; DRF handles it
-            }, status=status.HTTP_201_CREATED)
-
-        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+                fields["error"] = item["error"] = query_results["error"]
+            else:
+                fields.update(result_fields(query_results), status=UserQuery.STATUS_COMPLETED)
+                results = response_results(query_results, columnar)
+                item.update(status=UserQuery.STATUS_COMPLETED,
+                            results=results.columnar() if isinstance(results, ResultSet) else results)
+    finally:
+        connections.close_all()  # Batch threads are short-lived; don't leave their Django connections open
+    fields["execution_ms"] = (time.perf_counter() - start) * 1000
+    return fields, item
+
+
+class QueryBatchView(APIView):
+    def post(self, request):
+        """
+        Answer a list of questions in one request: translations go to the
+        model as one batch, the SQL runs on several pooled connections at
+        once, and every question is saved with a single bulk_create. Results
+        come back in order, each with its own status.
+        """
+        questions = request.data.get('questions')
+        max_questions = settings.QUERY_BATCH["max_questions"]
+        if (not isinstance(questions, list) or not questions
+                or not all(isinstance(q, str) and q.strip() for q in questions)):
+            return Response({"error": "Provide a non-empty list of questions."}, status=status.HTTP_400_BAD_REQUEST)
+        if len(questions) > max_questions:
+            return Response({"error": f"At most {max_questions} questions per batch."},
+                            status=status.HTTP_400_BAD_REQUEST)
+        try:
+            with get_datasource_registry().use(request.data.get('database')) as datasource:
+                return self.answer(questions, datasource, bool(request.data.get('confirm')),
+                                   bool(request.data.get('columnar')))
+        except (UnknownDatasource, DatasourceBusy) as e:
+            return datasource_error(e)
+
+    def answer(self, questions, datasource, confirmed, columnar=False):
+        translation_start = time.perf_counter()
+        nlp_results = process_queries(questions, datasource.schema_file, datasource.name, datasource.database)
+        translation_ms = (time.perf_counter() - translation_start) * 1000
+
+        pool = get_db_pool(datasource)
+        if not pool:
+            return JsonResponse({"error": "Failed to connect to the database."}, status=500)
+        # Charged here for every translated question: the batch threads run outside the request's admission
+        exceeded = sql_budget_exceeded(sum(1 for nlp_result in nlp_results if nlp_result.get("structured_query")))
+        if exceeded:
+            return error_response(exceeded)
+        parallelism = max(1, min(settings.QUERY_BATCH["parallelism"], pool.size, len(questions)))
+        with span("sql_batch") as stage, ThreadPoolExecutor(max_workers=parallelism,
+                                                             thread_name_prefix="query-batch") as executor:
+            stage.set("parallelism", parallelism)
+            outcomes = list(executor.map(
+                lambda nlp_result: _run_batch_item(nlp_result, datasource, pool, confirmed, columnar), nlp_results))
+
+        # Translation was one shared batch, so every question is charged its full duration
+        instances = []
+        for fields, _ in outcomes:
+            fields["translation_ms"] = translation_ms
+            fields["latency_ms"] = translation_ms + fields.get("execution_ms", 0.0)
+            instances.append(UserQuery(**fields))
+        with span("orm_save"):
+            saved = UserQuery.objects.bulk_create(instances)
+
+        items = []
+        for index, ((_, item), instance) in enumerate(zip(outcomes, saved)):
+            items.append({"index": index, "id": instance.pk, **item})  # pk is None on backends without RETURNING
+        statuses = [item["status"] for item in items]
+        return Response({
+            "results": items,
+            "completed": statuses.count(UserQuery.STATUS_COMPLETED),
+            "failed": len(statuses) - statuses.count(UserQuery.STATUS_COMPLETED),
+        }, status=status.HTTP_200_OK)
+
+
+class QueryResultView(APIView):
+    def get(self, request, pk):
+        """Return the stored result rows of a past query, loaded from the result store."""
+        try:
+            user_query = UserQuery.objects.defer('response').get(pk=pk)
+        except UserQuery.DoesNotExist:
+            return Response({"error": "Unknown query."}, status=status.HTTP_404_NOT_FOUND)
+        results = user_query.load_results()
+        if results is None:
+            return Response({"error": "No stored results for this query."}, status=status.HTTP_404_NOT_FOUND)
+        return Response({
+            "query": user_query.query,
+            "generated_query": user_query.generated_query,
+            "row_count": user_query.row_count,
+            "stored_rows": user_query.result_rows,
+            "columns": user_query.columns,
+            "results": results,
+        })
+
+
+HISTORY_FIELDS = ("id", "query", "generated_query", "datasource", "status", "error", "timestamp",
+                  "translation_ms", "execution_ms", "latency_ms", "row_count", "columns")
+
+
+class QueryHistoryView(APIView):
+    def get(self, request):
+        """
+        List past queries newest first, with keyset pagination (?cursor=),
+        full-text search (?q=) and filters (?database=, ?status=,
+        ?min_latency_ms=, ?max_latency_ms=). Only metadata is returned; rows are at /api/query/<id>/results/.
+        """
+        params = request.query_params
+        try:
+            limit = min(int(params.get('limit', 50)), settings.MAX_HISTORY_PAGE_SIZE)
+            if limit < 1:
+                raise ValueError(limit)
+            queryset = UserQuery.objects.only(*HISTORY_FIELDS).order_by('-timestamp', '-id')
+            if params.get('database'):
+                queryset = queryset.filter(datasource=params['database'])
+            if params.get('status'):
+                queryset = queryset.filter(status=params['status'])
+            if params.get('min_latency_ms'):
+                queryset = queryset.filter(latency_ms__gte=float(params['min_latency_ms']))
+            if params.get('max_latency_ms'):
+                queryset = queryset.filter(latency_ms__lte=float(params['max_latency_ms']))
+            if params.get('cursor'):
+                queryset = after_cursor(queryset, params['cursor'])
+        except (ValueError, signing.BadSignature):
+            return Response({"error": "Invalid limit, latency filter or cursor."}, status=status.HTTP_400_BAD_REQUEST)
+        queryset = apply_search(queryset, params.get('q'))
+
+        page = list(queryset[:limit + 1])
+        has_more = len(page) > limit
+        page = page[:limit]
+        return Response({
+            "results": [{field: getattr(item, field) for field in HISTORY_FIELDS} for item in page],
+            "next_cursor": make_cursor(page[-1]) if has_more else None,
+        })
+
+
+class QueryPageView(APIView):
+    renderer_classes = result_renderer_classes()
+
+    def get(self, request):
+        """Return the page addressed by a next_page_token from QueryView."""
+        try:
+            structured_query, offset, page_size, database = read_page_token(
+                request.query_params.get('token', ''), max_age=settings.PAGE_TOKEN_MAX_AGE)
+        except signing.BadSignature:
+            return Response({"error": "Invalid or expired page token."}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            with get_datasource_registry().use(database) as datasource:
+                rows, next_page_token = query_page(structured_query, offset, page_size, datasource)
+        except (UnknownDatasource, DatasourceBusy) as e:
+            return datasource_error(e)
+        if "error" in rows:
+            return error_response(rows)
+        return Response({
+            "generated_query": structured_query,
+            "results": response_results(rows, wants_columnar(request)),
+            "next_page_token": next_page_token,
+        })
+
+
+def _run_job_steps(job, confirmed, fields, datasource):
+    """Translate and execute a queued question, filling `fields`; returns an error message or None."""
+    start = time.perf_counter()
+    nlp_result = process_query(job.query, datasource.schema_file, datasource.name, datasource.database)
+    fields["translation_ms"] = (time.perf_counter() - start) * 1000
+    structured_query = nlp_result.get('structured_query')
+    if not structured_query:
+        return nlp_result.get('error') or "Failed to generate a structured query."
+    fields["generated_query"] = structured_query
+
+    start = time.perf_counter()
+    try:
+        pool = get_db_pool(datasource)
+        if not pool:
+            return "Failed to connect to the database."
+        decision = guard_query(pool, structured_query, confirmed=confirmed)
+        if not decision.allowed:
+            return decision.reason
+        fields["generated_query"] = decision.sql
+        query_results = execute_cached_query(decision.sql, nlp_result, decision, datasource)
+        if "error" in query_results:
+            return query_results["error"]
+        fields.update(result_fields(query_results))
+    finally:
+        fields["execution_ms"] = (time.perf_counter() - start) * 1000
+        fields["latency_ms"] = fields["translation_ms"] + fields["execution_ms"]
+    return None
+
+
+def run_query_job(job_id, confirmed=False, ticket=None):
+    """
+    Worker entry point: run one queued UserQuery and record its outcome on the
+    row. Its LLM and SQL calls are charged to `ticket`, the submitting request's.
+    """
+    queue = get_job_queue()
+    UserQuery.objects.filter(pk=job_id).update(status=UserQuery.STATUS_RUNNING, started_at=timezone.now())
+    queue.notify()
+
+    job = UserQuery.objects.get(pk=job_id)
+    fields = {}
+    error = None
+    try:
+        with charging(ticket), get_datasource_registry().use(job.datasource) as datasource:
+            error = _run_job_steps(job, confirmed, fields, datasource)
+    except (UnknownDatasource, DatasourceBusy) as e:
+        error = str(e)
+    except Exception as e:
+        error = f"Internal error: {e}"
+        raise
+    finally:
+        fields["status"] = UserQuery.STATUS_FAILED if error else UserQuery.STATUS_COMPLETED
+        fields["error"] = error
+        fields["finished_at"] = timezone.now()
+        UserQuery.objects.filter(pk=job_id).update(**fields)
+
+
+def job_state(job):
+    state = {
+        "job_id": job.id,
+        "query": job.query,
+        "status": job.status,
+        "generated_query": job.generated_query,
+        "error": job.error,
+        "submitted_at": job.timestamp,
+        "started_at": job.started_at,
+        "finished_at": job.finished_at,
+        "translation_ms": job.translation_ms,
+        "execution_ms": job.execution_ms,
+        "latency_ms": job.latency_ms,
+    }
+    if job.status == UserQuery.STATUS_COMPLETED:
+        state["row_count"] = job.row_count
+        state["results"] = job.load_results()
+    return state
+
+
+class QueryJobView(APIView):
+    def post(self, request):
+        """Queue a question for background translation and execution; returns 202 with the job id."""
+        serializer = UserQuerySerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        database = request.data.get('database') or DEFAULT_DATASOURCE
+        try:
+            get_datasource_registry().config(database)
+        except UnknownDatasource as e:
+            return datasource_error(e)
+
+        job = serializer.save(status=UserQuery.STATUS_QUEUED, datasource=database)
+        try:
+            get_job_queue().submit(job.id, partial(run_query_job, confirmed=bool(request.data.get('confirm')),
+                                                   ticket=current_ticket()))
+        except QueueFull as e:
+            job.delete()
+            response = Response({"error": f"Too many queued jobs, retry later. {e}"},
+                                status=status.HTTP_503_SERVICE_UNAVAILABLE)
+            response["Retry-After"] = str(settings.QUERY_JOBS["retry_after"])
+            return response
+
+        return Response({
+            "job_id": job.id,
+            "status": job.status,
+            "status_url": reverse('query-job', args=[job.id]),
+        }, status=status.HTTP_202_ACCEPTED)
+
+
+class QueryJobStatusView(APIView):
+    def get(self, request, job_id):
+        """
+        Report a job's state. ?wait=<seconds> long-polls until it finishes;
+        ?stream=1 sends one NDJSON line per status change until it finishes.
+        """
+        try:
+            job = UserQuery.objects.get(pk=job_id)
+        except UserQuery.DoesNotExist:
+            return Response({"error": "Unknown job."}, status=status.HTTP_404_NOT_FOUND)
+
+        max_wait = settings.QUERY_JOBS["max_wait"]
+        if request.query_params.get('stream'):
+            return StreamingHttpResponse(self._stream(job, max_wait), content_type="application/x-ndjson")
+
+        try:
+            wait = float(request.query_params.get('wait') or 0)
+            if math.isnan(wait):
+                raise ValueError(wait)
+            wait = min(max(wait, 0.0), max_wait)
+        except ValueError:
+            return Response({"error": "Invalid wait."}, status=status.HTTP_400_BAD_REQUEST)
+        deadline = time.monotonic() + wait
+        while not job.finished and time.monotonic() < deadline:
+            get_job_queue().wait(min(1.0, deadline - time.monotonic()))
+            job.refresh_from_db()
+        return Response(job_state(job))
+
+    def _stream(self, job, max_wait):
+        deadline = time.monotonic() + max_wait
+        last_status = None
+        while True:
+            if job.status != last_status:
+                last_status = job.status
+                yield (json.dumps(job_state(job), default=str) + "\n").encode()
+            if job.finished or time.monotonic() >= deadline:
+                return
+            get_job_queue().wait(min(1.0, deadline - time.monotonic()))
+            job.refresh_from_db()
+
+
+@csrf_exempt
+@require_POST
+async def async_query_view(request):
+    """
+    Async variant of QueryView.post: the model call, SQL execution and ORM save
+    all await instead of blocking a worker thread.
+    """
+    try:
+        data = json.loads(request.body or b"{}")
+    except json.JSONDecodeError:
+        return JsonResponse({"error": "Request body must be JSON."}, status=400)
+
+    serializer = UserQuerySerializer(data=data)
+    if not serializer.is_valid():
+        return JsonResponse(serializer.errors, status=400)
+    try:
+        async with get_datasource_registry().ause(data.get('database')) as datasource:
+            return await _aanswer(data, serializer.validated_data['query'], datasource)
+    except (UnknownDatasource, DatasourceBusy) as e:
+        return datasource_error(e)
+
+
+async def _aanswer(data, user_query, datasource):
+    translation_start = time.perf_counter()
+    nlp_result = await aprocess_query(user_query, datasource.schema_file, datasource.name, datasource.database)
+    translation_ms = (time.perf_counter() - translation_start) * 1000
+    structured_query = nlp_result.get('structured_query')
+    if not structured_query:
+        return translation_failed(nlp_result)
+
+    # aiomysql serves MySQL datasources; others run the sync path in a thread
+    native = datasource.dialect == "mysql"
+    execution_start = time.perf_counter()
+    with span("query_guard") as stage:
+        if native:
+            decision = await aguard_query(datasource, structured_query, confirmed=bool(data.get('confirm')))
+        else:
+            decision = await sync_to_async(guard_query)(datasource.pool, structured_query,
+                                                        confirmed=bool(data.get('confirm')))
+        stage.set("action", decision.action)
+    refused = guard_response(decision, structured_query)
+    if refused:
+        return refused
+    structured_query = decision.sql
+
+    query_results = await aexecute_cached_query(structured_query, nlp_result, decision, datasource)
+    if "error" in query_results:
+        return error_response(query_results)
+
+    execution_ms = (time.perf_counter() - execution_start) * 1000
+    stored_fields = await sync_to_async(result_fields)(query_results)
+    with span("orm_save"):
+        user_query_instance = await UserQuery.objects.acreate(
+            query=user_query,
+            generated_query=structured_query,
+            datasource=datasource.name,
+            translation_ms=translation_ms,
+            execution_ms=execution_ms,
+            latency_ms=translation_ms + execution_ms,
+            **stored_fields
+        )
+
+    body = {
+        "query": user_query_instance.query,
+        "generated_query": user_query_instance.generated_query,
+        "results": response_results(query_results, bool(data.get('columnar'))),
+    }
+    if isinstance(body["results"], ResultSet):
+        return HttpResponse(encode_response(body), content_type="application/json", status=201)
+    return JsonResponse(body, status=201)